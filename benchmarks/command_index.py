@@ -0,0 +1,68 @@
+"""
+Compares resolving abbreviated commands by scanning every registered command with startswith (the old
+CloudBot.process behaviour) against the prefix tree in CommandIndex.
+
+Run from the repository root with: python -m benchmarks.command_index
+"""
+
+import random
+import string
+import timeit
+
+from cloudbot.util.commandindex import CommandIndex
+
+ALIASES = 600
+ITERATIONS = 200
+
+
+class MockHook:
+    def __init__(self, name):
+        self.name = name
+
+
+def old_resolve(commands, command):
+    if command in commands:
+        return commands[command]
+    potential_matches = []
+    for potential_match, plugin in commands.items():
+        if potential_match.startswith(command):
+            potential_matches.append((potential_match, plugin))
+    if len(potential_matches) == 1:
+        return potential_matches[0][1]
+    return None
+
+
+def main():
+    rng = random.Random(0)
+    commands = {}
+    index = CommandIndex()
+    while len(commands) < ALIASES:
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 12)))
+        commands[name] = index[name] = MockHook(name)
+
+    # a mix of exact commands, unique abbreviations, ambiguous abbreviations and typos
+    names = list(commands)
+    queries = [rng.choice(names)[:rng.randint(1, 6)] for _ in range(200)]
+    queries += ["".join(rng.choice(string.ascii_lowercase) for _ in range(5)) for _ in range(200)]
+
+    assert [old_resolve(commands, query) for query in queries] == [index.resolve(query) for query in queries]
+
+    def run_old():
+        for query in queries:
+            old_resolve(commands, query)
+
+    def run_new():
+        for query in queries:
+            index.resolve(query)
+
+    old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(queries))
+    new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(queries))
+
+    print("{} registered commands".format(len(commands)))
+    print("startswith scan: {:.3f} us/lookup".format(old_time * 1e6))
+    print("CommandIndex:    {:.3f} us/lookup".format(new_time * 1e6))
+    print("speedup:         {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compares matching commands with a per-line formatted regex (the old CloudBot.process behaviour) against the
+precompiled CommandMatcher.
+
+Run from the repository root with: python -m benchmarks.command_matcher
+"""
+
+import re
+import timeit
+
+from cloudbot.util.commandmatch import CommandMatcher
+
+NICK = "CloudBot"
+PREFIX = "."
+ITERATIONS = 20
+
+# mostly regular chatter, with the occasional command - roughly what a busy channel looks like
+LINES = [
+    "hey, has anyone tried the new release yet?",
+    "yeah, works fine here",
+    "lol",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "I think the build on master is broken again",
+    ".weather london",
+    "brb",
+    "cloudbot: help",
+    "that's what she said",
+    "does anyone know how to configure the ratelimit?",
+] * 1000
+
+
+def old_match(content):
+    command_re = r'(?i)^(?:[{}]|{}[,;:]+\s+)(\w+)(?:$|\s+)(.*)'.format(PREFIX, NICK)
+    return re.match(command_re, content)
+
+
+def main():
+    matcher = CommandMatcher(NICK, PREFIX)
+
+    assert [bool(old_match(line)) for line in LINES] == [bool(matcher.match(line)) for line in LINES]
+
+    def run_old():
+        for line in LINES:
+            old_match(line)
+
+    def run_new():
+        for line in LINES:
+            matcher.match(line)
+
+    old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(LINES))
+    new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(LINES))
+
+    print("format + re.match: {:.3f} us/line".format(old_time * 1e6))
+    print("CommandMatcher:    {:.3f} us/line".format(new_time * 1e6))
+    print("speedup:           {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compares decoding lines the way _IrcProtocol used to (trying each codec, and catching UnicodeDecodeError) against
+Decoder, for a connection where every line is ASCII or UTF-8, and for one where a channel uses a legacy encoding.
+
+Run from the repository root with: python -m benchmarks.decoding
+"""
+
+import os
+import timeit
+
+from cloudbot.util.decoding import Decoder
+
+ITERATIONS = 20
+
+
+def old_decode(bytestring):
+    for codec in ('utf-8', 'iso-8859-1', 'shift_jis', 'cp1252'):
+        try:
+            return bytestring.decode(codec)
+        except UnicodeDecodeError:
+            continue
+    return bytestring.decode('utf-8', errors='ignore')
+
+
+def make_lines(encoding):
+    path = os.path.join(os.path.dirname(__file__), "data", "chat_corpus.txt")
+    with open(path, encoding="utf-8") as f:
+        corpus = [line.rstrip("\n") for line in f if line.strip()]
+    lines = []
+    for number, text in enumerate(corpus):
+        if number % 4 == 0:
+            # some accented text, the same in iso-8859-1 and cp1252
+            text += " - très bien, à bientôt"
+        lines.append(":nick!user@host PRIVMSG #channel :{}".format(text).encode(encoding))
+    return lines
+
+
+def main():
+    for description, encoding in (("UTF-8", "utf-8"), ("iso-8859-1", "iso-8859-1")):
+        lines = make_lines(encoding)
+        print("{} lines, {} non-ASCII".format(description, sum(1 for line in lines if max(line) > 127)))
+
+        def run_old():
+            for line in lines:
+                old_decode(line)
+
+        old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(lines))
+        print("  codec list:                     {:.3f} us/line".format(old_time * 1e6))
+
+        # the default codecs, and the ones the old code actually ended up using
+        for codecs in (None, ["utf-8", "iso-8859-1"]):
+            decoder = Decoder() if codecs is None else Decoder(codecs)
+            assert [old_decode(line) for line in lines] == [decoder.decode(line) for line in lines]
+
+            def run_new():
+                for line in lines:
+                    decoder.decode(line)
+
+            new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(lines))
+            print("  Decoder({:<22}) {:.3f} us/line ({:.1f}x)".format(
+                ", ".join(decoder.encodings), new_time * 1e6, old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Measures the memory allocated for the events CloudBot.process creates for a single PRIVMSG, comparing the slotted,
+copy-free Event against a copy of the previous dict-backed Event which copied every attribute from its base event.
+
+Run from the repository root with: python -m benchmarks.event_allocations
+"""
+
+import tracemalloc
+
+from cloudbot.event import Event, EventType, RegexEvent
+
+LINES = 1000
+# roughly what one PRIVMSG reaches with the bundled plugins: catch-all raw hooks, PRIVMSG raw hooks, message event
+# hooks and a regex hook
+HOOKS_PER_LINE = 12
+
+
+class CopyingEvent:
+    """
+    The previous Event implementation, reduced to what matters for allocations.
+    """
+
+    def __init__(self, *, bot=None, hook=None, conn=None, base_event=None, event_type=EventType.other, content=None,
+                 target=None, channel=None, nick=None, user=None, host=None, mask=None, irc_raw=None, irc_prefix=None,
+                 irc_command=None, irc_paramlist=None, irc_ctcp_text=None):
+        self.db = None
+        self.db_executor = None
+        self.bot = bot
+        self.conn = conn
+        self.hook = hook
+        if base_event is not None:
+            if self.bot is None and base_event.bot is not None:
+                self.bot = base_event.bot
+            if self.conn is None and base_event.conn is not None:
+                self.conn = base_event.conn
+            if self.hook is None and base_event.hook is not None:
+                self.hook = base_event.hook
+            self.type = base_event.type
+            self.content = base_event.content
+            self.target = base_event.target
+            self.chan = base_event.chan
+            self.nick = base_event.nick
+            self.user = base_event.user
+            self.host = base_event.host
+            self.mask = base_event.mask
+            self.irc_raw = base_event.irc_raw
+            self.irc_prefix = base_event.irc_prefix
+            self.irc_command = base_event.irc_command
+            self.irc_paramlist = base_event.irc_paramlist
+            self.irc_ctcp_text = base_event.irc_ctcp_text
+        else:
+            self.type = event_type
+            self.content = content
+            self.target = target
+            self.chan = channel
+            self.nick = nick
+            self.user = user
+            self.host = host
+            self.mask = mask
+            self.irc_raw = irc_raw
+            self.irc_prefix = irc_prefix
+            self.irc_command = irc_command
+            self.irc_paramlist = irc_paramlist
+            self.irc_ctcp_text = irc_ctcp_text
+
+
+class CopyingRegexEvent(CopyingEvent):
+    def __init__(self, *, hook, match, base_event):
+        super().__init__(hook=hook, base_event=base_event)
+        self.match = match
+
+
+def make_line(event_class, regex_event_class, number):
+    line = ":nick!user@host.example.com PRIVMSG #channel :message number {}".format(number)
+    base = event_class(event_type=EventType.message, content="message number {}".format(number), channel="#channel",
+                       nick="nick", user="user", host="host.example.com", mask="nick!user@host.example.com",
+                       irc_raw=line, irc_prefix=":nick!user@host.example.com", irc_command="PRIVMSG",
+                       irc_paramlist=["#channel", ":message number {}".format(number)])
+    events = [base]
+    for hook in range(HOOKS_PER_LINE - 1):
+        events.append(event_class(hook=hook, base_event=base))
+    events.append(regex_event_class(hook=HOOKS_PER_LINE, match=None, base_event=base))
+    return events
+
+
+def measure(event_class, regex_event_class):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    lines = [make_line(event_class, regex_event_class, number) for number in range(LINES)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    size = sum(stat.size_diff for stat in stats)
+    count = sum(stat.count_diff for stat in stats)
+    del lines
+    return size / LINES, count / LINES
+
+
+def main():
+    old_size, old_count = measure(CopyingEvent, CopyingRegexEvent)
+    new_size, new_count = measure(Event, RegexEvent)
+
+    print("{} events per line".format(HOOKS_PER_LINE + 1))
+    print("copying events: {:.0f} bytes, {:.1f} allocations per line".format(old_size, old_count))
+    print("slotted events: {:.0f} bytes, {:.1f} allocations per line".format(new_size, new_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares fetching JSON the way cloudbot.util.http does (a new urllib opener, and so a new connection, for every
+request) against the pooled HttpClient, which keeps connections open, from several threads like threaded hooks.
+
+The server runs locally and counts the connections it accepts. Locally a new connection costs next to nothing, so the
+benchmark is run twice: once as is, and once with the server waiting HANDSHAKE_DELAY before it answers on each new
+connection, standing in for the TCP and TLS handshake round trips to a remote API.
+
+cloudbot.util.http needs bs4 and lxml just to import, so its open() is mirrored here.
+
+Run from the repository root with: python -m benchmarks.http_client
+"""
+
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from cloudbot.util.httpclient import HttpClient
+
+REQUESTS = 2000
+THREADS = 8
+# two 10ms round trips
+HANDSHAKE_DELAY = 0.02
+
+BODY = json.dumps({"items": [{"id": number, "title": "item {}".format(number)} for number in range(20)]}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers and body are written separately, which Nagle's algorithm would hold up on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        if self.server.handshake_delay:
+            time.sleep(self.server.handshake_delay)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.handshake_delay = 0
+
+
+def old_get_json(url):
+    # what http.get_json does
+    request = urllib.request.Request(url)
+    request.add_header('User-Agent', 'Cloudbot/DEV http://github.com/CloudDev/CloudBot')
+    opener = urllib.request.build_opener()
+    return json.loads(opener.open(request).read().decode())
+
+
+def run(server, function, url):
+    server.connections = 0
+    with ThreadPoolExecutor(THREADS) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(function, [url] * REQUESTS))
+        elapsed = time.perf_counter() - start
+    return elapsed, server.connections, results
+
+
+def compare(server, url):
+    old_time, old_connections, old_results = run(server, old_get_json, url)
+
+    client = HttpClient({"pool_size": THREADS})
+    new_time, new_connections, new_results = run(server, client.get_json, url)
+    host_stats = client.stats()[url.split("/")[2]]
+    client.close()
+
+    assert old_results == new_results
+
+    print("new opener per request: {:.0f} requests/s, {} connections".format(REQUESTS / old_time, old_connections))
+    print("pooled client:          {:.0f} requests/s, {} connections ({:.2f}ms average latency)".format(
+        REQUESTS / new_time, new_connections, host_stats["average"] * 1000))
+    print("speedup:                {:.1f}x".format(old_time / new_time))
+
+
+def main():
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/api".format(server.server_address[1])
+
+    print("{} requests from {} threads".format(REQUESTS, THREADS))
+    print("local connections:")
+    compare(server, url)
+    server.handshake_delay = HANDSHAKE_DELAY
+    print("with {:.0f}ms to set up each connection:".format(HANDSHAKE_DELAY * 1000))
+    compare(server, url)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares checking a mask against a few hundred ignore masks with fnmatch (the old ignore.is_ignored behaviour)
+against MaskMatcher.
+
+Run from the repository root with: python -m benchmarks.ignore_masks
+"""
+
+import random
+import string
+import timeit
+from fnmatch import fnmatch
+
+from cloudbot.util.masks import MaskMatcher
+
+PATTERNS = 300
+ITERATIONS = 20
+
+
+def random_word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def main():
+    rng = random.Random(0)
+    patterns = []
+    for number in range(PATTERNS):
+        if number % 10 == 0:
+            # a few wildcard host bans
+            patterns.append("*!*@*.{}.net".format(random_word(rng, 6)))
+        else:
+            # mostly nick ignores, as added by .ignore <nick>
+            patterns.append("{}!*@*".format(random_word(rng, 8)))
+
+    masks = ["{}!{}@{}.example.com".format(random_word(rng, 8), random_word(rng, 5), random_word(rng, 6))
+             for _ in range(500)]
+    masks += [pattern.replace("*", "x") for pattern in patterns[:50]]
+
+    matcher = MaskMatcher(patterns)
+    assert [any(fnmatch(mask, pattern) for pattern in patterns) for mask in masks] == \
+        [matcher.match(mask) for mask in masks]
+
+    def run_old():
+        for mask in masks:
+            for pattern in patterns:
+                if fnmatch(mask, pattern):
+                    break
+
+    def run_new():
+        for mask in masks:
+            matcher.match(mask)
+
+    old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(masks))
+    new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(masks))
+
+    print("{} ignore masks".format(len(patterns)))
+    print("fnmatch:     {:.3f} us/check".format(old_time * 1e6))
+    print("MaskMatcher: {:.3f} us/check".format(new_time * 1e6))
+    print("speedup:     {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compares parsing server lines with the regexes _IrcProtocol.data_received used to use against ircparse.parse_line,
+on a corpus of typical server lines (benchmarks/data/server_lines.txt).
+
+The regexes can't parse lines with IRCv3 tags at all, so those are only timed with the new parser.
+
+Run from the repository root with: python -m benchmarks.irc_parsing
+"""
+
+import os
+import re
+import timeit
+
+from cloudbot.util.ircparse import irc_clean, parse_line
+
+REPEAT = 200
+
+irc_prefix_re = re.compile(r":([^ ]*) ([^ ]*) (.*)")
+irc_noprefix_re = re.compile(r"([^ ]*) (.*)")
+irc_netmask_re = re.compile(r"([^!@]*)!([^@]*)@(.*)")
+irc_param_re = re.compile(r"(?:^|(?<= ))(:.*|[^ ]+)")
+
+irc_bad_chars = ''.join([chr(x) for x in list(range(0, 32)) + list(range(127, 160))])
+irc_clean_re = re.compile('[{}]'.format(re.escape(irc_bad_chars)))
+
+
+def old_parse(line):
+    if line.startswith(":"):
+        prefix_line_match = irc_prefix_re.match(line)
+        if prefix_line_match is None:
+            return None
+        netmask_prefix, command, params = prefix_line_match.groups()
+        netmask_match = irc_netmask_re.match(netmask_prefix)
+        if netmask_match is None:
+            nick, user, host = netmask_prefix, None, None
+        else:
+            nick, user, host = netmask_match.groups()
+        mask = netmask_prefix
+    else:
+        noprefix_line_match = irc_noprefix_re.match(line)
+        if noprefix_line_match is None:
+            return None
+        command, params = noprefix_line_match.groups()
+        nick = user = host = mask = None
+
+    command_params = irc_param_re.findall(params)
+    if command_params and command_params[-1].startswith(":"):
+        content = irc_clean_re.sub('', command_params[-1][1:])
+    else:
+        content = None
+    return mask, nick, user, host, command, command_params, content
+
+
+def new_parse(line):
+    parsed = parse_line(line)
+    if parsed is None:
+        return None
+    params = parsed.params
+    if params and params[-1].startswith(":"):
+        content = irc_clean(params[-1][1:])
+    else:
+        content = None
+    return parsed, content
+
+
+def as_tuple(result):
+    if result is None:
+        return None
+    parsed, content = result
+    return parsed.prefix, parsed.nick, parsed.user, parsed.host, parsed.command, parsed.params, content
+
+
+def main():
+    path = os.path.join(os.path.dirname(__file__), "data", "server_lines.txt")
+    with open(path, encoding="utf-8") as f:
+        corpus = [line.rstrip("\n") for line in f if line.strip()]
+
+    plain = [line for line in corpus if not line.startswith("@")]
+    for line in plain:
+        assert old_parse(line) == as_tuple(new_parse(line)), line
+    assert all(new_parse(line) is not None for line in corpus)
+
+    plain_lines = plain * REPEAT
+    all_lines = corpus * REPEAT
+
+    def run(parse, lines):
+        for line in lines:
+            parse(line)
+
+    old_time = min(timeit.repeat(lambda: run(old_parse, plain_lines), number=1, repeat=5))
+    new_time = min(timeit.repeat(lambda: run(new_parse, plain_lines), number=1, repeat=5))
+    tagged_time = min(timeit.repeat(lambda: run(new_parse, all_lines), number=1, repeat=5))
+
+    print("{} lines ({} with tags)".format(len(corpus), len(corpus) - len(plain)))
+    print("regexes:    {:.0f} lines/s".format(len(plain_lines) / old_time))
+    print("parse_line: {:.0f} lines/s".format(len(plain_lines) / new_time))
+    print("speedup:    {:.1f}x".format(old_time / new_time))
+    print("parse_line, including tagged lines: {:.0f} lines/s".format(len(all_lines) / tagged_time))
+
+
+if __name__ == "__main__":
+    main()
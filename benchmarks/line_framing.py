@@ -0,0 +1,71 @@
+"""
+Compares splitting a 50,000 line burst from a server (like a large NAMES list or ZNC playback) into lines the way
+_IrcProtocol used to (appending to a bytes buffer, and splitting off one line at a time) against LineFramer.
+
+The burst is fed in 256KiB reads, the most asyncio's transports read at once.
+
+Run from the repository root with: python -m benchmarks.line_framing
+"""
+
+import random
+import string
+import timeit
+
+from cloudbot.util.lineframer import LineFramer
+
+LINES = 50000
+READ_SIZE = 256 * 1024
+
+
+class OldFramer:
+    def __init__(self):
+        self._input_buffer = b""
+
+    def feed(self, data):
+        self._input_buffer += data
+        lines = []
+        while b"\r\n" in self._input_buffer:
+            line_data, self._input_buffer = self._input_buffer.split(b"\r\n", 1)
+            lines.append(line_data)
+        return lines
+
+
+def make_burst():
+    rng = random.Random(0)
+    lines = []
+    for number in range(LINES):
+        nick = "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(3, 12)))
+        text = " ".join("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(1, 9)))
+                        for _ in range(rng.randint(2, 20)))
+        lines.append(":{0}!~{0}@host{1}.example.com PRIVMSG #channel :{2}\r\n".format(nick, number, text))
+    data = "".join(lines).encode()
+    return [data[start:start + READ_SIZE] for start in range(0, len(data), READ_SIZE)]
+
+
+def run(framer_type, reads):
+    framer = framer_type()
+    count = 0
+    for data in reads:
+        count += len(framer.feed(data))
+    return count
+
+
+def main():
+    reads = make_burst()
+    assert run(OldFramer, reads) == run(LineFramer, reads) == LINES
+    old_framer = OldFramer()
+    new_framer = LineFramer()
+    assert [line for data in reads for line in old_framer.feed(data)] == \
+        [line for data in reads for line in new_framer.feed(data)]
+
+    old_time = min(timeit.repeat(lambda: run(OldFramer, reads), number=1, repeat=3))
+    new_time = min(timeit.repeat(lambda: run(LineFramer, reads), number=1, repeat=3))
+
+    print("{} lines, {} bytes in {} reads".format(LINES, sum(len(data) for data in reads), len(reads)))
+    print("bytes buffer: {:.3f}s ({:.0f} lines/s)".format(old_time, LINES / old_time))
+    print("LineFramer:   {:.3f}s ({:.0f} lines/s)".format(new_time, LINES / new_time))
+    print("speedup:      {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
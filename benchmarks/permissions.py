@@ -0,0 +1,90 @@
+"""
+Compares checking permissions for the users in a busy channel the way PermissionManager used to (fnmatch against
+every allowed mask, every time) against the precompiled and cached PermissionManager.
+
+Run from the repository root with: python -m benchmarks.permissions
+"""
+
+import logging
+import random
+import string
+import timeit
+from fnmatch import fnmatch
+
+from cloudbot.permissions import PermissionManager
+
+GROUPS = 10
+USERS_PER_GROUP = 30
+ITERATIONS = 20
+
+
+class FakeConn:
+    def __init__(self, config):
+        self.name = "benchmark"
+        self.config = config
+
+
+def random_word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def main():
+    # importing cloudbot sets up the bot's logging, keep the permission manager's messages out of its log files
+    logger = logging.getLogger("cloudbot")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger.addHandler(logging.NullHandler())
+
+    rng = random.Random(0)
+    perms = ["botcontrol", "ignore", "op", "snoonetstaff", "plpaste", "addfactoid", "chanop", "karma"]
+    config = {"permissions": {}}
+    for number in range(GROUPS):
+        users = []
+        for user_number in range(USERS_PER_GROUP):
+            if user_number % 5 == 0:
+                users.append("*!*@{}.example.net".format(random_word(rng, 6)))
+            else:
+                users.append("{}!*@*".format(random_word(rng, 8)))
+        config["permissions"]["group{}".format(number)] = {"perms": rng.sample(perms, 3), "users": users}
+
+    manager = PermissionManager(FakeConn(config))
+    perm_users = manager.perm_users
+
+    # a channel's worth of users, each checked for a couple of permissions on every line they send
+    masks = ["{}!{}@{}.example.com".format(random_word(rng, 8), random_word(rng, 5), random_word(rng, 6))
+             for _ in range(50)]
+    masks += [group_user.replace("*", "x") for group in config["permissions"].values()
+              for group_user in group["users"][:2]]
+    checks = [(rng.choice(masks), rng.choice(perms)) for _ in range(2000)]
+
+    def old_has_perm(user_mask, perm):
+        if perm.lower() not in perm_users:
+            return False
+        for allowed_mask in perm_users[perm.lower()]:
+            if fnmatch(user_mask.lower(), allowed_mask):
+                return True
+        return False
+
+    assert [old_has_perm(mask, perm) for mask, perm in checks] == \
+        [manager.has_perm_mask(mask, perm, notice=False) for mask, perm in checks]
+
+    def run_old():
+        for mask, perm in checks:
+            old_has_perm(mask, perm)
+
+    def run_new():
+        for mask, perm in checks:
+            manager.has_perm_mask(mask, perm, notice=False)
+
+    old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(checks))
+    new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(checks))
+
+    print("{} groups, {} permissions, {} distinct users".format(GROUPS, len(perm_users), len(set(masks))))
+    print("fnmatch:           {:.3f} us/check".format(old_time * 1e6))
+    print("PermissionManager: {:.3f} us/check".format(new_time * 1e6))
+    print("speedup:           {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares running every regex hook against every message (the old CloudBot.process behaviour) against the literal
+prefilter in RegexDispatcher, using the bundled regex hook patterns and a sample of channel traffic.
+
+Run from the repository root with: python -m benchmarks.regex_dispatch [corpus file]
+"""
+
+import os
+import sys
+import timeit
+
+from benchmarks.regex_patterns import PATTERNS
+from cloudbot.util.regexdispatch import RegexDispatcher
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "data", "chat_corpus.txt")
+ITERATIONS = 50
+
+
+class MockHook:
+    def __init__(self, name):
+        self.name = name
+        self.run_on_cmd = False
+
+
+def main():
+    corpus_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    with open(corpus_path, encoding="utf-8") as f:
+        lines = [line.rstrip("\r\n") for line in f]
+
+    regex_hooks = [(regex, MockHook(name)) for name, regex in PATTERNS]
+    dispatcher = RegexDispatcher()
+    for regex, hook in regex_hooks:
+        dispatcher.add(regex, hook)
+
+    def run_old():
+        found = []
+        for line in lines:
+            for regex, hook in regex_hooks:
+                match = regex.search(line)
+                if match:
+                    found.append((line, hook, match.group(0)))
+        return found
+
+    def run_new():
+        found = []
+        for line in lines:
+            for regex, hook, match in dispatcher.search(line):
+                found.append((line, hook, match.group(0)))
+        return found
+
+    assert run_old() == run_new()
+
+    candidates = sum(len(dispatcher.candidates(line)) for line in lines)
+
+    old_time = min(timeit.repeat(run_old, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(lines))
+    new_time = min(timeit.repeat(run_new, number=ITERATIONS, repeat=3)) / (ITERATIONS * len(lines))
+
+    print("{} lines, {} regex hooks".format(len(lines), len(regex_hooks)))
+    print("regexes run per line: {} before, {:.2f} after".format(len(regex_hooks), candidates / len(lines)))
+    print("every regex:     {:.3f} us/line".format(old_time * 1e6))
+    print("RegexDispatcher: {:.3f} us/line".format(new_time * 1e6))
+    print("speedup:         {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Copies of the regexes used by the bundled regex hooks, so benchmarks can use them without importing the plugins
+(and their dependencies).
+"""
+
+import re
+
+PATTERNS = [
+    ("amazon", re.compile(""".*ama?zo?n\.(com|co\.uk|com\.au|de|fr|ca|cn|es|it)/.*/(?:exec/obidos/ASIN/|o/|"""
+                          """gp/product/|\n(?:(?:[^"\'/]*)/)?dp/|)(B[A-Z0-9]{9})""", re.I)),
+    ("core_ctcp", re.compile(r'^\x01VERSION\x01$')),
+    ("core_ctcp", re.compile(r'^\x01PING\x01$')),
+    ("core_ctcp", re.compile(r'^\x01TIME\x01$')),
+    ("correction", re.compile(r"^[sS]/(.*/.*(?:/[igx]{,4})?)\S*$")),
+    ("factoids", re.compile(r'^{} ?(.+)'.format(re.escape("?")), re.I)),
+    ("googleurlparse", re.compile(r'.*(((www\.)?google\.com/url\?)[^ ]+)', re.I)),
+    ("imdb", re.compile(r'(.*:)//(imdb.com|www.imdb.com)(:[0-9]+)?(.*)', re.I)),
+    ("karma", re.compile('^([a-z0-9_\-\[\]\\^{}|`]{3,})(\+\+|\-\-)$', re.I)),
+    ("newegg", re.compile(r"(?:(?:www.newegg.com|newegg.com)/Product/Product\.aspx\?Item=)([-_a-zA-Z0-9]+)", re.I)),
+    ("reddit", re.compile(r'.*(((www\.)?reddit\.com/r|redd\.it)[^ ]+)', re.I)),
+    ("soundcloud", re.compile(r'(.*:)//(www.)?(soundcloud.com|snd.sc)(.*)', re.I)),
+    ("speedtest", re.compile(r'.*://www.speedtest.net/my-result/([0-9]+)?.*', re.I)),
+    ("spotify", re.compile(r'(open\.spotify\.com/(track|album|artist|user)/([a-zA-Z0-9]+))', re.I)),
+    ("spotify", re.compile(r'(spotify:(track|album|artist|user):([a-zA-Z0-9]+))', re.I)),
+    ("steam_store", re.compile(r'.*://store.steampowered.com/app/([0-9]+)?.*', re.I)),
+    ("twitch", re.compile(r'(.*:)//(www.multitwitch.tv|multitwitch.tv)/(.*)', re.I)),
+    ("twitch", re.compile(r'(.*:)//(twitch.tv|www.twitch.tv)(:[0-9]+)?(.*)', re.I)),
+    ("twitter", re.compile(r"(?:(?:www.twitter.com|twitter.com)/(?:[-_a-zA-Z0-9]+)/status/)([0-9]+)", re.I)),
+    ("vimeo", re.compile(r'vimeo.com/([0-9]+)')),
+    ("voat", re.compile(r'.*(((www\.)?voat\.co/v)[^ ]+)', re.I)),
+    ("youtube", re.compile(r'(?:youtube.*?(?:v=|/v/)|youtu\.be/|yooouuutuuube.*?id=)([-_a-zA-Z0-9]+)', re.I)),
+    ("youtube", re.compile(r'(.*:)//(www.youtube.com/playlist|youtube.com/playlist)(:[0-9]+)?(.*)', re.I)),
+]
@@ -0,0 +1,86 @@
+"""
+Compares how many channel messages per second the seen tracker can record the way history.track_seen used to (an
+`insert or replace` and a commit for every message) against queueing them in the WriteBehindQueue, which writes them
+in batches and keeps only the last message from each nick in each channel.
+
+Both write to a SQLite database file, so each commit pays for the journal and fsync like the bot's own database does.
+The write-behind time includes the final flush.
+
+Run from the repository root with: python -m benchmarks.seen_tracking
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from cloudbot.util.database import WriteBehindQueue
+
+MESSAGES = 2000
+NICKS = 40
+CHANNELS = ["#cloudbot", "#python", "#help", "#offtopic"]
+
+QUERY = "insert or replace into seen_user(name, time, quote, chan, host) values(:name,:time,:quote,:chan,:host)"
+
+
+def create_database(path):
+    connection = sqlite3.connect(path)
+    connection.execute("create table if not exists seen_user(name, time, quote, chan, host, primary key(name, chan))")
+    connection.commit()
+    connection.close()
+
+
+def read_seen(path):
+    connection = sqlite3.connect(path)
+    try:
+        return sorted(connection.execute("select name, quote, chan from seen_user").fetchall())
+    finally:
+        connection.close()
+
+
+def main():
+    rng = random.Random(0)
+    with open(os.path.join(os.path.dirname(__file__), "data", "chat_corpus.txt"), encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    nicks = ["user{}".format(number) for number in range(NICKS)]
+    messages = []
+    for _ in range(MESSAGES):
+        nick = rng.choice(nicks)
+        messages.append({"name": nick, "time": time.time(), "quote": rng.choice(corpus), "chan": rng.choice(CHANNELS),
+                         "host": "{}!~{}@example.com".format(nick, nick)})
+
+    with tempfile.TemporaryDirectory() as directory:
+        old_path = os.path.join(directory, "old.db")
+        new_path = os.path.join(directory, "new.db")
+        create_database(old_path)
+        create_database(new_path)
+
+        connection = sqlite3.connect(old_path)
+        start = time.perf_counter()
+        for params in messages:
+            connection.execute(QUERY, params)
+            connection.commit()
+        old_time = time.perf_counter() - start
+        connection.close()
+
+        queue = WriteBehindQueue(lambda: sqlite3.connect(new_path), interval=1.0, batch_size=200)
+        queue.start()
+        start = time.perf_counter()
+        for params in messages:
+            queue.enqueue(QUERY, params, key=("seen_user", params["name"], params["chan"]))
+        queue.stop()
+        new_time = time.perf_counter() - start
+
+        assert read_seen(old_path) == read_seen(new_path)
+        stats = queue.stats()
+
+    print("{} messages from {} nicks in {} channels".format(MESSAGES, NICKS, len(CHANNELS)))
+    print("commit per message: {:.0f} messages/s".format(MESSAGES / old_time))
+    print("write-behind:       {:.0f} messages/s ({} statements written in {} flushes, {} coalesced)".format(
+        MESSAGES / new_time, stats["written"], stats["flushes"], stats["coalesced"]))
+    print("speedup:            {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
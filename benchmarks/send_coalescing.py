@@ -0,0 +1,128 @@
+"""
+Compares sending multi-line replies the way IrcClient used to (a call_soon_threadsafe hop, a task and a transport
+write for every line) against the current path (one hop per batch, the SendQueue, and a single write per flush),
+using a fake transport which just counts writes.
+
+Flood control is given a huge burst here, so this measures the overhead of getting lines onto the transport, not
+rate limiting.
+
+Run from the repository root with: python -m benchmarks.send_coalescing
+"""
+
+import asyncio
+import timeit
+from collections import deque
+
+from cloudbot.util.sendqueue import SendQueue, encode_line
+
+# asyncio.async was renamed to ensure_future
+start_task = getattr(asyncio, "ensure_future", None) or getattr(asyncio, "async")
+
+REPLIES = 200
+LINES_PER_REPLY = 10
+ITERATIONS = 5
+
+
+class FakeTransport:
+    def __init__(self):
+        self.writes = 0
+        self.data = []
+
+    def write(self, data):
+        self.writes += 1
+        self.data.append(data)
+
+
+class OldSender:
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self.transport = transport
+
+    def send(self, line):
+        self.loop.call_soon_threadsafe(self._send, line)
+
+    def _send(self, line):
+        start_task(self._protocol_send(line), loop=self.loop)
+
+    def _protocol_send(self, line):
+        line = line[:510] + "\r\n"
+        self.transport.write(line.encode("utf-8", "replace"))
+        # a generator, so it can run as a task on any version of asyncio
+        yield from ()
+
+
+class NewSender:
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self.transport = transport
+        self.send_queue = SendQueue(burst=10 ** 9, rate=1)
+        self._flush_handle = None
+        self._outgoing = deque()
+        self._outgoing_scheduled = False
+
+    def send(self, line):
+        self._outgoing.append(line)
+        if not self._outgoing_scheduled:
+            self._outgoing_scheduled = True
+            self.loop.call_soon_threadsafe(self._take_outgoing)
+
+    def _take_outgoing(self):
+        self._outgoing_scheduled = False
+        while self._outgoing:
+            self._send(self._outgoing.popleft())
+
+    def _send(self, line):
+        self.send_queue.put(line)
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        lines = self.send_queue.pop_ready()
+        if lines:
+            self.transport.write(b"".join(encode_line(line) for line in lines))
+
+
+def run_sender(sender_type, replies):
+    loop = asyncio.new_event_loop()
+    transport = FakeTransport()
+    sender = sender_type(loop, transport)
+
+    def send_replies():
+        for reply in replies:
+            # each reply is sent as a batch, like conn.message(target, *lines) from a hook
+            for line in reply:
+                sender.send(line)
+            # one iteration to pick up the lines, one more to write them
+            for _ in range(2):
+                loop.call_soon(loop.stop)
+                loop.run_forever()
+
+    send_replies()
+    loop.close()
+    return transport
+
+
+def main():
+    replies = []
+    for reply_number in range(REPLIES):
+        target = "#channel{}".format(reply_number % 5)
+        replies.append(["PRIVMSG {} :reply {} line {}: {}".format(target, reply_number, line_number, "text " * 20)
+                        for line_number in range(LINES_PER_REPLY)])
+
+    old_transport = run_sender(OldSender, replies)
+    new_transport = run_sender(NewSender, replies)
+    assert b"".join(old_transport.data) == b"".join(new_transport.data)
+
+    lines = REPLIES * LINES_PER_REPLY
+    old_time = min(timeit.repeat(lambda: run_sender(OldSender, replies), number=ITERATIONS, repeat=3))
+    new_time = min(timeit.repeat(lambda: run_sender(NewSender, replies), number=ITERATIONS, repeat=3))
+
+    print("{} replies of {} lines".format(REPLIES, LINES_PER_REPLY))
+    print("per-line tasks: {:.0f} lines/s, {} writes".format(lines * ITERATIONS / old_time, old_transport.writes))
+    print("coalesced:      {:.0f} lines/s, {} writes".format(lines * ITERATIONS / new_time, new_transport.writes))
+    print("speedup:        {:.1f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares the quote and tell plugins' lookups on a million-row SQLite table before and after applying their migrations,
+which add indexes for those lookups and ANALYZE the tables.
+
+The queries are the ones the plugins run: looking up a nick's unread tells (on every message), and counting and
+fetching a nick's or a channel's quotes.
+
+Run from the repository root with: python -m benchmarks.table_indexes
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from cloudbot.util.migrations import Migration, MigrationContext, add_index, analyze, migrate
+
+ROWS = 1000000
+NICKS = 20000
+CHANNELS = 200
+LOOKUPS = 200
+
+TELL_QUERY = "SELECT sender, message, time_sent FROM tells WHERE connection = ? AND target = ? AND is_read = 0 " \
+             "ORDER BY time_sent"
+QUOTE_NICK_QUERY = "SELECT time, nick, msg FROM quote WHERE deleted != 1 AND nick = ? ORDER BY time"
+QUOTE_CHAN_QUERY = "SELECT count(*) FROM quote WHERE deleted != 1 AND chan = ?"
+
+
+# the same as the plugins' migrations, which can't be imported outside the bot since their tables need its metadata
+tell_migrations = [
+    Migration(1, add_index("tells_unread", "tells", "connection", "target", "is_read"), analyze("tells")),
+]
+quote_migrations = [
+    Migration(1,
+              add_index("quote_nick", "quote", "nick", "deleted"),
+              add_index("quote_chan", "quote", "chan", "deleted"),
+              analyze("quote")),
+]
+
+
+class SQLiteContext(MigrationContext):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        return self.connection.execute(statement, params or {}).fetchall()
+
+    def columns(self, table):
+        return [row[1] for row in self.connection.execute("PRAGMA table_info({})".format(table))]
+
+
+def fill(connection, rng):
+    connection.execute("CREATE TABLE tells (connection VARCHAR(25), sender VARCHAR(25), target VARCHAR(25), "
+                       "message VARCHAR(500), is_read BOOLEAN, time_sent DATETIME, time_read DATETIME)")
+    connection.execute("CREATE TABLE quote (chan VARCHAR(25), nick VARCHAR(25), add_nick VARCHAR(25), "
+                       "msg VARCHAR(500), time REAL, deleted VARCHAR(5), PRIMARY KEY (chan, nick, time))")
+    connection.executemany("INSERT INTO tells VALUES (?, ?, ?, ?, ?, ?, NULL)", (
+        ("net{}".format(number % 3), "sender", "nick{}".format(rng.randrange(NICKS)), "message {}".format(number),
+         # most tells have been read
+         int(rng.random() < 0.95), number) for number in range(ROWS)))
+    connection.executemany("INSERT INTO quote VALUES (?, ?, ?, ?, ?, ?)", (
+        ("#chan{}".format(rng.randrange(CHANNELS)), "nick{}".format(rng.randrange(NICKS)), "adder",
+         "quote {}".format(number), float(number), "0") for number in range(ROWS)))
+    connection.commit()
+
+
+def run_lookups(connection, lookups):
+    results = []
+    for tell_params, nick, chan in lookups:
+        results.append(connection.execute(TELL_QUERY, tell_params).fetchall())
+        results.append(connection.execute(QUOTE_NICK_QUERY, (nick,)).fetchall())
+        results.append(connection.execute(QUOTE_CHAN_QUERY, (chan,)).fetchall())
+    return results
+
+
+def time_lookups(connection, lookups):
+    start = time.perf_counter()
+    results = run_lookups(connection, lookups)
+    return (time.perf_counter() - start) / len(lookups), results
+
+
+def main():
+    rng = random.Random(0)
+    lookups = [(("net{}".format(rng.randrange(3)), "nick{}".format(rng.randrange(NICKS))),
+                "nick{}".format(rng.randrange(NICKS)), "#chan{}".format(rng.randrange(CHANNELS)))
+               for _ in range(LOOKUPS)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "benchmark.db"))
+        fill(connection, rng)
+
+        old_time, old_results = time_lookups(connection, lookups)
+
+        context = SQLiteContext(connection)
+        start = time.perf_counter()
+        migrate(context, "tell", tell_migrations)
+        migrate(context, "quote", quote_migrations)
+        connection.commit()
+        migration_time = time.perf_counter() - start
+
+        new_time, new_results = time_lookups(connection, lookups)
+        connection.close()
+
+    assert old_results == new_results
+
+    print("{} rows in each of tells and quote, {} rounds of lookups".format(ROWS, LOOKUPS))
+    print("(each round is a nick's unread tells, a nick's quotes and a channel's quote count)")
+    print("migrations (indexes and ANALYZE): {:.1f}s, once".format(migration_time))
+    print("without indexes: {:.2f} ms per round".format(old_time * 1000))
+    print("with indexes:    {:.3f} ms per round".format(new_time * 1000))
+    print("speedup:         {:.0f}x".format(old_time / new_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Compares the tell plugin's per-message work the way it used to be done against the per-connection counters it keeps
+now, with 1k, 10k and 100k unread tells waiting.
+
+Every message the bot sees runs tell_check: it used to scan a list with one (connection, target) pair per unread tell,
+and now it's a dict lookup. Sending or reading a tell used to reload that list from every unread row in the table, and
+now adjusts one counter. Both are timed against a SQLite table with the plugin's index.
+
+The plugin's functions are mirrored here, as plugins can't be imported outside the bot.
+
+Run from the repository root with: python -m benchmarks.tell_check
+"""
+
+import random
+import sqlite3
+import time
+
+SIZES = [1000, 10000, 100000]
+NICKS = 200000
+MESSAGES = 2000
+UPDATES = 20
+
+CONNECTIONS = ["esper", "freenode", "snoonet"]
+
+
+def create_database(rng, size):
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE tells (connection VARCHAR(25), sender VARCHAR(25), target VARCHAR(25), "
+                       "message VARCHAR(500), is_read BOOLEAN, time_sent DATETIME, time_read DATETIME)")
+    connection.execute("CREATE INDEX tells_unread ON tells (connection, target, is_read)")
+    connection.executemany("INSERT INTO tells VALUES (?, 'sender', ?, ?, 0, ?, NULL)", (
+        (rng.choice(CONNECTIONS), "nick{}".format(rng.randrange(NICKS)), "message {}".format(number), number)
+        for number in range(size)))
+    connection.commit()
+    return connection
+
+
+def load_list(db):
+    return [(conn, target) for conn, target in db.execute("SELECT connection, target FROM tells WHERE is_read = 0")]
+
+
+def check_list(cache, conn, nick):
+    for _conn, _target in cache:
+        if (conn, nick.lower()) == (_conn, _target):
+            return True
+        else:
+            continue
+
+
+def load_counts(db):
+    cache = {}
+    for conn, target in db.execute("SELECT connection, target FROM tells WHERE is_read = 0"):
+        targets = cache.setdefault(conn, {})
+        targets[target] = targets.get(target, 0) + 1
+    return cache
+
+
+def update_counts(cache, conn, target, change):
+    targets = cache.setdefault(conn.lower(), {})
+    count = targets.get(target.lower(), 0) + change
+    if count > 0:
+        targets[target.lower()] = count
+    else:
+        targets.pop(target.lower(), None)
+        if not targets:
+            del cache[conn.lower()]
+
+
+def check_counts(cache, conn, nick):
+    return cache.get(conn.lower(), {}).get(nick.lower(), 0) > 0
+
+
+def add_tell(db, conn, target, number):
+    db.execute("INSERT INTO tells VALUES (?, 'sender', ?, ?, 0, ?, NULL)", (conn, target, "new {}".format(number), 0))
+    db.commit()
+
+
+def read_all_tells(db, conn, target):
+    result = db.execute("UPDATE tells SET is_read = 1 WHERE connection = ? AND target = ? AND is_read = 0",
+                        (conn, target))
+    db.commit()
+    return result.rowcount
+
+
+def time_updates(db, updates, reload):
+    """
+    Sends then reads a tell for each of the given nicks, the old way (reloading the cache) or the new way
+    """
+    cache = load_list(db) if reload else load_counts(db)
+    start = time.perf_counter()
+    for number, (conn, nick) in enumerate(updates):
+        add_tell(db, conn, nick, number)
+        if reload:
+            cache = load_list(db)
+        else:
+            update_counts(cache, conn, nick, 1)
+        read = read_all_tells(db, conn, nick)
+        if reload:
+            cache = load_list(db)
+        else:
+            update_counts(cache, conn, nick, -read)
+    return (time.perf_counter() - start) / (len(updates) * 2), cache
+
+
+def main():
+    rng = random.Random(0)
+    print("{} messages from random nicks, {} tells sent and read".format(MESSAGES, UPDATES))
+    print("{:>8} | {:>14} {:>14} | {:>14} {:>14}".format("unread", "old check", "new check", "old send/read",
+                                                         "new send/read"))
+    for size in SIZES:
+        db = create_database(rng, size)
+        # a few of the senders have mail, most don't
+        messages = [(rng.choice(CONNECTIONS), "nick{}".format(rng.randrange(NICKS))) for _ in range(MESSAGES)]
+
+        old_cache = load_list(db)
+        start = time.perf_counter()
+        old_results = [check_list(old_cache, conn, nick) for conn, nick in messages]
+        old_check = (time.perf_counter() - start) / MESSAGES
+
+        new_cache = load_counts(db)
+        start = time.perf_counter()
+        new_results = [check_counts(new_cache, conn, nick) for conn, nick in messages]
+        new_check = (time.perf_counter() - start) / MESSAGES
+
+        assert [bool(result) for result in old_results] == new_results
+
+        updates = rng.sample(messages, UPDATES)
+        old_update, old_cache = time_updates(db, updates, reload=True)
+        new_update, new_cache = time_updates(db, updates, reload=False)
+        assert new_cache == load_counts(db)
+        assert sorted(old_cache) == sorted(load_list(db))
+        db.close()
+
+        print("{:>8} | {:>11.2f} us {:>11.2f} us | {:>11.2f} ms {:>11.2f} ms".format(
+            size, old_check * 1e6, new_check * 1e6, old_update * 1000, new_update * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@ import collections
 import re
 import os
 import gc
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy import pool as sqlalchemy_pool
 
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
@@ -17,7 +18,10 @@ from cloudbot.config import Config
 from cloudbot.reloader import PluginReloader
 from cloudbot.plugin import PluginManager
 from cloudbot.event import Event, CommandEvent, RegexEvent, EventType
-from cloudbot.util import database, formatting
+from cloudbot.util import database, formatting, httpclient
+from cloudbot.util.dbengine import StatementTimer, engine_arguments, is_sqlite, sqlite_pragmas
+from cloudbot.util.dbexecutor import DatabaseExecutor
+from cloudbot.util.httpclient import HttpClient
 from cloudbot.clients.irc import IrcClient
 
 try:
@@ -37,6 +41,16 @@ def clean_name(n):
     return re.sub('[^A-Za-z0-9_]+', '', n.replace(" ", "_"))
 
 
+def is_core_hook(hook):
+    """
+    Returns whether a hook belongs to one of the core plugins, which keep track of the bot's own state and are never
+    skipped under load
+    :type hook: cloudbot.plugin.Hook
+    :rtype: bool
+    """
+    return hook.plugin.title.startswith("core_")
+
+
 class CloudBot:
     """
     :type start_time: float
@@ -47,8 +61,12 @@ class CloudBot:
     :type plugin_manager: PluginManager
     :type reloader: PluginReloader
     :type db_engine: sqlalchemy.engine.Engine
+    :type db_timer: StatementTimer
     :type db_factory: sqlalchemy.orm.session.sessionmaker
     :type db_session: sqlalchemy.orm.scoping.scoped_session
+    :type db_executor: DatabaseExecutor
+    :type write_behind: cloudbot.util.database.WriteBehindQueue
+    :type http: HttpClient
     :type db_metadata: sqlalchemy.sql.schema.MetaData
     :type loop: asyncio.events.AbstractEventLoop
     :type stopped_future: asyncio.Future
@@ -92,9 +110,15 @@ class CloudBot:
 
         # setup db
         db_path = self.config.get('database', 'sqlite:///cloudbot.db')
-        self.db_engine = create_engine(db_path)
+        self.db_engine = self._create_db_engine(db_path, self.config.get("database_options", {}))
         self.db_factory = sessionmaker(bind=self.db_engine)
         self.db_session = scoped_session(self.db_factory)
+        # database threads for coroutine hooks
+        self.db_executor = DatabaseExecutor(self.db_factory, self.config.get("database_workers", 4))
+        # batches frequent writes from plugins into one transaction
+        write_behind_config = self.config.get("write_behind", {})
+        self.write_behind = database.WriteBehindQueue(self.db_factory, write_behind_config.get("interval", 1.0),
+                                                      write_behind_config.get("batch_size", 200))
         self.db_metadata = MetaData()
         self.db_base = declarative_base(metadata=self.db_metadata, bind=self.db_engine)
 
@@ -105,9 +129,16 @@ class CloudBot:
         # set botvars so plugins can access when loading
         database.metadata = self.db_metadata
         database.base = self.db_base
+        database.write_behind = self.write_behind
+        self.write_behind.start()
 
         logger.debug("Database system initialised.")
 
+        # the HTTP client plugins share, with its requests for coroutine hooks run on the "web" pool
+        self.http = HttpClient(self.config.get("http", {}), self.loop,
+                               lambda: self.plugin_manager.executors.get("web"))
+        httpclient.client = self.http
+
         # Bot initialisation complete
         logger.debug("Bot setup completed.")
 
@@ -119,6 +150,37 @@ class CloudBot:
 
         self.plugin_manager = PluginManager(self)
 
+    def _create_db_engine(self, db_path, options):
+        """
+        Creates the database engine, applying SQLite pragmas to each connection, and timing each statement
+        :type db_path: str
+        :type options: dict
+        :rtype: sqlalchemy.engine.Engine
+        """
+        arguments = engine_arguments(db_path, options)
+        pool_class = arguments.pop("poolclass_name", None)
+        if pool_class is not None:
+            arguments["poolclass"] = getattr(sqlalchemy_pool, pool_class)
+        engine = create_engine(db_path, **arguments)
+
+        if is_sqlite(db_path):
+            pragmas = sqlite_pragmas(options)
+
+            def apply_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                try:
+                    for pragma in pragmas:
+                        cursor.execute(pragma)
+                finally:
+                    cursor.close()
+
+            event.listen(engine, "connect", apply_pragmas)
+
+        self.db_timer = StatementTimer(options.get("slow_statement", 0.5))
+        event.listen(engine, "before_cursor_execute", self.db_timer.before_execute)
+        event.listen(engine, "after_cursor_execute", self.db_timer.after_execute)
+        return engine
+
     def run(self):
         """
         Starts CloudBot.
@@ -179,6 +241,19 @@ class CloudBot:
                 continue
             connection.close()
 
+        # stop periodic hooks
+        self.plugin_manager.scheduler.cancel_all()
+
+        # don't wait for hung hooks, their threads are abandoned
+        self.plugin_manager.executors.shutdown(wait=False)
+        self.db_executor.shutdown(wait=False)
+
+        self.http.close()
+
+        # write everything plugins have queued before we exit
+        logger.debug("Flushing queued database writes.")
+        yield from self.loop.run_in_executor(None, self.write_behind.stop)
+
         self.running = False
         # Give the stopped_future a result, so that run() will exit
         self.stopped_future.set_result(restart)
@@ -212,73 +287,121 @@ class CloudBot:
         # Run a manual garbage collection cycle, to clean up any unused objects created during initialization
         gc.collect()
 
+    def has_core_hooks(self, event):
+        """
+        Returns whether any core hook will run for the given event
+        :type event: Event
+        :rtype: bool
+        """
+        for raw_hook in self.plugin_manager.catch_all_triggers:
+            if is_core_hook(raw_hook):
+                return True
+        for raw_hook in self.plugin_manager.raw_triggers.get(event.irc_command, ()):
+            if is_core_hook(raw_hook):
+                return True
+        for event_hook in self.plugin_manager.event_type_hooks.get(event.type, ()):
+            if is_core_hook(event_hook):
+                return True
+        return False
+
     @asyncio.coroutine
-    def process(self, event):
+    def process(self, event, shed=False):
+        """
+        Runs every hook the event triggers, and returns the number of hooks which were skipped.
+
+        :param shed: If the connection is backed up, in which case only core hooks and commands are run
+        :type event: Event
+        :type shed: bool
+        :rtype: int
+        """
+        skipped, hooks_done = self.dispatch(event, shed)
+        yield from hooks_done
+        return skipped
+
+    def dispatch(self, event, shed=False):
         """
+        Starts every hook the event triggers, without waiting for them to finish. Returns the number of hooks which
+        were skipped, and a future which is done once the hooks with a time limit have finished. Hooks without one
+        (like keep_alive, which runs for as long as the connection does) aren't waited for.
+
+        :param shed: If the connection is backed up, in which case only core hooks and commands are run
         :type event: Event
+        :type shed: bool
+        :rtype: (int, asyncio.Future)
         """
         run_before_tasks = []
         tasks = []
-        command_prefix = event.conn.config.get('command_prefix', '.')
+        skipped = 0
 
         # Raw IRC hook
         for raw_hook in self.plugin_manager.catch_all_triggers:
+            if shed and not is_core_hook(raw_hook):
+                skipped += 1
+                continue
             # run catch-all coroutine hooks before all others - TODO: Make this a plugin argument
             if not raw_hook.threaded:
-                run_before_tasks.append(
-                    self.plugin_manager.launch(raw_hook, Event(hook=raw_hook, base_event=event)))
+                run_before_tasks.append((raw_hook, Event(hook=raw_hook, base_event=event)))
             else:
-                tasks.append(self.plugin_manager.launch(raw_hook, Event(hook=raw_hook, base_event=event)))
+                tasks.append((raw_hook, Event(hook=raw_hook, base_event=event)))
         if event.irc_command in self.plugin_manager.raw_triggers:
             for raw_hook in self.plugin_manager.raw_triggers[event.irc_command]:
-                tasks.append(self.plugin_manager.launch(raw_hook, Event(hook=raw_hook, base_event=event)))
+                if shed and not is_core_hook(raw_hook):
+                    skipped += 1
+                    continue
+                tasks.append((raw_hook, Event(hook=raw_hook, base_event=event)))
 
         # Event hooks
         if event.type in self.plugin_manager.event_type_hooks:
             for event_hook in self.plugin_manager.event_type_hooks[event.type]:
-                tasks.append(self.plugin_manager.launch(event_hook, Event(hook=event_hook, base_event=event)))
+                if shed and not is_core_hook(event_hook):
+                    skipped += 1
+                    continue
+                tasks.append((event_hook, Event(hook=event_hook, base_event=event)))
 
         if event.type is EventType.message:
             # Commands
-            if event.chan.lower() == event.nick.lower():  # private message, no command prefix
-                command_re = r'(?i)^(?:[{}]?|{}[,;:]+\s+)(\w+)(?:$|\s+)(.*)'.format(command_prefix, event.conn.nick)
-            else:
-                command_re = r'(?i)^(?:[{}]|{}[,;:]+\s+)(\w+)(?:$|\s+)(.*)'.format(command_prefix, event.conn.nick)
-
-            cmd_match = re.match(command_re, event.content)
+            private = event.chan.lower() == event.nick.lower()  # private message, no command prefix
+            cmd_match = event.conn.command_matcher.match(event.content, private=private)
 
             if cmd_match:
                 command = cmd_match.group(1).lower()
-                if command in self.plugin_manager.commands:
-                    command_hook = self.plugin_manager.commands[command]
+                # look up the command, or the only command it's an abbreviation of
+                command_hook = self.plugin_manager.commands.resolve(command)
+                if command_hook is not None:
                     command_event = CommandEvent(hook=command_hook, text=cmd_match.group(2).strip(),
-                                             triggered_command=command, base_event=event)
-                    tasks.append(self.plugin_manager.launch(command_hook, command_event))
+                                                 triggered_command=command, base_event=event)
+                    tasks.append((command_hook, command_event))
                 else:
-                    potential_matches = []
-                    for potential_match, plugin in self.plugin_manager.commands.items():
-                        if potential_match.startswith(command):
-                            potential_matches.append((potential_match, plugin))
+                    potential_matches = self.plugin_manager.commands.prefix_matches(command)
                     if potential_matches:
-                        if len(potential_matches) == 1:
-                            command_hook = potential_matches[0][1]
-                            command_event = CommandEvent(hook=command_hook, text=cmd_match.group(2).strip(),
-                                                     triggered_command=command, base_event=event)
-                            tasks.append(self.plugin_manager.launch(command_hook, command_event))
-                        else:
-                            event.notice("Possible matches: {}".format(
-                                formatting.get_text_list([command for command, plugin in potential_matches])))
+                        event.notice("Possible matches: {}".format(formatting.get_text_list(potential_matches)))
 
             # Regex hooks
-            for regex, regex_hook in self.plugin_manager.regex_hooks:
-                if not regex_hook.run_on_cmd and cmd_match:
-                    pass
-                else:
-                    regex_match = regex.search(event.content)
-                    if regex_match:
-                        regex_event = RegexEvent(hook=regex_hook, match=regex_match, base_event=event)
-                        tasks.append(self.plugin_manager.launch(regex_hook, regex_event))
+            # only the hooks whose regex could possibly match this message are actually run
+            regex_matches = self.plugin_manager.regex_hooks.search(event.content, is_command=bool(cmd_match))
+            for regex, regex_hook, regex_match in regex_matches:
+                if shed and not is_core_hook(regex_hook):
+                    skipped += 1
+                    continue
+                regex_event = RegexEvent(hook=regex_hook, match=regex_match, base_event=event)
+                tasks.append((regex_hook, regex_event))
 
         # Run the tasks
-        yield from asyncio.gather(*run_before_tasks, loop=self.loop)
-        yield from asyncio.gather(*tasks, loop=self.loop)
+        return skipped, asyncio.async(self._run_hooks(run_before_tasks, tasks), loop=self.loop)
+
+    @asyncio.coroutine
+    def _run_hooks(self, run_before_tasks, tasks):
+        """
+        Runs the run-before hooks, then starts the rest, and waits for the ones with a time limit
+        :type run_before_tasks: list[(cloudbot.plugin.Hook, Event)]
+        :type tasks: list[(cloudbot.plugin.Hook, Event)]
+        """
+        yield from asyncio.gather(*[self.plugin_manager.launch(task_hook, task_event) for task_hook, task_event in
+                                    run_before_tasks],
+                                  loop=self.loop)
+        limited = []
+        for task_hook, task_event in tasks:
+            task = asyncio.async(self.plugin_manager.launch(task_hook, task_event), loop=self.loop)
+            if self.plugin_manager.get_timeout(task_hook) is not None:
+                limited.append(task)
+        yield from asyncio.gather(*limited, loop=self.loop)
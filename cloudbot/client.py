@@ -3,6 +3,8 @@ import logging
 import collections
 
 from cloudbot.permissions import PermissionManager
+from cloudbot.util.commandmatch import CommandMatcher
+from cloudbot.util.ratelimit import CommandRateLimits
 
 logger = logging.getLogger("cloudbot")
 
@@ -19,6 +21,7 @@ class Client:
     :type vars: dict
     :type history: dict[str, list[tuple]]
     :type permissions: PermissionManager
+    :type command_matcher: CommandMatcher
     """
 
     def __init__(self, bot, name, nick, *, channels=None, config=None):
@@ -32,7 +35,6 @@ class Client:
         self.bot = bot
         self.loop = bot.loop
         self.name = name
-        self.nick = nick
 
         if channels is None:
             self.channels = []
@@ -43,18 +45,58 @@ class Client:
             self.config = {}
         else:
             self.config = config
+
+        # create command matcher, this is kept up to date by the nick setter
+        self.command_matcher = CommandMatcher(nick, self.config.get("command_prefix", "."))
+        self.nick = nick
         self.vars = {}
         self.history = {}
 
         # create permissions manager
         self.permissions = PermissionManager(self)
 
+        # command rate limits, checked by core_sieve
+        self.rate_limits = CommandRateLimits()
+        self._load_rate_limits()
+
         # for plugins to abuse
         self.memory = collections.defaultdict()
 
         # set when on_load in core_misc is done
         self.ready = False
 
+    @property
+    def nick(self):
+        """
+        :rtype: str
+        """
+        return self._nick
+
+    @nick.setter
+    def nick(self, value):
+        """
+        :type value: str
+        """
+        self._nick = value
+        self.command_matcher.update(value, self.config.get("command_prefix", "."))
+
+    def reload(self):
+        """
+        Reloads any state on this connection which is derived from the config
+        """
+        self.permissions.reload()
+        self.command_matcher.update(self.nick, self.config.get("command_prefix", "."))
+        self._load_rate_limits()
+
+    def _load_rate_limits(self):
+        """
+        Sets the command rate limits from the config, keeping the old ones if they aren't valid
+        """
+        try:
+            self.rate_limits.configure(self.config.get("ratelimit", {}))
+        except (ValueError, TypeError) as e:
+            logger.error("[{}] Invalid ratelimit config, not changing rate limits: {}".format(self.name, e))
+
     def describe_server(self):
         raise NotImplementedError
 
@@ -1,26 +1,21 @@
 from _ssl import PROTOCOL_SSLv23
 import asyncio
-import re
+from collections import deque
+from functools import partial
 import ssl
 import logging
 from ssl import SSLContext
 
 from cloudbot.client import Client
 from cloudbot.event import Event, EventType
+from cloudbot.util.decoding import Decoder, default_encodings
+from cloudbot.util.inbound import InboundQueue
+from cloudbot.util.ircparse import irc_clean, parse_line
+from cloudbot.util.lineframer import LineFramer
+from cloudbot.util.sendqueue import SendQueue, encode_line
 
 logger = logging.getLogger("cloudbot")
 
-irc_prefix_re = re.compile(r":([^ ]*) ([^ ]*) (.*)")
-irc_noprefix_re = re.compile(r"([^ ]*) (.*)")
-irc_netmask_re = re.compile(r"([^!@]*)!([^@]*)@(.*)")
-irc_param_re = re.compile(r"(?:^|(?<= ))(:.*|[^ ]+)")
-
-irc_bad_chars = ''.join([chr(x) for x in list(range(0, 32)) + list(range(127, 160))])
-irc_clean_re = re.compile('[{}]'.format(re.escape(irc_bad_chars)))
-
-def irc_clean(dirty):
-    return irc_clean_re.sub('', dirty)
-
 irc_command_to_event_type = {
     "PRIVMSG": EventType.message,
     "JOIN": EventType.join,
@@ -30,18 +25,6 @@ irc_command_to_event_type = {
 }
 
 
-def decode(bytestring):
-    """
-    Tries to decode a bytestring using multiple encoding formats
-    """
-    for codec in ('utf-8', 'iso-8859-1', 'shift_jis', 'cp1252'):
-        try:
-            return bytestring.decode(codec)
-        except UnicodeDecodeError:
-            continue
-    return bytestring.decode('utf-8', errors='ignore')
-
-
 class IrcClient(Client):
     """
     An implementation of Client for IRC.
@@ -50,6 +33,9 @@ class IrcClient(Client):
     :type port: int
     :type _connected: bool
     :type _ignore_cert_errors: bool
+    :type send_queue: SendQueue
+    :type decoder: Decoder
+    :type inbound: InboundQueue
     """
 
     def __init__(self, bot, name, nick, *, channels=None, config=None,
@@ -93,6 +79,54 @@ class IrcClient(Client):
         self._transport = None
         self._protocol = None
 
+        # outgoing lines, and the scheduled call to send the next ones
+        flood_control = self.config.get("flood_control", {})
+        self.send_queue = SendQueue(flood_control.get("burst", 5), flood_control.get("rate", 2))
+        self._flush_handle = None
+        # lines from send(), which may be called from any thread
+        self._outgoing = deque()
+        self._outgoing_scheduled = False
+
+        # decodes incoming lines, learning which encoding the network uses
+        self.decoder = Decoder()
+        self._load_encodings()
+
+        # incoming events, dispatched while fewer than "concurrency" lines have hooks running, so a burst of lines
+        # can't start thousands of hooks at once
+        inbound = self.config.get("inbound", {})
+        self.inbound = InboundQueue(inbound.get("queue_size", 1000), inbound.get("shed_threshold"),
+                                    inbound.get("priority_size", 1000))
+        self._inbound_concurrency = inbound.get("concurrency", 50)
+        self._inbound_slots = asyncio.Semaphore(self._inbound_concurrency, loop=self.loop)
+        self._dispatching = False
+
+    def reload(self):
+        super().reload()
+        flood_control = self.config.get("flood_control", {})
+        self.send_queue.bucket.capacity = float(flood_control.get("burst", 5))
+        self.send_queue.bucket.fill_rate = float(flood_control.get("rate", 2))
+        self._load_encodings()
+        inbound = self.config.get("inbound", {})
+        self.inbound.queue_size = inbound.get("queue_size", 1000)
+        self.inbound.shed_threshold = inbound.get("shed_threshold", self.inbound.queue_size // 2)
+        self.inbound.priority_size = inbound.get("priority_size", 1000)
+        concurrency = inbound.get("concurrency", 50)
+        if concurrency != self._inbound_concurrency:
+            # lines already running give their slots back to the old semaphore
+            self._inbound_concurrency = concurrency
+            self._inbound_slots = asyncio.Semaphore(concurrency, loop=self.loop)
+
+    def _load_encodings(self):
+        """
+        Sets the decoder's encodings from the config, falling back to the defaults if they aren't valid
+        """
+        encodings = self.config.get("encodings", default_encodings)
+        try:
+            self.decoder.set_encodings(encodings)
+        except LookupError as e:
+            logger.error("[{}] Invalid encoding in config, using defaults: {}".format(self.name, e))
+            self.decoder.set_encodings(default_encodings)
+
     def describe_server(self):
         if self.use_ssl:
             return "+{}:{}".format(self.server, self.port)
@@ -145,6 +179,10 @@ class IrcClient(Client):
 
         self._transport.close()
         self._connected = False
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self.inbound.clear()
 
     def message(self, target, *messages, sanatize=True):
         for text in messages:
@@ -212,16 +250,114 @@ class IrcClient(Client):
         """
         if not self._connected:
             raise ValueError("Client must be connected to irc server to use send")
-        self.loop.call_soon_threadsafe(self._send, line)
+        self._outgoing.append(line)
+        if not self._outgoing_scheduled:
+            # one call into the loop picks up every line sent before it runs
+            self._outgoing_scheduled = True
+            self.loop.call_soon_threadsafe(self._take_outgoing)
+
+    def _take_outgoing(self):
+        """
+        Queues the lines given to send() since the last call
+        """
+        # reset this first, so lines added while we're running schedule another call
+        self._outgoing_scheduled = False
+        while self._outgoing:
+            self._send(self._outgoing.popleft())
 
     def _send(self, line):
         """
-        Sends a raw IRC line unchecked. Doesn't do connected check, and is *not* threadsafe
+        Queues a raw IRC line unchecked. Doesn't do connected check, and is *not* threadsafe
         :type line: str
         """
         logger.info("[{}] >> {}".format(self.name, line))
-        asyncio.async(self._protocol.send(line), loop=self.loop)
+        self.send_queue.put(line)
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        """
+        Sends as many queued lines as flood control allows, and schedules another flush for the rest
+        """
+        self._flush_handle = None
+        if self._protocol is None or not self._protocol.connected:
+            # the lines stay queued, and go out with the PASS, NICK and USER lines connect() sends once we're connected
+            return
+
+        # everything queued since the last flush goes out in a single write
+        lines = self.send_queue.pop_ready()
+        if lines:
+            self._protocol.write_lines(lines)
+
+        delay = self.send_queue.delay()
+        if delay is not None:
+            self._flush_handle = self.loop.call_later(delay, self._flush)
+
+    def process(self, event):
+        """
+        Queues an incoming event for processing, and starts dispatching queued events if we aren't already
+        :type event: Event
+        """
+        if not self.inbound.put(event, essential=self._is_essential(event)):
+            if self.inbound.dropped % 100 == 1:
+                logger.warning("[{}] Incoming lines are backed up, {} lines dropped so far".format(
+                    self.name, self.inbound.dropped))
+            return
+        if not self._dispatching:
+            self._dispatching = True
+            asyncio.async(self._process_inbound(), loop=self.loop)
 
+    def _is_essential(self, event):
+        """
+        Returns whether an incoming line tells the bot about itself, and a core hook keeps track of it. Core hooks
+        see everyone's JOINs, PARTs, KICKs and NICKs, but only act on the bot's own, so the rest are queued like any
+        other line, and a netsplit can't fill the priority lane.
+        :type event: Event
+        :rtype: bool
+        """
+        command = event.irc_command
+        if not (command.isdigit() or command == "INVITE"):
+            nick = self.nick.lower()
+            if (event.nick is None or event.nick.lower() != nick) and (
+                    event.target is None or event.target.lower() != nick):
+                return False
+        return self.bot.has_core_hooks(event)
+
+    @asyncio.coroutine
+    def _process_inbound(self):
+        """
+        Dispatches queued events until there are none left. Each event holds one of the concurrency slots until its
+        hooks with a time limit have finished, so once every slot is taken, events wait in the queue, where it can
+        shed or drop them.
+        """
+        try:
+            while True:
+                slots = self._inbound_slots
+                yield from slots.acquire()
+                event, shed = self.inbound.pop()
+                if event is None:
+                    slots.release()
+                    return
+                try:
+                    skipped, hooks_done = self.bot.dispatch(event, shed=shed)
+                except Exception:
+                    slots.release()
+                    logger.exception("[{}] Error processing incoming line".format(self.name))
+                else:
+                    self.inbound.shed_hooks += skipped
+                    hooks_done.add_done_callback(partial(self._hooks_finished, slots))
+        finally:
+            self._dispatching = False
+
+    def _hooks_finished(self, slots, future):
+        """
+        Called when an event's hooks with a time limit have finished, to free its concurrency slot
+        :type slots: asyncio.Semaphore
+        :type future: asyncio.Future
+        """
+        slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("[{}] Error running hooks: {!r}".format(self.name, future.exception()))
 
     @property
     def connected(self):
@@ -233,10 +369,9 @@ class _IrcProtocol(asyncio.Protocol):
     :type loop: asyncio.events.AbstractEventLoop
     :type conn: IrcClient
     :type bot: cloudbot.bot.CloudBot
-    :type _input_buffer: bytes
+    :type _framer: LineFramer
     :type _connected: bool
     :type _transport: asyncio.transports.Transport
-    :type _connected_future: asyncio.Future
     """
 
     def __init__(self, conn):
@@ -247,8 +382,8 @@ class _IrcProtocol(asyncio.Protocol):
         self.bot = conn.bot
         self.conn = conn
 
-        # input buffer
-        self._input_buffer = b""
+        # splits incoming data into lines
+        self._framer = LineFramer()
 
         # connected
         self._connected = False
@@ -256,20 +391,16 @@ class _IrcProtocol(asyncio.Protocol):
         # transport
         self._transport = None
 
-        # Future that waits until we are connected
-        self._connected_future = asyncio.Future(loop=self.loop)
-
     def connection_made(self, transport):
         self._transport = transport
         self._connected = True
-        self._connected_future.set_result(None)
-        # we don't need the _connected_future, everything uses it will check _connected first.
-        del self._connected_future
+
+    @property
+    def connected(self):
+        return self._connected
 
     def connection_lost(self, exc):
         self._connected = False
-        # create a new connected_future for when we are connected.
-        self._connected_future = asyncio.Future(loop=self.loop)
         if exc is None:
             # we've been closed intentionally, so don't reconnect
             return
@@ -278,70 +409,53 @@ class _IrcProtocol(asyncio.Protocol):
 
     def eof_received(self):
         self._connected = False
-        # create a new connected_future for when we are connected.
-        self._connected_future = asyncio.Future(loop=self.loop)
         logger.info("[{}] EOF received.".format(self.conn.name))
         asyncio.async(self.conn.connect(), loop=self.loop)
         return True
 
-    @asyncio.coroutine
-    def send(self, line):
-        # make sure we are connected before sending
-        if not self._connected:
-            yield from self._connected_future
-        line = line[:510] + "\r\n"
-        data = line.encode("utf-8", "replace")
-        self._transport.write(data)
+    def write_lines(self, lines):
+        """
+        Writes a batch of lines to the transport at once. Must only be called while connected.
+        :type lines: list[str]
+        """
+        self._transport.write(b"".join(encode_line(line) for line in lines))
 
     def data_received(self, data):
-        self._input_buffer += data
+        dropped = self._framer.dropped
+        lines = self._framer.feed(data)
+        if self._framer.dropped != dropped:
+            logger.warning("[{}] Dropped {} line(s) longer than {} bytes from {}".format(
+                self.conn.name, self._framer.dropped - dropped, self._framer.max_line_length,
+                self.conn.describe_server()))
 
-        while b"\r\n" in self._input_buffer:
-            line_data, self._input_buffer = self._input_buffer.split(b"\r\n", 1)
-            line = decode(line_data)
+        for line_data in lines:
+            line = self.conn.decoder.decode(line_data)
 
             # parse the line into a message
-            if line.startswith(":"):
-                prefix_line_match = irc_prefix_re.match(line)
-                if prefix_line_match is None:
-                    logger.critical("[{}] Received invalid IRC line '{}' from {}".format(
-                        self.conn.name, line, self.conn.describe_server()))
-                    continue
-
-                netmask_prefix, command, params = prefix_line_match.groups()
-                prefix = ":" + netmask_prefix  # TODO: Do we need to know this?
-                netmask_match = irc_netmask_re.match(netmask_prefix)
-                if netmask_match is None:
-                    # This isn't in the format of a netmask
-                    nick = netmask_prefix
-                    user = None
-                    host = None
-                    mask = netmask_prefix
-                else:
-                    nick = netmask_match.group(1)
-                    user = netmask_match.group(2)
-                    host = netmask_match.group(3)
-                    mask = netmask_prefix
-            else:
+            parsed = parse_line(line)
+            if parsed is None:
+                logger.critical("[{}] Received invalid IRC line '{}' from {}".format(
+                    self.conn.name, line, self.conn.describe_server()))
+                continue
+
+            command = parsed.command
+            command_params = parsed.params
+            nick = parsed.nick
+            user = parsed.user
+            host = parsed.host
+            mask = parsed.prefix
+            if mask is None:
                 prefix = None
-                noprefix_line_match = irc_noprefix_re.match(line)
-                if noprefix_line_match is None:
-                    logger.critical("[{}] Received invalid IRC line '{}' from {}".format(
-                        self.conn.name, line, self.conn.describe_server()))
-                    continue
-                command = noprefix_line_match.group(1)
-                params = noprefix_line_match.group(2)
-                nick = None
-                user = None
-                host = None
-                mask = None
-
-            command_params = irc_param_re.findall(params)
+            else:
+                prefix = ":" + mask  # TODO: Do we need to know this?
 
             # Reply to pings immediately
 
             if command == "PING":
-                asyncio.async(self.send("PONG " + command_params[-1]), loop=self.loop)
+                if command_params:
+                    self.conn._send("PONG " + command_params[-1])
+                else:
+                    self.conn._send("PONG")
 
             # Parse the command and params
 
@@ -400,7 +514,8 @@ class _IrcProtocol(asyncio.Protocol):
             # TODO: Do we really want to send the raw `prefix` and `command_params` here?
             event = Event(bot=self.bot, conn=self.conn, event_type=event_type, content=content, target=target,
                           channel=channel, nick=nick, user=user, host=host, mask=mask, irc_raw=line, irc_prefix=prefix,
-                          irc_command=command, irc_paramlist=command_params, irc_ctcp_text=ctcp_text)
+                          irc_command=command, irc_paramlist=command_params, irc_ctcp_text=ctcp_text,
+                          irc_tags=parsed.tags)
 
-            # handle the message, async
-            asyncio.async(self.bot.process(event), loop=self.loop)
+            # queue the message to be handled, async
+            self.conn.process(event)
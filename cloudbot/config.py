@@ -67,10 +67,17 @@ class Config(dict):
             self.update(json.load(f))
             logger.debug("Config loaded from file.")
 
-        # reload permissions
+        # reload permissions and other connection state
         if self.bot.connections:
             for connection in self.bot.connections.values():
-                connection.permissions.reload()
+                connection.reload()
+
+        # the plugin manager doesn't exist yet when the config is first loaded
+        if hasattr(self.bot, "plugin_manager"):
+            self.bot.plugin_manager.executors.configure(self.get("executors", {}))
+
+        if hasattr(self.bot, "http"):
+            self.bot.http.configure(self.get("http", {}))
 
     def save_config(self):
         """saves the contents of the config dict to the config file"""
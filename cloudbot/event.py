@@ -1,7 +1,6 @@
 import asyncio
 import enum
 import logging
-import concurrent.futures
 
 logger = logging.getLogger("cloudbot")
 
@@ -18,8 +17,62 @@ class EventType(enum.Enum):
     other = 6
 
 
+class _Line:
+    """
+    The attributes describing the line an event was created from. This is shared between an event and all events
+    based on it, rather than being copied into each one.
+    :type cache: dict
+    """
+    __slots__ = ("type", "content", "target", "chan", "nick", "user", "host", "mask", "irc_raw", "irc_prefix",
+                 "irc_command", "irc_paramlist", "irc_ctcp_text", "irc_tags", "cache")
+
+    def __init__(self, event_type, content, target, channel, nick, user, host, mask, irc_raw, irc_prefix, irc_command,
+                 irc_paramlist, irc_ctcp_text, irc_tags):
+        self.type = event_type
+        self.content = content
+        self.target = target
+        self.chan = channel
+        self.nick = nick
+        self.user = user
+        self.host = host
+        self.mask = mask
+        # clients-specific parameters
+        self.irc_raw = irc_raw
+        self.irc_prefix = irc_prefix
+        self.irc_command = irc_command
+        self.irc_paramlist = irc_paramlist
+        self.irc_ctcp_text = irc_ctcp_text
+        self.irc_tags = irc_tags
+        self.cache = None
+
+
+def _line_property(name):
+    """
+    Creates a property reading the given attribute from an event's shared line, unless it has been assigned on the
+    event itself. Assigning to it only changes the value for that event.
+    :type name: str
+    """
+
+    def fget(self):
+        own = self._own
+        if own is not None and name in own:
+            return own[name]
+        return getattr(self._line, name)
+
+    def fset(self, value):
+        if self._own is None:
+            self._own = {}
+        self._own[name] = value
+
+    return property(fget, fset)
+
+
 class Event:
     """
+    Events created from a `base_event` share the base event's line attributes (type, content, nick, irc_*, etc.)
+    instead of copying them, so creating an event for each hook a line reaches is cheap. Assigning to one of those
+    attributes only affects the event it's assigned on.
+
     :type bot: cloudbot.bot.CloudBot
     :type conn: cloudbot.client.Client
     :type hook: cloudbot.plugin.Hook
@@ -32,17 +85,34 @@ class Event:
     :type host: str
     :type mask: str
     :type db: sqlalchemy.orm.Session
-    :type db_executor: concurrent.futures.ThreadPoolExecutor
+    :type db_executor: cloudbot.util.dbexecutor.DatabaseWorker
     :type irc_raw: str
     :type irc_prefix: str
     :type irc_command: str
     :type irc_paramlist: str
     :type irc_ctcp_text: str
+    :type irc_tags: cloudbot.util.ircparse.MessageTags
     """
+    __slots__ = ("bot", "conn", "hook", "db", "db_executor", "_line", "_own")
+
+    type = _line_property("type")
+    content = _line_property("content")
+    target = _line_property("target")
+    chan = _line_property("chan")
+    nick = _line_property("nick")
+    user = _line_property("user")
+    host = _line_property("host")
+    mask = _line_property("mask")
+    irc_raw = _line_property("irc_raw")
+    irc_prefix = _line_property("irc_prefix")
+    irc_command = _line_property("irc_command")
+    irc_paramlist = _line_property("irc_paramlist")
+    irc_ctcp_text = _line_property("irc_ctcp_text")
+    irc_tags = _line_property("irc_tags")
 
     def __init__(self, *, bot=None, hook=None, conn=None, base_event=None, event_type=EventType.other, content=None,
                  target=None, channel=None, nick=None, user=None, host=None, mask=None, irc_raw=None, irc_prefix=None,
-                 irc_command=None, irc_paramlist=None, irc_ctcp_text=None):
+                 irc_command=None, irc_paramlist=None, irc_ctcp_text=None, irc_tags=None):
         """
         All of these parameters except for `bot` and `hook` are optional.
         The irc_* parameters should only be specified for IRC events.
@@ -68,6 +138,7 @@ class Event:
         :param irc_paramlist: The list of params for the IRC command. If the last param is a content param, the ':'
                                 should be removed from the front.
         :param irc_ctcp_text: CTCP text if this message is a CTCP command
+        :param irc_tags: The IRCv3 message tags of the line, if it had any
         :type bot: cloudbot.bot.CloudBot
         :type conn: cloudbot.client.Client
         :type hook: cloudbot.plugin.Hook
@@ -84,6 +155,7 @@ class Event:
         :type irc_command: str
         :type irc_paramlist: list[str]
         :type irc_ctcp_text: str
+        :type irc_tags: cloudbot.util.ircparse.MessageTags
         """
         self.db = None
         self.db_executor = None
@@ -91,7 +163,7 @@ class Event:
         self.conn = conn
         self.hook = hook
         if base_event is not None:
-            # We're copying an event, so inherit values
+            # We're basing this on another event, so inherit values
             if self.bot is None and base_event.bot is not None:
                 self.bot = base_event.bot
             if self.conn is None and base_event.conn is not None:
@@ -99,37 +171,17 @@ class Event:
             if self.hook is None and base_event.hook is not None:
                 self.hook = base_event.hook
 
-            # If base_event is provided, don't check these parameters, just inherit
-            self.type = base_event.type
-            self.content = base_event.content
-            self.target = base_event.target
-            self.chan = base_event.chan
-            self.nick = base_event.nick
-            self.user = base_event.user
-            self.host = base_event.host
-            self.mask = base_event.mask
-            # clients-specific parameters
-            self.irc_raw = base_event.irc_raw
-            self.irc_prefix = base_event.irc_prefix
-            self.irc_command = base_event.irc_command
-            self.irc_paramlist = base_event.irc_paramlist
-            self.irc_ctcp_text = base_event.irc_ctcp_text
+            # If base_event is provided, don't check these parameters, just share the base event's line
+            self._line = base_event._line
+            if base_event._own is not None:
+                self._own = dict(base_event._own)
+            else:
+                self._own = None
         else:
             # Since base_event wasn't provided, we can take these parameters
-            self.type = event_type
-            self.content = content
-            self.target = target
-            self.chan = channel
-            self.nick = nick
-            self.user = user
-            self.host = host
-            self.mask = mask
-            # clients-specific parameters
-            self.irc_raw = irc_raw
-            self.irc_prefix = irc_prefix
-            self.irc_command = irc_command
-            self.irc_paramlist = irc_paramlist
-            self.irc_ctcp_text = irc_ctcp_text
+            self._line = _Line(event_type, content, target, channel, nick, user, host, mask, irc_raw, irc_prefix,
+                               irc_command, irc_paramlist, irc_ctcp_text, irc_tags)
+            self._own = None
 
     @asyncio.coroutine
     def prepare(self):
@@ -148,10 +200,10 @@ class Event:
         if "db" in self.hook.required_args:
             #logger.debug("Opening database session for {}:threaded=False".format(self.hook.description))
 
-            # we're running a coroutine hook with a db, so initialise an executor pool
-            self.db_executor = concurrent.futures.ThreadPoolExecutor(1)
-            # be sure to initialize the db in the database executor, so it will be accessible in that thread.
-            self.db = yield from self.async(self.bot.db_session)
+            # we're running a coroutine hook with a db, so borrow one of the database threads
+            self.db_executor = self.bot.db_executor.assign()
+            # be sure to check out the db in the database thread, so it will be accessible in that thread.
+            self.db = yield from self._run_db(self.db_executor.checkout)
 
     def prepare_threaded(self):
         """
@@ -186,9 +238,14 @@ class Event:
 
         if self.db is not None:
             #logger.debug("Closing database session for {}:threaded=False".format(self.hook.description))
-            # be sure the close the database in the database executor, as it is only accessable in that one thread
-            yield from self.async(self.db.close)
-            self.db = None
+            # be sure the close the database in the database thread, as it is only accessable in that one thread
+            try:
+                yield from self._run_db(self.db_executor.checkin, self.db)
+            finally:
+                self.db = None
+        if self.db_executor is not None:
+            self.bot.db_executor.release(self.db_executor)
+            self.db_executor = None
 
     def close_threaded(self):
         """
@@ -205,6 +262,20 @@ class Event:
             #logger.debug("Closing database session for {}:threaded=True".format(self.hook.description))
             self.db.close()
             self.db = None
+            # discard this thread's session, so sessions don't pile up in the executor's threads
+            self.bot.db_session.remove()
+
+    @property
+    def line_cache(self):
+        """
+        A dict shared between this event and every event based on the same line, for results which only need to be
+        worked out once per line.
+        :rtype: dict
+        """
+        line = self._line
+        if line.cache is None:
+            line.cache = {}
+        return line.cache
 
     @property
     def event(self):
@@ -307,10 +378,37 @@ class Event:
             raise ValueError("has_permission requires mask is not assigned")
         return self.conn.permissions.has_perm_mask(self.mask, permission, notice=notice)
 
+    @asyncio.coroutine
+    def _run_db(self, function, *args):
+        """
+        Runs a function on the event's database thread
+        """
+        return (yield from self.loop.run_in_executor(self.db_executor, function, *args))
+
+    def _uses_db(self, function, args, kwargs):
+        """
+        Returns whether an async() call works with this event's database session, which may only be used from the
+        thread it was created in: a method of the session, or a function it's passed to.
+        :rtype: bool
+        """
+        db = self.db
+        if db is None:
+            return False
+        if getattr(function, "__self__", None) is db:
+            return True
+        return any(arg is db for arg in args) or any(value is db for value in kwargs.values())
+
     @asyncio.coroutine
     def async(self, function, *args, **kwargs):
-        if self.db_executor is not None:
+        """
+        Runs a blocking function in a thread, and returns its result. Calls which use the event's database session
+        run on the event's database thread, and everything else runs in the plugin's thread pool, so a slow web
+        request doesn't hold up the database work of other hooks.
+        """
+        if self.db_executor is not None and self._uses_db(function, args, kwargs):
             executor = self.db_executor
+        elif self.hook is not None:
+            executor = self.bot.plugin_manager.executors.for_plugin(self.hook.plugin.title)
         else:
             executor = None
         if kwargs:
@@ -326,6 +424,7 @@ class CommandEvent(Event):
     :type text: str
     :type triggered_command: str
     """
+    __slots__ = ("text", "doc", "triggered_command")
 
     def __init__(self, *, bot=None, hook, text, triggered_command, conn=None, base_event=None, event_type=None,
                  content=None, target=None, channel=None, nick=None, user=None, host=None, mask=None, irc_raw=None,
@@ -369,6 +468,7 @@ class RegexEvent(Event):
     :type hook: cloudbot.plugin.RegexHook
     :type match: re.__Match
     """
+    __slots__ = ("match",)
 
     def __init__(self, *, bot=None, hook, match, conn=None, base_event=None, event_type=None, content=None, target=None,
                  channel=None, nick=None, user=None, host=None, mask=None, irc_raw=None, irc_prefix=None,
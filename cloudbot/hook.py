@@ -297,8 +297,9 @@ def sieve(param=None, **kwargs):
 
 
 def periodic(interval, **kwargs):
-    """External on_start decorator. Can be used directly as a decorator, or with args to return a decorator
-    :type param: function | None
+    """External periodic decorator. Must be used as a function to return a decorator.
+    Takes initial_interval, align, jitter, missed and max_concurrency as keyword arguments, see cloudbot.util.scheduler
+    :type interval: int
     """
 
     def _periodic_hook(func):
@@ -337,5 +338,26 @@ def on_start(param=None, **kwargs):
         return lambda func: _on_start_hook(func)
 
 
+def on_stop(param=None, **kwargs):
+    """External on_stop decorator. Can be used directly as a decorator, or with args to return a decorator.
+    on_stop hooks are run when their plugin is unloaded, including before it's reloaded
+    :type param: function | None
+    """
+
+    def _on_stop_hook(func):
+        hook = _get_hook(func, "on_stop")
+        if hook is None:
+            hook = _Hook(func, "on_stop")
+            _add_hook(func, hook)
+
+        hook._add_hook(kwargs)
+        return func
+
+    if callable(param):
+        return _on_stop_hook(param)
+    else:
+        return lambda func: _on_stop_hook(func)
+
+
 # this is temporary, to ease transition
 onload = on_start
@@ -1,8 +1,14 @@
 from fnmatch import fnmatch
+import functools
 import logging
 
+from cloudbot.util.masks import MaskMatcher
+
 logger = logging.getLogger("cloudbot")
 
+# how many user masks to remember the permissions of, per connection
+permission_cache_size = 512
+
 # put your hostmask here for magic
 # it's disabled by default, see has_perm_mask()
 backdoor = None
@@ -15,6 +21,8 @@ class PermissionManager(object):
     :type group_perms: dict[str, list[str]]
     :type group_users: dict[str, list[str]]
     :type perm_users: dict[str, list[str]]
+    :type perm_matchers: dict[str, MaskMatcher]
+    :type group_matchers: dict[str, MaskMatcher]
     """
 
     def __init__(self, conn):
@@ -30,6 +38,9 @@ class PermissionManager(object):
         self.group_perms = {}
         self.group_users = {}
         self.perm_users = {}
+        self.perm_matchers = {}
+        self.group_matchers = {}
+        self._get_user_permissions = None
 
         self.reload()
 
@@ -60,6 +71,12 @@ class PermissionManager(object):
                     self.perm_users[perm] = []
                 self.perm_users[perm].extend(users)
 
+        # compile the masks, so we don't need to fnmatch each one for every check
+        self.perm_matchers = {perm: MaskMatcher(users) for perm, users in self.perm_users.items()}
+        self.group_matchers = {group: MaskMatcher(users) for group, users in self.group_users.items()}
+        # start with a fresh cache of user permissions, since they may have changed
+        self._get_user_permissions = functools.lru_cache(maxsize=permission_cache_size)(self._find_user_permissions)
+
         logger.debug("[{}|permissions] Group permissions: {}".format(self.name, self.group_perms))
         logger.debug("[{}|permissions] Group users: {}".format(self.name, self.group_users))
         logger.debug("[{}|permissions] Permission users: {}".format(self.name, self.perm_users))
@@ -75,17 +92,15 @@ class PermissionManager(object):
             if fnmatch(user_mask.lower(), backdoor.lower()):
                 return True
 
-        if not perm.lower() in self.perm_users:
+        perm = perm.lower()
+        if perm not in self.perm_matchers:
             # no one has access
             return False
 
-        allowed_users = self.perm_users[perm.lower()]
-
-        for allowed_mask in allowed_users:
-            if fnmatch(user_mask.lower(), allowed_mask):
-                if notice:
-                    logger.info("[{}|permissions] Allowed user {} access to {}".format(self.name, user_mask, perm))
-                return True
+        if perm in self._get_user_permissions(user_mask.lower()):
+            if notice:
+                logger.info("[{}|permissions] Allowed user {} access to {}".format(self.name, user_mask, perm))
+            return True
 
         return False
 
@@ -106,30 +121,27 @@ class PermissionManager(object):
         """
         return self.group_users.get(group.lower())
 
+    def _find_user_permissions(self, user_mask):
+        """
+        :type user_mask: str
+        :rtype: frozenset[str]
+        """
+        return frozenset(perm for perm, matcher in self.perm_matchers.items() if matcher.match(user_mask))
+
     def get_user_permissions(self, user_mask):
         """
         :type user_mask: str
         :rtype: list[str]
         """
-        permissions = set()
-        for permission, users in self.perm_users.items():
-            for mask_to_check in users:
-                if fnmatch(user_mask.lower(), mask_to_check):
-                    permissions.add(permission)
-        return permissions
+        return set(self._get_user_permissions(user_mask.lower()))
 
     def get_user_groups(self, user_mask):
         """
         :type user_mask: str
         :rtype: list[str]
         """
-        groups = []
-        for group, users in self.group_users.items():
-            for mask_to_check in users:
-                if fnmatch(user_mask.lower(), mask_to_check):
-                    groups.append(group)
-                    continue
-        return groups
+        user_mask = user_mask.lower()
+        return [group for group, matcher in self.group_matchers.items() if matcher.match(user_mask)]
 
     def group_exists(self, group):
         """
@@ -146,13 +158,10 @@ class PermissionManager(object):
         :type user_mask: str
         :rtype: bool
         """
-        users = self.group_users.get(group.lower())
-        if not users:
+        matcher = self.group_matchers.get(group.lower())
+        if not matcher:
             return False
-        for mask_to_check in users:
-            if fnmatch(user_mask.lower(), mask_to_check):
-                return True
-        return False
+        return matcher.match(user_mask.lower())
 
     def remove_group_user(self, group, user_mask):
         """
@@ -9,7 +9,12 @@ import re
 import sqlalchemy
 
 from cloudbot.event import Event
-from cloudbot.util import database
+from cloudbot.util import database, migrations
+from cloudbot.util.commandindex import CommandIndex
+from cloudbot.util.executors import ExecutorManager
+from cloudbot.util.keyedlock import KeyedLocks
+from cloudbot.util.regexdispatch import RegexDispatcher
+from cloudbot.util.scheduler import Job, PeriodicScheduler
 
 logger = logging.getLogger("cloudbot")
 
@@ -18,7 +23,8 @@ def find_hooks(parent, module):
     """
     :type parent: Plugin
     :type module: object
-    :rtype: (list[CommandHook], list[RegexHook], list[RawHook], list[SieveHook], List[EventHook], list[OnStartHook])
+    :rtype: (list[CommandHook], list[RegexHook], list[RawHook], list[SieveHook], List[EventHook], list[PeriodicHook],
+            list[OnStartHook], list[OnStopHook])
     """
     # set the loaded flag
     module._cloudbot_loaded = True
@@ -29,8 +35,9 @@ def find_hooks(parent, module):
     event = []
     periodic = []
     on_start = []
+    on_stop = []
     type_lists = {"command": command, "regex": regex, "irc_raw": raw, "sieve": sieve, "event": event,
-                  "periodic": periodic, "on_start": on_start}
+                  "periodic": periodic, "on_start": on_start, "on_stop": on_stop}
     for name, func in module.__dict__.items():
         if hasattr(func, "_cloudbot_hook"):
             # if it has cloudbot hook
@@ -42,7 +49,16 @@ def find_hooks(parent, module):
             # delete the hook to free memory
             del func._cloudbot_hook
 
-    return command, regex, raw, sieve, event, periodic, on_start
+    return command, regex, raw, sieve, event, periodic, on_start, on_stop
+
+
+def find_migrations(code):
+    """
+    :type code: object
+    :rtype: list[cloudbot.util.migrations.Migration]
+    """
+    return [migration for migration in getattr(code, "migrations", [])
+            if isinstance(migration, migrations.Migration)]
 
 
 def find_tables(code):
@@ -75,12 +91,15 @@ class PluginManager:
 
     :type bot: cloudbot.bot.CloudBot
     :type plugins: dict[str, Plugin]
-    :type commands: dict[str, CommandHook]
+    :type commands: CommandIndex
     :type raw_triggers: dict[str, list[RawHook]]
     :type catch_all_triggers: list[RawHook]
     :type event_type_hooks: dict[cloudbot.event.EventType, list[EventHook]]
-    :type regex_hooks: list[(re.__Regex, RegexHook)]
+    :type regex_hooks: RegexDispatcher
     :type sieves: list[SieveHook]
+    :type timeouts: dict[str, int]
+    :type executors: ExecutorManager
+    :type hook_locks: KeyedLocks
     """
 
     def __init__(self, bot):
@@ -91,13 +110,22 @@ class PluginManager:
         self.bot = bot
 
         self.plugins = {}
-        self.commands = {}
+        self.commands = CommandIndex()
         self.raw_triggers = {}
         self.catch_all_triggers = []
         self.event_type_hooks = {}
-        self.regex_hooks = []
+        self.regex_hooks = RegexDispatcher()
         self.sieves = []
-        self._hook_waiting_queues = {}
+        # singlethread hooks which are running, and the events waiting for them
+        self.hook_locks = KeyedLocks()
+        # the number of hooks from each plugin which have timed out, by plugin title
+        self.timeouts = {}
+        # threaded hooks which timed out, but whose threads haven't finished yet
+        self.abandoned_threads = 0
+        # the thread pools threaded hooks run in
+        self.executors = ExecutorManager(self.bot.config.get("executors", {}))
+        # runs periodic hooks
+        self.scheduler = PeriodicScheduler(self.bot.loop)
 
     @asyncio.coroutine
     def load_all(self, plugin_dir):
@@ -173,10 +201,9 @@ class PluginManager:
         self.plugins[plugin.file_name] = plugin
 
         for periodic_hook in plugin.periodic:
-            asyncio.async(self._start_periodic(periodic_hook))
+            self._schedule_periodic(periodic_hook)
             self._log_hook(periodic_hook)
 
-
         # register commands
         for command_hook in plugin.commands:
             for alias in command_hook.aliases:
@@ -212,7 +239,7 @@ class PluginManager:
         # register regexps
         for regex_hook in plugin.regexes:
             for regex_match in regex_hook.regexes:
-                self.regex_hooks.append((regex_match, regex_hook))
+                self.regex_hooks.add(regex_match, regex_hook)
             self._log_hook(regex_hook)
 
         # register sieves
@@ -278,12 +305,19 @@ class PluginManager:
         # unregister regexps
         for regex_hook in plugin.regexes:
             for regex_match in regex_hook.regexes:
-                self.regex_hooks.remove((regex_match, regex_hook))
+                self.regex_hooks.remove(regex_match, regex_hook)
 
         # unregister sieves
         for sieve_hook in plugin.sieves:
             self.sieves.remove(sieve_hook)
 
+        # stop periodic hooks, so reloading the plugin doesn't leave the old ones running too
+        self.scheduler.cancel_owner(plugin)
+
+        # run on_stop hooks, while the plugin's tables are still registered
+        for on_stop_hook in plugin.run_on_stop:
+            yield from self.launch(on_stop_hook, Event(bot=self.bot, hook=on_stop_hook))
+
         # unregister databases
         plugin.unregister_tables(self.bot)
 
@@ -358,27 +392,98 @@ class PluginManager:
         finally:
             yield from event.close()
 
+    def get_timeout(self, hook):
+        """
+        Returns the number of seconds the given hook may run for, or None if it isn't limited. Hooks without their own
+        timeout use the "timeout" from the "hooks" section of the config, except for on_start, on_stop and periodic
+        hooks, which aren't limited unless they ask to be.
+        :type hook: Hook
+        :rtype: float | None
+        """
+        timeout = hook.timeout
+        if timeout is None:
+            if hook.type in ("on_start", "on_stop", "periodic"):
+                return None
+            timeout = self.bot.config.get("hooks", {}).get("timeout", 30)
+        # a timeout of 0 means no limit
+        return timeout or None
+
+    def _thread_finished(self, future):
+        """
+        Called when the thread of a hook which timed out finally finishes
+        :type future: asyncio.Future
+        """
+        self.abandoned_threads -= 1
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Error in abandoned hook thread: {!r}".format(future.exception()))
+
+    def _hook_timed_out(self, hook, event, timeout):
+        """
+        :type hook: Hook
+        :type event: cloudbot.event.Event
+        :type timeout: float
+        """
+        self.timeouts[hook.plugin.title] = self.timeouts.get(hook.plugin.title, 0) + 1
+        logger.warning("Hook {} timed out after {} seconds".format(hook.description, timeout))
+        if hook.type in ("command", "regex") and event.nick is not None:
+            # someone is waiting for a reply, let them know it isn't coming
+            event.notice("Sorry, that took too long and was cancelled. Please try again later.")
+
     @asyncio.coroutine
-    def _execute_hook(self, hook, event):
+    def _execute_hook(self, hook, event, lock_key=None):
         """
         Runs the specific hook with the given bot and event.
 
-        Returns False if the hook errored, True otherwise.
+        Returns False if the hook errored or timed out, True otherwise.
+
+        Coroutine hooks which time out are cancelled. Threads can't be stopped, so threaded hooks which time out are
+        abandoned, and their result is discarded when they finish.
 
+        :param lock_key: The singlethread key the caller holds, which is released once the hook is done. An abandoned
+                         thread keeps it until the thread actually finishes, so the next event for the key can't run
+                         alongside it.
         :type hook: cloudbot.plugin.Hook
         :type event: cloudbot.event.Event
         :rtype: bool
         """
+        timeout = self.get_timeout(hook)
+        future = None
         try:
-            # _internal_run_threaded and _internal_run_coroutine prepare the database, and run the hook.
-            # _internal_run_* will prepare parameters and the database session, but won't do any error catching.
-            if hook.threaded:
-                out = yield from self.bot.loop.run_in_executor(None, self._execute_hook_threaded, hook, event)
-            else:
-                out = yield from self._execute_hook_sync(hook, event)
-        except Exception:
-            logger.exception("Error in hook {}".format(hook.description))
-            return False
+            try:
+                # _internal_run_threaded and _internal_run_coroutine prepare the database, and run the hook.
+                # _internal_run_* will prepare parameters and the database session, but won't do any error catching.
+                if hook.threaded:
+                    executor = self.executors.for_plugin(hook.plugin.title)
+                    future = self.bot.loop.run_in_executor(executor, self._execute_hook_threaded, hook, event)
+                    if timeout is None:
+                        out = yield from future
+                    else:
+                        try:
+                            # shielded, so the future is still around to tell us when the thread is done
+                            out = yield from asyncio.wait_for(asyncio.shield(future, loop=self.bot.loop), timeout,
+                                                              loop=self.bot.loop)
+                        except asyncio.TimeoutError:
+                            self.abandoned_threads += 1
+                            future.add_done_callback(self._thread_finished)
+                            raise
+                elif timeout is None:
+                    out = yield from self._execute_hook_sync(hook, event)
+                else:
+                    out = yield from asyncio.wait_for(self._execute_hook_sync(hook, event), timeout,
+                                                      loop=self.bot.loop)
+            except asyncio.TimeoutError:
+                self._hook_timed_out(hook, event, timeout)
+                return False
+            except Exception:
+                logger.exception("Error in hook {}".format(hook.description))
+                return False
+        finally:
+            if lock_key is not None:
+                if future is not None and not future.done():
+                    # the thread is still running
+                    future.add_done_callback(lambda _: self.hook_locks.release(lock_key))
+                else:
+                    self.hook_locks.release(lock_key)
 
         if out is not None:
             if isinstance(out, (list, tuple)):
@@ -398,7 +503,8 @@ class PluginManager:
         """
         try:
             if sieve.threaded:
-                result = yield from self.bot.loop.run_in_executor(None, sieve.function, self.bot, event, hook)
+                executor = self.executors.for_plugin(sieve.plugin.title)
+                result = yield from self.bot.loop.run_in_executor(executor, sieve.function, self.bot, event, hook)
             else:
                 result = yield from sieve.function(self.bot, event, hook)
         except Exception:
@@ -407,16 +513,39 @@ class PluginManager:
         else:
             return result
 
-    @asyncio.coroutine
-    def _start_periodic(self, hook):
-        interval = hook.interval
-        initial_interval = hook.initial_interval
-        yield from asyncio.sleep(initial_interval)
+    def _schedule_periodic(self, hook):
+        """
+        :type hook: PeriodicHook
+        """
+        try:
+            job = Job(hook.description, lambda: self.launch(hook, Event(bot=self.bot, hook=hook)), hook.interval,
+                      initial_interval=hook.initial_interval, align=hook.align, jitter=hook.jitter,
+                      missed=hook.missed, max_concurrency=hook.max_concurrency, owner=hook.plugin)
+        except ValueError:
+            logger.exception("Not scheduling periodic hook {}:".format(hook.description))
+            return
+        hook.job = self.scheduler.add(job)
+
+    @staticmethod
+    def _single_thread_key(hook, event):
+        """
+        Returns the key a singlethread hook is serialized on for the given event. Events with different keys may run
+        the hook at the same time.
+        :type hook: Hook
+        :type event: cloudbot.event.Event
+        :rtype: tuple
+        """
+        key = (hook.plugin.title, hook.function_name)
+        if hook.single_thread_key is None:
+            return key
 
-        while True:
-            event = Event(bot=self.bot, hook=hook)
-            yield from self.launch(hook, event)
-            yield from asyncio.sleep(interval)
+        conn_name = event.conn.name if event.conn is not None else None
+        if hook.single_thread_key == "conn":
+            return key + (conn_name,)
+        elif hook.single_thread_key == "chan":
+            return key + (conn_name, event.chan.lower() if event.chan is not None else None)
+        else:
+            return key + (conn_name, event.nick.lower() if event.nick is not None else None)
 
     @asyncio.coroutine
     def launch(self, hook, event):
@@ -430,10 +559,26 @@ class PluginManager:
         :rtype: bool
         """
 
-        if hook.type not in ("on_start", "periodic"):  # we don't need sieves on on_start hooks.
+        if hook.type not in ("on_start", "on_stop", "periodic"):  # we don't need sieves on on_start hooks.
             for sieve in self.bot.plugin_manager.sieves:
-                event = yield from self._sieve(sieve, event, hook)
-                if event is None:
+                if sieve.cache_key is None:
+                    event = yield from self._sieve(sieve, event, hook)
+                    if event is None:
+                        return False
+                    continue
+
+                # this sieve's decision is the same for every hook with the same key, so only run it once per line
+                if sieve.cache_key == "event":
+                    key = (sieve,)
+                else:
+                    key = (sieve, hook.type)
+
+                line_cache = event.line_cache
+                allowed = line_cache.get(key)
+                if allowed is None:
+                    allowed = (yield from self._sieve(sieve, event, hook)) is not None
+                    line_cache[key] = allowed
+                if not allowed:
                     return False
 
         if hook.type == "command" and hook.auto_help and not event.text and hook.doc is not None:
@@ -441,38 +586,21 @@ class PluginManager:
             return False
 
         if hook.single_thread:
-            # There should only be one running instance of this hook, so let's wait for the last event to be processed
-            # before starting this one.
-
-            key = (hook.plugin.title, hook.function_name)
-            if key in self._hook_waiting_queues:
-                queue = self._hook_waiting_queues[key]
-                if queue is None:
-                    # there's a hook running, but the queue hasn't been created yet, since there's only one hook
-                    queue = asyncio.Queue()
-                    self._hook_waiting_queues[key] = queue
-                assert isinstance(queue, asyncio.Queue)
-                # create a future to represent this task
-                future = asyncio.Future()
-                queue.put_nowait(future)
-                # wait until the last task is completed
-                yield from future
-            else:
-                # set to None to signify that this hook is running, but there's no need to create a full queue
-                # in case there are no more hooks that will wait
-                self._hook_waiting_queues[key] = None
-
-            # Run the plugin with the message, and wait for it to finish
-            result = yield from self._execute_hook(hook, event)
-
-            queue = self._hook_waiting_queues[key]
-            if queue is None or queue.empty():
-                # We're the last task in the queue, we can delete it now.
-                del self._hook_waiting_queues[key]
-            else:
-                # set the result for the next task's future, so they can execute
-                next_future = yield from queue.get()
-                next_future.set_result(None)
+            # There should only be one running instance of this hook for the key, so let's wait for the last event
+            # with the same key to be processed before starting this one.
+            key = self._single_thread_key(hook, event)
+            waiter = self.hook_locks.acquire(key, loop=self.bot.loop)
+            if waiter is not None:
+                try:
+                    yield from waiter
+                except asyncio.CancelledError:
+                    if waiter.done() and not waiter.cancelled():
+                        # we were handed the lock just as we were cancelled, pass it on
+                        self.hook_locks.release(key)
+                    raise
+
+            # Run the plugin with the message, and wait for it to finish. The key is released once it's done.
+            result = yield from self._execute_hook(hook, event, lock_key=key)
         else:
             # Run the plugin with the message, and wait for it to finish
             result = yield from self._execute_hook(hook, event)
@@ -494,6 +622,7 @@ class Plugin:
     :type sieves: list[SieveHook]
     :type events: list[EventHook]
     :type tables: list[sqlalchemy.Table]
+    :type migrations: list[cloudbot.util.migrations.Migration]
     """
 
     def __init__(self, filepath, filename, title, code):
@@ -505,26 +634,53 @@ class Plugin:
         self.file_path = filepath
         self.file_name = filename
         self.title = title
-        self.commands, self.regexes, self.raw_hooks, self.sieves, self.events, self.periodic, self.run_on_start = find_hooks(self, code)
+        self.commands, self.regexes, self.raw_hooks, self.sieves, self.events, self.periodic, self.run_on_start, \
+            self.run_on_stop = find_hooks(self, code)
         # we need to find tables for each plugin so that they can be unloaded from the global metadata when the
         # plugin is reloaded
         self.tables = find_tables(code)
+        self.migrations = find_migrations(code)
 
     @asyncio.coroutine
     def create_tables(self, bot):
         """
-        Creates all sqlalchemy Tables that are registered in this plugin
+        Creates all sqlalchemy Tables that are registered in this plugin, then applies any new migrations
 
         :type bot: cloudbot.bot.CloudBot
         """
-        if self.tables:
-            # if there are any tables
+        if not (self.tables or self.migrations):
+            return
 
-            logger.info("Registering tables for {}".format(self.title))
+        db_executor = bot.db_executor.assign()
+        try:
+            if self.tables:
+                # if there are any tables
 
-            for table in self.tables:
-                if not (yield from bot.loop.run_in_executor(None, table.exists, bot.db_engine)):
-                    yield from bot.loop.run_in_executor(None, table.create, bot.db_engine)
+                logger.info("Registering tables for {}".format(self.title))
+
+                for table in self.tables:
+                    if not (yield from bot.loop.run_in_executor(db_executor, table.exists, bot.db_engine)):
+                        yield from bot.loop.run_in_executor(db_executor, table.create, bot.db_engine)
+
+            if self.migrations:
+                try:
+                    applied = yield from bot.loop.run_in_executor(db_executor, self._migrate, bot.db_engine)
+                except Exception:
+                    logger.exception("Error migrating tables for {}".format(self.title))
+                else:
+                    if applied:
+                        logger.info("Applied migrations {} for {}".format(", ".join(map(str, applied)), self.title))
+        finally:
+            bot.db_executor.release(db_executor)
+
+    def _migrate(self, engine):
+        """
+        Applies this plugin's new migrations in a single transaction, returning their versions
+        :type engine: sqlalchemy.engine.Engine
+        :rtype: list[int]
+        """
+        with engine.begin() as connection:
+            return migrations.migrate(_EngineMigrationContext(connection), self.title, self.migrations)
 
     def unregister_tables(self, bot):
         """
@@ -539,6 +695,21 @@ class Plugin:
                 bot.db_metadata.remove(table)
 
 
+class _EngineMigrationContext(migrations.MigrationContext):
+    """
+    :type connection: sqlalchemy.engine.Connection
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        return self.connection.execute(sqlalchemy.text(statement), params or {})
+
+    def columns(self, table):
+        return [column["name"] for column in sqlalchemy.inspect(self.connection).get_columns(table)]
+
+
 class Hook:
     """
     Each hook is specific to one function. This class is never used by itself, rather extended.
@@ -578,6 +749,16 @@ class Hook:
 
         self.permissions = func_hook.kwargs.pop("permissions", [])
         self.single_thread = func_hook.kwargs.pop("singlethread", False)
+        # what the hook only runs one event at a time for - "conn", "chan" or "nick", or None for everything
+        self.single_thread_key = func_hook.kwargs.pop("singlethread_key", None)
+        if self.single_thread_key not in (None, "conn", "chan", "nick"):
+            logger.warning("Ignoring invalid singlethread_key {} from {}:{}".format(
+                self.single_thread_key, plugin.title, self.function_name))
+            self.single_thread_key = None
+        elif self.single_thread_key is not None:
+            self.single_thread = True
+        # seconds the hook may run for, None to use the default
+        self.timeout = func_hook.kwargs.pop("timeout", None)
 
         if func_hook.kwargs:
             # we should have popped all the args, so warn if there are any left
@@ -588,9 +769,9 @@ class Hook:
         return "{}:{}".format(self.plugin.title, self.function_name)
 
     def __repr__(self):
-        return "type: {}, plugin: {}, permissions: {}, single_thread: {}, threaded: {}".format(
-            self.type, self.plugin.title, self.permissions, self.single_thread, self.threaded
-        )
+        return "type: {}, plugin: {}, permissions: {}, single_thread: {}, single_thread_key: {}, threaded: {}, " \
+               "timeout: {}".format(self.type, self.plugin.title, self.permissions, self.single_thread,
+                                    self.single_thread_key, self.threaded, self.timeout)
 
 
 class CommandHook(Hook):
@@ -650,6 +831,12 @@ class RegexHook(Hook):
 class PeriodicHook(Hook):
     """
     :type interval: int
+    :type initial_interval: int | None
+    :type align: bool
+    :type jitter: float
+    :type missed: str
+    :type max_concurrency: int
+    :type job: cloudbot.util.scheduler.Job
     """
 
     def __init__(self, plugin, periodic_hook):
@@ -659,7 +846,14 @@ class PeriodicHook(Hook):
         """
 
         self.interval = periodic_hook.interval
-        self.initial_interval = periodic_hook.kwargs.pop("initial_interval", self.interval)
+        # None to wait one interval, or for aligned hooks, to run at the next aligned time
+        self.initial_interval = periodic_hook.kwargs.pop("initial_interval", None)
+        self.align = periodic_hook.kwargs.pop("align", False)
+        self.jitter = periodic_hook.kwargs.pop("jitter", 0)
+        # see cloudbot.util.scheduler for the missed-run policies
+        self.missed = periodic_hook.kwargs.pop("missed", "coalesce")
+        self.max_concurrency = periodic_hook.kwargs.pop("max_concurrency", 1)
+        self.job = None
 
         super().__init__("periodic", plugin, periodic_hook)
 
@@ -695,6 +889,11 @@ class RawHook(Hook):
 
 
 class SieveHook(Hook):
+    """
+    :type priority: int
+    :type cache_key: str
+    """
+
     def __init__(self, plugin, sieve_hook):
         """
         :type plugin: Plugin
@@ -702,11 +901,20 @@ class SieveHook(Hook):
         """
 
         self.priority = sieve_hook.kwargs.pop("priority", 100)
+        # What the sieve's decision depends on, other than the line itself - "event" for nothing else, or "hook_type"
+        # for the type of hook. Sieves declaring this are only run once per key for each line, and must return either
+        # the event they were given or None. Sieves which depend on the hook itself can't share a decision, since
+        # each hook only runs once per line, so they leave this out.
+        self.cache_key = sieve_hook.kwargs.pop("cache_key", None)
+        if self.cache_key not in (None, "event", "hook_type"):
+            logger.warning("Ignoring invalid cache_key {} from sieve {}:{}".format(
+                self.cache_key, plugin.title, sieve_hook.function.__name__))
+            self.cache_key = None
         # We don't want to thread sieves by default - this is retaining old behavior for compatibility
         super().__init__("sieve", plugin, sieve_hook)
 
     def __repr__(self):
-        return "Sieve[{}]".format(Hook.__repr__(self))
+        return "Sieve[priority: {}, cache_key: {}, {}]".format(self.priority, self.cache_key, Hook.__repr__(self))
 
     def __str__(self):
         return "sieve {} from {}".format(self.function_name, self.plugin.file_name)
@@ -749,6 +957,21 @@ class OnStartHook(Hook):
         return "on_start {} from {}".format(self.function_name, self.plugin.file_name)
 
 
+class OnStopHook(Hook):
+    def __init__(self, plugin, on_stop_hook):
+        """
+        :type plugin: Plugin
+        :type on_stop_hook: cloudbot.util.hook._Hook
+        """
+        super().__init__("on_stop", plugin, on_stop_hook)
+
+    def __repr__(self):
+        return "On_stop[{}]".format(Hook.__repr__(self))
+
+    def __str__(self):
+        return "on_stop {} from {}".format(self.function_name, self.plugin.file_name)
+
+
 _hook_name_to_plugin = {
     "command": CommandHook,
     "regex": RegexHook,
@@ -756,5 +979,6 @@ _hook_name_to_plugin = {
     "sieve": SieveHook,
     "event": EventHook,
     "periodic": PeriodicHook,
-    "on_start": OnStartHook
+    "on_start": OnStartHook,
+    "on_stop": OnStopHook
 }
@@ -0,0 +1,63 @@
+from cloudbot.permissions import PermissionManager
+
+
+class MockConn:
+    def __init__(self, config):
+        self.name = "testconn"
+        self.config = config
+
+
+test_config = {
+    "permissions": {
+        "admins": {
+            "perms": ["botcontrol", "ignore"],
+            "users": ["Admin!user@admin.example.com", "*!*@trusted.example.com"]
+        },
+        "moderators": {
+            "perms": ["ignore", "op"],
+            "users": ["mod!*@*", "*!*@trusted.example.com"]
+        }
+    }
+}
+
+
+def make_manager():
+    return PermissionManager(MockConn(test_config))
+
+
+def test_has_perm_mask():
+    manager = make_manager()
+    assert manager.has_perm_mask("admin!user@admin.example.com", "botcontrol")
+    assert manager.has_perm_mask("ADMIN!user@admin.example.com", "BotControl")
+    assert manager.has_perm_mask("anyone!x@trusted.example.com", "op")
+    assert manager.has_perm_mask("mod!x@y", "ignore")
+    assert not manager.has_perm_mask("mod!x@y", "botcontrol")
+    assert not manager.has_perm_mask("random!x@y", "ignore")
+    assert not manager.has_perm_mask("admin!user@admin.example.com", "nonexistent")
+
+
+def test_user_permissions():
+    manager = make_manager()
+    assert manager.get_user_permissions("admin!user@admin.example.com") == {"botcontrol", "ignore"}
+    assert manager.get_user_permissions("someone!x@trusted.example.com") == {"botcontrol", "ignore", "op"}
+    assert manager.get_user_permissions("random!x@y") == set()
+
+
+def test_user_groups():
+    manager = make_manager()
+    assert sorted(manager.get_user_groups("someone!x@trusted.example.com")) == ["admins", "moderators"]
+    assert manager.get_user_groups("mod!x@y") == ["moderators"]
+    assert manager.user_in_group("mod!x@y", "Moderators")
+    assert not manager.user_in_group("mod!x@y", "admins")
+    assert not manager.user_in_group("mod!x@y", "nonexistent")
+
+
+def test_reload():
+    config = {"permissions": {"admins": {"perms": ["botcontrol"], "users": ["admin!*@*"]}}}
+    manager = PermissionManager(MockConn(config))
+    assert not manager.has_perm_mask("new!x@y", "botcontrol")
+
+    assert manager.add_user_to_group("new!*@*", "admins")
+    # cached results are thrown away on reload
+    manager.reload()
+    assert manager.has_perm_mask("new!x@y", "botcontrol")
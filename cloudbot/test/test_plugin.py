@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+# the plugin manager needs sqlalchemy
+pytest.importorskip("sqlalchemy")
+
+from cloudbot import hook
+from cloudbot.event import Event
+from cloudbot.plugin import PluginManager, RawHook
+
+
+class MockBot:
+    def __init__(self, loop, config):
+        self.loop = loop
+        self.config = config
+        self.plugin_manager = None
+
+
+class MockPlugin:
+    title = "test"
+
+
+def make_raw_hook(function):
+    return RawHook(MockPlugin(), function._cloudbot_hook["irc_raw"])
+
+
+@asyncio.coroutine
+@hook.irc_raw("004", timeout=0)
+def long_running():
+    yield from asyncio.sleep(0.3)
+
+
+@asyncio.coroutine
+@hook.irc_raw("004")
+def limited():
+    yield from asyncio.sleep(0.3)
+
+
+def test_raw_hook_timeouts():
+    loop = asyncio.new_event_loop()
+    try:
+        bot = MockBot(loop, {"hooks": {"timeout": 0.1}})
+        manager = PluginManager(bot)
+        unlimited_hook = make_raw_hook(long_running)
+        limited_hook = make_raw_hook(limited)
+        assert manager.get_timeout(unlimited_hook) is None
+        assert manager.get_timeout(limited_hook) == 0.1
+
+        # a raw hook marked timeout=0 runs past the default timeout
+        assert loop.run_until_complete(manager._execute_hook(unlimited_hook, Event(bot=bot, hook=unlimited_hook)))
+        assert manager.timeouts == {}
+
+        assert not loop.run_until_complete(manager._execute_hook(limited_hook, Event(bot=bot, hook=limited_hook)))
+        assert manager.timeouts == {"test": 1}
+    finally:
+        loop.close()
+
+
+runs = []
+
+
+@hook.irc_raw("PRIVMSG", singlethread=True, timeout=0.1)
+def slow_thread():
+    start = time.time()
+    time.sleep(0.3)
+    runs.append((start, time.time()))
+
+
+def test_abandoned_singlethread_hook():
+    loop = asyncio.new_event_loop()
+    try:
+        bot = MockBot(loop, {})
+        manager = bot.plugin_manager = PluginManager(bot)
+        slow_hook = make_raw_hook(slow_thread)
+        launches = [manager.launch(slow_hook, Event(bot=bot, hook=slow_hook)) for _ in range(2)]
+        assert loop.run_until_complete(asyncio.gather(*launches, loop=loop)) == [False, False]
+        # the first thread was abandoned, but the second event still waited for it to finish
+        loop.run_until_complete(asyncio.sleep(0.4, loop=loop))
+        assert len(runs) == 2
+        assert runs[1][0] >= runs[0][1]
+        assert not manager.hook_locks.waiting
+    finally:
+        loop.close()
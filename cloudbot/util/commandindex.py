@@ -0,0 +1,130 @@
+"""
+commandindex.py
+
+A mapping of command names to hooks, backed by a prefix tree so abbreviated commands can be looked up in time
+proportional to the length of the abbreviation rather than the number of registered commands.
+"""
+
+import bisect
+from collections.abc import MutableMapping
+from operator import attrgetter
+
+
+class _Node:
+    """
+    A node in the prefix tree. `names` holds every command name at or below this node, in sorted order, so a node
+    with a single name is a unique prefix of that command.
+    :type children: dict[str, _Node]
+    :type names: list[str]
+    """
+    __slots__ = ("children", "names")
+
+    def __init__(self):
+        self.children = {}
+        self.names = []
+
+
+class CommandIndex(MutableMapping):
+    """
+    Behaves like a dict of command names to hooks, with additional prefix lookups.
+
+    >>> index = CommandIndex()
+    >>> index["weather"] = "weather hook"
+    >>> index["wolframalpha"] = "wolfram hook"
+    >>> index.resolve("wea")
+    'weather hook'
+    >>> index.prefix_matches("w")
+    ['weather', 'wolframalpha']
+
+    :type _commands: dict[str, object]
+    :type _root: _Node
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._root = _Node()
+
+    def __getitem__(self, name):
+        return self._commands[name]
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def __setitem__(self, name, hook):
+        if name not in self._commands:
+            node = self._root
+            bisect.insort(node.names, name)
+            for char in name:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+                bisect.insort(node.names, name)
+        self._commands[name] = hook
+
+    def __delitem__(self, name):
+        del self._commands[name]
+        node = self._root
+        node.names.remove(name)
+        for char in name:
+            child = node.children[char]
+            child.names.remove(name)
+            if not child.names:
+                # nothing else is under this branch, so drop it altogether
+                del node.children[char]
+                break
+            node = child
+
+    def __iter__(self):
+        return iter(self._commands)
+
+    def __len__(self):
+        return len(self._commands)
+
+    def _find_node(self, prefix):
+        """
+        :type prefix: str
+        :rtype: _Node
+        """
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def prefix_matches(self, prefix):
+        """
+        Returns a sorted list of all command names starting with the given prefix.
+        :type prefix: str
+        :rtype: list[str]
+        """
+        node = self._find_node(prefix)
+        if node is None:
+            return []
+        return list(node.names)
+
+    def resolve(self, name):
+        """
+        Returns the hook for the given command name, or for the only command the given name is a prefix of. Returns
+        None if nothing matches, or if the name is an ambiguous abbreviation.
+        :type name: str
+        """
+        hook = self._commands.get(name)
+        if hook is not None:
+            return hook
+        node = self._find_node(name)
+        if node is None or len(node.names) != 1:
+            return None
+        return self._commands[node.names[0]]
+
+    def hooks(self, prefix=""):
+        """
+        Returns each distinct hook with a command name starting with the given prefix, sorted by the hook's name.
+        :type prefix: str
+        :rtype: list
+        """
+        node = self._find_node(prefix)
+        if node is None:
+            return []
+        return sorted(set(self._commands[name] for name in node.names), key=attrgetter("name"))
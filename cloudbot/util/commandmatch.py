@@ -0,0 +1,85 @@
+"""
+commandmatch.py
+
+Matches incoming messages against a connection's command syntax. The channel and private message patterns are
+compiled once and only rebuilt when the bot's nick or the command prefix changes, and lines that can't possibly be
+commands are rejected without running a regex at all.
+"""
+
+import re
+
+channel_command_format = r'(?i)^(?:[{prefix}]|{nick}[,;:]+\s+)(\w+)(?:$|\s+)(.*)'
+private_command_format = r'(?i)^(?:[{prefix}]?|{nick}[,;:]+\s+)(\w+)(?:$|\s+)(.*)'
+
+
+class CommandMatcher:
+    """
+    :type nick: str
+    :type prefix: str
+    :type channel_re: re.__Regex
+    :type private_re: re.__Regex
+    """
+
+    def __init__(self, nick, prefix="."):
+        """
+        :type nick: str
+        :type prefix: str
+        """
+        self.nick = None
+        self.prefix = None
+        self.channel_re = None
+        self.private_re = None
+        self._nick_lower = None
+        self._nick_length = 0
+        self._prefix_chars = frozenset()
+
+        self.update(nick, prefix)
+
+    def update(self, nick, prefix):
+        """
+        Recompiles the command patterns, if either the nick or the command prefix has changed.
+        Returns True if the patterns were recompiled.
+        :type nick: str
+        :type prefix: str
+        :rtype: bool
+        """
+        if nick == self.nick and prefix == self.prefix:
+            return False
+
+        self.nick = nick
+        self.prefix = prefix
+
+        # every character of the prefix is a valid prefix on its own, same as the character class it's used in
+        escaped_prefix = "".join(re.escape(char) for char in prefix)
+        escaped_nick = re.escape(nick)
+        self.channel_re = re.compile(channel_command_format.format(prefix=escaped_prefix, nick=escaped_nick))
+        self.private_re = re.compile(private_command_format.format(prefix=escaped_prefix, nick=escaped_nick))
+
+        self._nick_lower = nick.lower()
+        self._nick_length = len(nick)
+        self._prefix_chars = frozenset(prefix)
+        return True
+
+    def match(self, content, private=False):
+        """
+        Matches a message against the command syntax, returning the match object or None.
+
+        Group 1 of the match is the command name, and group 2 is the (unstripped) command text.
+        :param content: The content of the message
+        :param private: Whether the message was sent privately, in which case the prefix is optional
+        :type content: str
+        :type private: bool
+        :rtype: re.__Match
+        """
+        if not content:
+            return None
+
+        if private:
+            # the prefix is optional, so almost any line could be a command. private messages are rare anyways.
+            return self.private_re.match(content)
+
+        if content[0] not in self._prefix_chars and content[:self._nick_length].lower() != self._nick_lower:
+            # not prefixed by the command prefix, and not addressed to us
+            return None
+
+        return self.channel_re.match(content)
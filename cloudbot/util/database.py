@@ -1,7 +1,173 @@
 """
 database - contains variables set by cloudbot to be easily access
+
+Also contains the write-behind queue, which plugins can give frequent writes to instead of committing each one. Queued
+statements are run in a single transaction every interval, or once enough of them are waiting, so a busy channel
+costs one commit (and one fsync, on SQLite) per flush rather than one per line.
 """
 
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("cloudbot")
+
 # this is assigned in the CloudBot so that its recreated when the bot restarts
 metadata = None
 base = None
+write_behind = None
+
+# the key of each statement which isn't coalesced starts with this, so it can't match any key given to enqueue()
+_unkeyed = object()
+
+
+class WriteBehindQueue:
+    """
+    Runs queued statements in batches, on its own thread.
+
+    Statements enqueued with a key replace any statement still waiting with the same key, for writes where only the
+    last one matters (like `insert or replace`). Otherwise statements are run in the order they were enqueued.
+
+    :type interval: float
+    :type batch_size: int
+    """
+
+    def __init__(self, session_factory, interval=1.0, batch_size=200):
+        """
+        :param session_factory: Creates a new session, for example a sqlalchemy sessionmaker
+        :param interval: The longest a statement waits before it's run, in seconds
+        :param batch_size: The number of waiting statements which triggers a flush straight away
+        :type interval: float
+        :type batch_size: int
+        """
+        self.interval = interval
+        self.batch_size = batch_size
+        self._session_factory = session_factory
+
+        self._pending = OrderedDict()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        # only one flush at a time, so batches are committed in order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._running = False
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def enqueue(self, statement, params=None, key=None):
+        """
+        Queues a statement to be run in the next flush.
+        :param statement: Anything session.execute() accepts
+        :param params: The statement's parameters
+        :param key: Identifies what the statement writes, if only the last write to it needs to be run
+        :type params: dict
+        :type key: collections.Hashable
+        """
+        with self._lock:
+            if key is None:
+                key = (_unkeyed, next(self._sequence))
+            elif key in self._pending:
+                # move it to the back, so it's still run after anything enqueued before it
+                del self._pending[key]
+                self.coalesced += 1
+            self._pending[key] = (statement, params or {})
+            self.enqueued += 1
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self._wakeup.set()
+
+    def start(self):
+        """
+        Starts flushing in the background
+        """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops flushing in the background, and runs every statement still waiting
+        """
+        if self._running:
+            self._running = False
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error flushing queued database writes")
+
+    def flush(self):
+        """
+        Runs every waiting statement in one transaction, and returns how many were run. If the transaction fails, the
+        statements are retried one at a time, so one bad statement doesn't lose the whole batch.
+        :rtype: int
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                statements = list(self._pending.values())
+                self._pending = OrderedDict()
+
+            session = self._session_factory()
+            try:
+                try:
+                    for statement, params in statements:
+                        session.execute(statement, params)
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    logger.exception("Error running {} queued database writes, retrying them one at a time".format(
+                        len(statements)))
+                    self._retry(session, statements)
+                else:
+                    self.written += len(statements)
+            finally:
+                session.close()
+            self.flushes += 1
+            return len(statements)
+
+    def _retry(self, session, statements):
+        for statement, params in statements:
+            try:
+                session.execute(statement, params)
+                session.commit()
+            except Exception:
+                session.rollback()
+                self.failed += 1
+                logger.exception("Dropping queued database write {!r} {!r}".format(statement, params))
+            else:
+                self.written += 1
+
+    def stats(self):
+        """
+        :rtype: dict[str, int]
+        """
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
@@ -0,0 +1,161 @@
+"""
+dbengine.py
+
+Works out how the database engine is set up from the "database_options" section of the config, and times the
+statements it runs.
+
+SQLite connections get pragmas applied as they're opened. By default the database is put in WAL mode, where readers
+don't wait for writers (so .seen and .quote aren't held up by the seen tracker writing), with a busy timeout so
+writers wait for each other instead of failing with "database is locked". Other databases get a connection pool.
+"""
+
+import logging
+import threading
+from time import time
+
+logger = logging.getLogger("cloudbot")
+
+default_sqlite_pragmas = {
+    "journal_mode": "wal",
+    # with WAL, normal is still safe from corruption, only the last commits may be lost on a power failure
+    "synchronous": "normal",
+    # negative sizes are in KiB
+    "cache_size": -8000,
+    "mmap_size": 64 * 1024 * 1024,
+    "busy_timeout": 5000,
+}
+
+pool_classes = frozenset(["QueuePool", "NullPool", "StaticPool", "SingletonThreadPool", "AssertionPool"])
+
+
+def is_sqlite(url):
+    """
+    :type url: str
+    :rtype: bool
+    """
+    return url.startswith("sqlite")
+
+
+def sqlite_pragmas(options):
+    """
+    Returns the PRAGMA statements to run on each new SQLite connection. Pragmas set to null in the config are skipped.
+    :type options: dict
+    :rtype: list[str]
+    """
+    pragmas = dict(default_sqlite_pragmas)
+    pragmas.update(options.get("sqlite", {}))
+    statements = []
+    for name, value in sorted(pragmas.items()):
+        if value is None:
+            continue
+        if not name.replace("_", "").isalpha():
+            raise ValueError("Invalid SQLite pragma: {!r}".format(name))
+        if isinstance(value, bool):
+            value = int(value)
+        elif not isinstance(value, int) and not str(value).replace("_", "").isalnum():
+            raise ValueError("Invalid value for SQLite pragma {}: {!r}".format(name, value))
+        statements.append("PRAGMA {}={}".format(name, value))
+    return statements
+
+
+def engine_arguments(url, options):
+    """
+    Returns the keyword arguments for create_engine(). The pool class is given by name, as "poolclass_name", for the
+    caller to look up in sqlalchemy.pool.
+    :type url: str
+    :type options: dict
+    :rtype: dict
+    """
+    arguments = {}
+    pool_class = options.get("pool_class")
+    if pool_class is not None:
+        if pool_class not in pool_classes:
+            raise ValueError("Unknown pool class: {!r}".format(pool_class))
+        arguments["poolclass_name"] = pool_class
+
+    if is_sqlite(url):
+        # the sqlite pools don't take sizes
+        return arguments
+
+    if pool_class in (None, "QueuePool"):
+        arguments["pool_size"] = options.get("pool_size", 5)
+        arguments["max_overflow"] = options.get("max_overflow", 10)
+        arguments["pool_timeout"] = options.get("pool_timeout", 30)
+    # most servers close idle connections eventually, so don't keep them forever
+    arguments["pool_recycle"] = options.get("pool_recycle", 3600)
+    return arguments
+
+
+class StatementTimer:
+    """
+    Records how long the engine's statements take, by kind (SELECT, INSERT, ...).
+    :type slow_threshold: float
+    """
+
+    def __init__(self, slow_threshold=0.5):
+        """
+        :param slow_threshold: Statements taking longer than this many seconds are logged
+        :type slow_threshold: float
+        """
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        # kind -> [count, total time, max time]
+        self._kinds = {}
+        self.slow = 0
+        self.slowest = None
+        self.slowest_time = 0.0
+
+    def before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Listener for the engine's before_cursor_execute event. The start time is kept on the statement's execution
+        context, so a statement which fails, and never gets an after_cursor_execute, leaves nothing behind.
+        """
+        if context is not None:
+            context.cloudbot_start_time = time()
+
+    def after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """
+        Listener for the engine's after_cursor_execute event
+        """
+        start = getattr(context, "cloudbot_start_time", None)
+        if start is None:
+            return
+        self.record(statement, time() - start)
+
+    def record(self, statement, elapsed):
+        """
+        :type statement: str
+        :type elapsed: float
+        """
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+        with self._lock:
+            counts = self._kinds.get(kind)
+            if counts is None:
+                counts = self._kinds[kind] = [0, 0.0, 0.0]
+            counts[0] += 1
+            counts[1] += elapsed
+            if elapsed > counts[2]:
+                counts[2] = elapsed
+            if elapsed > self.slowest_time:
+                self.slowest_time = elapsed
+                self.slowest = statement
+            slow = elapsed > self.slow_threshold
+            if slow:
+                self.slow += 1
+        if slow:
+            logger.warning("Slow database statement ({:.3f}s): {}".format(elapsed, " ".join(statement.split())[:200]))
+
+    def stats(self):
+        """
+        :rtype: dict[str, dict[str, int | float]]
+        """
+        with self._lock:
+            return {kind: {"count": count, "total": total, "average": total / count, "max": maximum}
+                    for kind, (count, total, maximum) in self._kinds.items()}
+
+    def reset(self):
+        with self._lock:
+            self._kinds.clear()
+            self.slow = 0
+            self.slowest = None
+            self.slowest_time = 0.0
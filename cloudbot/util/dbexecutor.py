@@ -0,0 +1,125 @@
+"""
+dbexecutor.py
+
+Runs the database work of coroutine hooks on a fixed set of threads, rather than a new thread for every hook call.
+
+A session may only be used from the thread which created it, so each worker is a single thread. Each hook call is
+assigned the least busy worker, checks a session out from it, runs all of its database work there, and returns the
+session when it's done. Returned sessions are closed and kept for reuse, so the number of threads and sessions stays
+the same however many hooks run.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+default_workers = 4
+# sessions each worker keeps for reuse, beyond that returned sessions are dropped
+max_idle_sessions = 4
+
+
+class DatabaseWorker(ThreadPoolExecutor):
+    """
+    A single database thread, and the sessions it has created.
+    :type index: int
+    :type assigned: int
+    """
+
+    def __init__(self, session_factory, index):
+        """
+        :type session_factory: () -> sqlalchemy.orm.Session
+        :type index: int
+        """
+        super().__init__(1)
+        self.index = index
+        self._session_factory = session_factory
+        self._idle = []
+        # hook calls using this worker, only changed from the event loop
+        self.assigned = 0
+        # only changed from the worker thread
+        self.created = 0
+        self.checked_out = 0
+
+    def checkout(self):
+        """
+        Returns a session for a hook call. Must be run in this worker's thread.
+        :rtype: sqlalchemy.orm.Session
+        """
+        if self._idle:
+            session = self._idle.pop()
+        else:
+            session = self._session_factory()
+            self.created += 1
+        self.checked_out += 1
+        return session
+
+    def checkin(self, session):
+        """
+        Closes a session a hook call is done with, keeping it for reuse. Must be run in this worker's thread.
+        :type session: sqlalchemy.orm.Session
+        """
+        self.checked_out -= 1
+        try:
+            session.close()
+        finally:
+            if len(self._idle) < max_idle_sessions:
+                self._idle.append(session)
+
+    @property
+    def idle(self):
+        """
+        The number of sessions kept for reuse
+        :rtype: int
+        """
+        return len(self._idle)
+
+
+class DatabaseExecutor:
+    """
+    :type workers: list[DatabaseWorker]
+    """
+
+    def __init__(self, session_factory, workers=default_workers):
+        """
+        :param session_factory: Creates a new session, for example a sqlalchemy sessionmaker
+        :param workers: The number of database threads
+        :type session_factory: () -> sqlalchemy.orm.Session
+        :type workers: int
+        """
+        self.workers = [DatabaseWorker(session_factory, index) for index in range(max(1, workers))]
+        self._lock = threading.Lock()
+
+    def assign(self):
+        """
+        Returns the worker with the fewest hook calls using it, which the caller must give back with release()
+        :rtype: DatabaseWorker
+        """
+        with self._lock:
+            worker = min(self.workers, key=lambda candidate: candidate.assigned)
+            worker.assigned += 1
+        return worker
+
+    def release(self, worker):
+        """
+        :type worker: DatabaseWorker
+        """
+        with self._lock:
+            worker.assigned -= 1
+
+    def stats(self):
+        """
+        :rtype: dict[str, int]
+        """
+        return {
+            "workers": len(self.workers),
+            "assigned": sum(worker.assigned for worker in self.workers),
+            "sessions_created": sum(worker.created for worker in self.workers),
+            "checked_out": sum(worker.checked_out for worker in self.workers),
+            "idle": sum(worker.idle for worker in self.workers),
+        }
+
+    def shutdown(self, wait=True):
+        """
+        :type wait: bool
+        """
+        for worker in self.workers:
+            worker.shutdown(wait=wait)
@@ -0,0 +1,222 @@
+"""
+decoding.py
+
+Decodes lines received from a server, which may be in UTF-8 or in some legacy encoding.
+
+Pure ASCII lines, which are most lines, are decoded without trying any codecs. Other lines are decoded with UTF-8 if
+they're valid UTF-8, and otherwise with the first of the fallback codecs that can decode them.
+
+Once most of a connection's recent non-ASCII lines are in a legacy encoding, UTF-8 is only tried for lines containing
+a UTF-8 lead byte followed by a continuation byte, which every non-ASCII UTF-8 line has and legacy text rarely does.
+This way legacy-encoded channels don't cost a UnicodeDecodeError for every line. Fallbacks are tried without raising.
+
+Multibyte fallbacks (shift_jis, euc_jp, gbk, ...) are tried before single-byte ones (cp1252, iso-8859-1, ...), since
+a single-byte codec can decode nearly anything and would hide the others. Among the multibyte fallbacks, the one used
+most by the connection's recent lines is tried first, which also settles lines that are valid in more than one of them
+in favour of the encoding the network actually uses.
+"""
+
+import codecs
+import re
+
+default_encodings = ("utf-8", "cp1252", "iso-8859-1")
+
+# a lead byte followed by a continuation byte, the start of any non-ASCII UTF-8 character
+_utf8_sequence_re = re.compile(b"[\xc2-\xf4][\x80-\xbf]")
+
+try:
+    _is_ascii = bytes.isascii
+except AttributeError:
+    # python < 3.7
+    _ascii_bytes = bytes(range(128))
+
+    def _is_ascii(data):
+        """
+        :type data: bytes
+        :rtype: bool
+        """
+        return not data.translate(None, _ascii_bytes)
+
+
+def _is_single_byte(codec):
+    """
+    Returns whether every byte is decoded on its own by the given codec. Multibyte codecs combine some of these
+    consecutive bytes into a single character.
+    :type codec: str
+    :rtype: bool
+    """
+    return len(bytes(range(128, 256)).decode(codec, "replace")) == 128
+
+
+def _decodes_everything(codec):
+    """
+    Returns whether the given single-byte codec has a character for every byte, and so can never fail.
+    :type codec: str
+    :rtype: bool
+    """
+    return "\ufffd" not in bytes(range(256)).decode(codec, "replace")
+
+
+def _decode_cleanly(data, codec):
+    """
+    Decodes data with the given codec, returning None if it isn't valid in that codec.
+    :type data: bytes
+    :type codec: str
+    :rtype: str | None
+    """
+    text = data.decode(codec, "replace")
+    if "\ufffd" in text:
+        return None
+    return text
+
+
+class Decoder:
+    """
+    :type encodings: list[str]
+    :type window: int
+    :type ascii_lines: int
+    :type utf8_lines: int
+    :type undecodable: int
+    :type fallback_lines: dict[str, int]
+    """
+
+    def __init__(self, encodings=default_encodings, window=100):
+        """
+        :param encodings: The codecs to try, in order. UTF-8, if it's included, is always tried first.
+        :param window: Roughly how many non-ASCII lines it takes to adapt to a change in the connection's encoding
+        :type encodings: collections.Iterable[str]
+        :type window: int
+        """
+        self.window = window
+        self.ascii_lines = 0
+        self.utf8_lines = 0
+        # lines which no codec could decode
+        self.undecodable = 0
+        # the number of lines each fallback has decoded, since the decoder was created
+        self.fallback_lines = {}
+
+        self.encodings = []
+        self._use_utf8 = False
+        self._multibyte = []
+        self._single_byte = []
+        self._last_resort = None
+        # goes up for each UTF-8 line and down for each legacy one, between -window and window
+        self._utf8_score = 0
+        # the same for each multibyte fallback, going down whenever another codec is used
+        self._multibyte_scores = {}
+        self.set_encodings(encodings)
+
+    def set_encodings(self, encodings):
+        """
+        :raises LookupError: If one of the encodings doesn't exist
+        :type encodings: collections.Iterable[str]
+        """
+        encodings = list(encodings) or default_encodings
+        # normalize names, so "UTF8" and "latin1" are recognized
+        encodings = [codecs.lookup(encoding).name for encoding in encodings]
+        self.encodings = encodings
+        self._use_utf8 = "utf-8" in encodings
+        fallbacks = [encoding for encoding in encodings if encoding != "utf-8"]
+        self._multibyte = [encoding for encoding in fallbacks if not _is_single_byte(encoding)]
+        single_byte = [encoding for encoding in fallbacks if _is_single_byte(encoding)]
+
+        # there's no point trying anything after a codec which can decode everything
+        self._last_resort = None
+        for index, encoding in enumerate(single_byte):
+            if _decodes_everything(encoding):
+                self._last_resort = encoding
+                single_byte = single_byte[:index]
+                break
+        self._single_byte = single_byte
+
+        self._utf8_score = 0
+        self._multibyte_scores = {encoding: 0 for encoding in self._multibyte}
+
+    def _learn(self, codec):
+        """
+        Records the fallback a line was decoded with, and adapts to what the connection's recent lines used.
+        :type codec: str
+        """
+        fallback_lines = self.fallback_lines
+        fallback_lines[codec] = fallback_lines.get(codec, 0) + 1
+
+        if self._utf8_score > -self.window:
+            self._utf8_score -= 1
+
+        fallbacks = self._multibyte
+        if len(fallbacks) > 1:
+            scores = self._multibyte_scores
+            for other in fallbacks:
+                if other == codec:
+                    if scores[other] < self.window:
+                        scores[other] += 1
+                elif scores[other] > 0:
+                    scores[other] -= 1
+            # move the multibyte fallback used most recently to the front
+            if codec in scores and fallbacks[0] != codec and scores[codec] > scores[fallbacks[0]]:
+                fallbacks.remove(codec)
+                fallbacks.insert(0, codec)
+
+    def decode(self, data):
+        """
+        :type data: bytes
+        :rtype: str
+        """
+        if _is_ascii(data):
+            self.ascii_lines += 1
+            return data.decode("ascii")
+
+        # on mostly legacy connections, only try lines that could be UTF-8
+        if self._use_utf8 and (self._utf8_score >= 0 or _utf8_sequence_re.search(data) is not None):
+            try:
+                text = data.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+            else:
+                self.utf8_lines += 1
+                if self._utf8_score < self.window:
+                    self._utf8_score += 1
+                return text
+
+        for codec in self._multibyte:
+            text = _decode_cleanly(data, codec)
+            if text is not None:
+                self._learn(codec)
+                return text
+
+        for codec in self._single_byte:
+            text = _decode_cleanly(data, codec)
+            if text is not None:
+                self._learn(codec)
+                return text
+
+        if self._last_resort is not None:
+            self._learn(self._last_resort)
+            return data.decode(self._last_resort)
+
+        self.undecodable += 1
+        return data.decode(self.encodings[0], "ignore")
+
+    @property
+    def lines(self):
+        """
+        The number of lines decoded
+        :rtype: int
+        """
+        return self.ascii_lines + self.utf8_lines + sum(self.fallback_lines.values()) + self.undecodable
+
+    def stats(self):
+        """
+        :rtype: dict[str, int | dict[str, int] | list[str]]
+        """
+        fallbacks = self._multibyte + self._single_byte
+        if self._last_resort is not None:
+            fallbacks.append(self._last_resort)
+        return {
+            "lines": self.lines,
+            "ascii_lines": self.ascii_lines,
+            "utf8_lines": self.utf8_lines,
+            "fallback_lines": dict(self.fallback_lines),
+            "undecodable": self.undecodable,
+            "fallbacks": fallbacks,
+        }
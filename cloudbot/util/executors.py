@@ -0,0 +1,177 @@
+"""
+executors.py
+
+Thread pools for running blocking plugin code, so one plugin's slow or hung threads can't starve every other plugin.
+
+Each plugin gets a small pool of its own, unless the config assigns it to a named, shared pool. Database work runs on
+the bot's DatabaseExecutor (see dbexecutor.py) instead. Every pool keeps track of how busy it is and how long work
+waits for a thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+default_plugin_workers = 4
+
+
+class MonitoredExecutor(ThreadPoolExecutor):
+    """
+    A ThreadPoolExecutor which records how many tasks are waiting and running, and how long they waited for a thread.
+    :type name: str
+    :type max_workers: int
+    """
+
+    def __init__(self, name, max_workers):
+        """
+        :type name: str
+        :type max_workers: int
+        """
+        super().__init__(max_workers)
+        self.name = name
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.active = 0
+        self.max_active = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        submitted_at = time()
+        with self._lock:
+            self.submitted += 1
+        return super().submit(self._run, submitted_at, fn, args, kwargs)
+
+    def _run(self, submitted_at, fn, args, kwargs):
+        wait = time() - submitted_at
+        with self._lock:
+            self.active += 1
+            if self.active > self.max_active:
+                self.max_active = self.active
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self):
+        """
+        :rtype: dict[str, str | int | float]
+        """
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "max_active": self.max_active,
+                "queued": self.submitted - started,
+                "completed": self.completed,
+                "average_wait": self.total_wait / started if started else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+class ExecutorManager:
+    """
+    Creates thread pools as they're first needed, and decides which pool each plugin uses.
+
+    The config looks like:
+        {
+            "plugin_workers": 4,
+            "pools": {"web": 10},
+            "plugins": {"youtube": "web", "wolframalpha": "web"}
+        }
+    where "pools" gives the number of threads in each shared pool, and "plugins" assigns plugins to them. Other plugins
+    get their own pool, with "plugin_workers" threads.
+
+    :type pools: dict[str, MonitoredExecutor]
+    """
+
+    def __init__(self, config=None):
+        """
+        :type config: dict
+        """
+        self.pools = {}
+        self._lock = threading.Lock()
+        self._pool_sizes = {}
+        self._plugin_pools = {}
+        self._plugin_workers = default_plugin_workers
+        self.configure(config or {})
+
+    def configure(self, config):
+        """
+        Applies a new config. Pools whose size changed are replaced, and the old pools finish their queued work in the
+        background.
+        :type config: dict
+        """
+        self._plugin_workers = config.get("plugin_workers", default_plugin_workers)
+        pool_sizes = dict(config.get("pools", {}))
+        self._pool_sizes = pool_sizes
+        self._plugin_pools = {plugin: pool for plugin, pool in config.get("plugins", {}).items() if pool in pool_sizes}
+
+        with self._lock:
+            for name, pool in list(self.pools.items()):
+                if pool.max_workers != self._size_of(name):
+                    del self.pools[name]
+                    pool.shutdown(wait=False)
+
+    def _size_of(self, name):
+        """
+        :type name: str
+        :rtype: int
+        """
+        return self._pool_sizes.get(name, self._plugin_workers)
+
+    def get(self, name):
+        """
+        Returns the pool with the given name, creating it if needed
+        :type name: str
+        :rtype: MonitoredExecutor
+        """
+        pool = self.pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self.pools.get(name)
+                if pool is None:
+                    pool = self.pools[name] = MonitoredExecutor(name, self._size_of(name))
+        return pool
+
+    def pool_name(self, plugin_title):
+        """
+        Returns the name of the pool the given plugin uses. Plugins without a shared pool use one named after them.
+        :type plugin_title: str
+        :rtype: str
+        """
+        return self._plugin_pools.get(plugin_title, "plugin:" + plugin_title)
+
+    def for_plugin(self, plugin_title):
+        """
+        :type plugin_title: str
+        :rtype: MonitoredExecutor
+        """
+        return self.get(self.pool_name(plugin_title))
+
+    def stats(self):
+        """
+        :rtype: list[dict[str, str | int | float]]
+        """
+        return [pool.stats() for name, pool in sorted(self.pools.items())]
+
+    def shutdown(self, wait=True):
+        """
+        Shuts down every pool
+        :type wait: bool
+        """
+        with self._lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+        for pool in pools:
+            pool.shutdown(wait=wait)
@@ -0,0 +1,359 @@
+"""
+httpclient.py
+
+A shared HTTP client for plugins, which keeps connections open between requests and reuses them, so repeated calls to
+the same API don't pay for a new TCP connection and TLS handshake each time. Responses are compressed where the server
+supports it, and every request has a timeout.
+
+The blocking functions take the same arguments as the ones in cloudbot.util.http, so threaded plugins can switch over
+one at a time:
+
+    data = http.get_json(url, query_params={"q": text})
+    data = httpclient.get_json(url, query_params={"q": text})
+
+Coroutine hooks can use the _async versions, which run the request on the bot's "web" thread pool and return a future:
+
+    data = yield from httpclient.get_json_async(url, query_params={"q": text})
+
+These still make a blocking request, just on another thread, so they aren't non-blocking I/O: each request in flight
+holds one of the "web" pool's threads until it finishes or times out.
+
+Unlike cloudbot.util.http, failed requests raise requests.RequestException (and requests.HTTPError for error
+statuses). The bot's client is configured from the "http" section of the config.
+"""
+
+import asyncio
+import http.cookiejar
+import json
+import logging
+import threading
+from functools import partial
+from time import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("cloudbot")
+
+default_user_agent = 'Cloudbot/DEV http://github.com/CloudDev/CloudBot'
+
+# this is assigned in the CloudBot, and created on first use otherwise
+client = None
+_client_lock = threading.Lock()
+
+
+class HostStats:
+    """
+    :type requests: int
+    :type errors: int
+    :type total_time: float
+    :type max_time: float
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.received = 0
+
+    def record(self, elapsed, error=False, received=0):
+        """
+        :type elapsed: float
+        :type error: bool
+        :type received: int
+        """
+        self.requests += 1
+        if error:
+            self.errors += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        self.received += received
+
+    def stats(self):
+        """
+        :rtype: dict[str, int | float]
+        """
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "average": self.total_time / self.requests if self.requests else 0.0,
+            "max": self.max_time,
+            "received": self.received,
+        }
+
+
+class HttpClient:
+    """
+    :type session: requests.Session
+    :type timeout: float
+    :type hosts: dict[str, HostStats]
+    """
+
+    def __init__(self, config=None, loop=None, get_executor=None):
+        """
+        :param config: The "http" config section
+        :param loop: The loop the _async methods are used from, the current event loop if None
+        :param get_executor: Returns the executor the _async methods run requests on, the loop's default if None
+        :type config: dict
+        :type loop: asyncio.AbstractEventLoop
+        """
+        self.loop = loop
+        self.get_executor = get_executor
+
+        self.session = requests.Session()
+        # cookies are only kept for requests which ask for them, like cloudbot.util.http
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.cookie_jar = requests.cookies.RequestsCookieJar()
+
+        self.hosts = {}
+        self._lock = threading.Lock()
+        self._adapter = None
+        self._pool_settings = None
+        self.configure(config or {})
+
+    def configure(self, config):
+        """
+        Applies the "http" config section. The connection pools are only replaced if their sizes change.
+        :type config: dict
+        """
+        self.timeout = config.get("timeout", 10)
+        self.user_agent = config.get("user_agent", default_user_agent)
+        pool_settings = (config.get("max_hosts", 50), config.get("pool_size", 10), config.get("retries", 1))
+        if pool_settings == self._pool_settings:
+            return
+
+        max_hosts, pool_size, retries = pool_settings
+        # pool_block isn't set, so more threads than pool_size can still make requests at once, and the connections
+        # past pool_size are closed afterwards
+        adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        old_adapter, self._adapter = self._adapter, adapter
+        self._pool_settings = pool_settings
+        if old_adapter is not None:
+            old_adapter.close()
+
+    def close(self):
+        """
+        Closes every pooled connection
+        """
+        self.session.close()
+
+    def request(self, method, url, timeout=None, cookies=False, **kwargs):
+        """
+        Makes a request, and records how long it took against the host. Takes the same arguments as requests.request.
+        :param cookies: Whether to send the cookies from, and keep the cookies set by, earlier requests which did too
+        :type method: str
+        :type url: str
+        :type timeout: float
+        :type cookies: bool
+        :rtype: requests.Response
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if cookies:
+            kwargs["cookies"] = self.cookie_jar
+
+        host = urlsplit(url).netloc.lower()
+        start = time()
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            self._record(host, time() - start, True)
+            raise
+
+        # streamed bodies haven't been read yet, and reading them here would defeat the point
+        received = 0 if kwargs.get("stream") else len(response.content)
+        self._record(host, time() - start, response.status_code >= 400, received)
+        if cookies:
+            for earlier in response.history:
+                self.cookie_jar.update(earlier.cookies)
+            self.cookie_jar.update(response.cookies)
+        return response
+
+    def _record(self, host, elapsed, error, received=0):
+        with self._lock:
+            host_stats = self.hosts.get(host)
+            if host_stats is None:
+                host_stats = self.hosts[host] = HostStats()
+            host_stats.record(elapsed, error, received)
+
+    def open(self, url, query_params=None, user_agent=None, post_data=None, referer=None, get_method=None,
+             cookies=False, timeout=None, headers=None, **kwargs):
+        """
+        Makes a request with the arguments cloudbot.util.http.open takes, and returns the response if it succeeded
+        :rtype: requests.Response
+        """
+        if query_params is None:
+            query_params = {}
+        query_params.update(kwargs)
+
+        request_headers = {"User-Agent": user_agent or self.user_agent}
+        if referer is not None:
+            request_headers["Referer"] = referer
+        if headers is not None:
+            request_headers.update(headers)
+
+        if get_method is None:
+            get_method = "GET" if post_data is None else "POST"
+
+        response = self.request(get_method, url, params=query_params, data=post_data, headers=request_headers,
+                                timeout=timeout, cookies=cookies)
+        response.raise_for_status()
+        return response
+
+    def get(self, *args, decode=True, **kwargs):
+        response = self.open(*args, **kwargs)
+        if not decode:
+            return response.content
+        # like cloudbot.util.http, assume UTF-8 unless the server says otherwise
+        if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+            return response.content.decode(response.encoding)
+        return response.content.decode("utf-8")
+
+    def get_url(self, *args, **kwargs):
+        return self.open(*args, **kwargs).url
+
+    def get_json(self, *args, **kwargs):
+        return json.loads(self.get(*args, **kwargs))
+
+    def get_soup(self, *args, **kwargs):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(self.get(*args, **kwargs), 'lxml')
+
+    def get_html(self, *args, **kwargs):
+        from lxml import html
+        return html.fromstring(self.get(*args, **kwargs))
+
+    def get_xml(self, *args, **kwargs):
+        from cloudbot.util.http import parser
+        from lxml import etree
+        kwargs["decode"] = False  # we don't want to decode, for etree
+        return etree.fromstring(self.get(*args, **kwargs), parser=parser)
+
+    def run_async(self, function, *args, **kwargs):
+        """
+        Runs one of the blocking methods on the client's executor, and returns a future for its result
+        :rtype: asyncio.Future
+        """
+        loop = self.loop or asyncio.get_event_loop()
+        executor = self.get_executor() if self.get_executor is not None else None
+        return loop.run_in_executor(executor, partial(function, *args, **kwargs))
+
+    def request_async(self, *args, **kwargs):
+        return self.run_async(self.request, *args, **kwargs)
+
+    def get_async(self, *args, **kwargs):
+        return self.run_async(self.get, *args, **kwargs)
+
+    def get_json_async(self, *args, **kwargs):
+        return self.run_async(self.get_json, *args, **kwargs)
+
+    def get_soup_async(self, *args, **kwargs):
+        return self.run_async(self.get_soup, *args, **kwargs)
+
+    def pool_stats(self):
+        """
+        Returns the number of connections opened to each host, and how many are open and idle now, or None if they
+        can't be counted. urllib3 doesn't expose these, so they're read from its pools' internals, which may change
+        between versions.
+        :rtype: dict[str, dict[str, int]] | None
+        """
+        pools = {}
+        if self._adapter is None:
+            return pools
+        try:
+            manager = self._adapter.poolmanager
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                host = pool.host if pool.port in (None, 80, 443) else "{}:{}".format(pool.host, pool.port)
+                # the pool's queue is filled with None for each connection it hasn't opened yet
+                idle = sum(1 for connection in list(pool.pool.queue) if connection is not None) if pool.pool else 0
+                pools[host.lower()] = {"connections": pool.num_connections, "idle": idle}
+        except AttributeError:
+            return None
+        return pools
+
+    def stats(self):
+        """
+        Returns the request and connection counts, and latencies, for each host. The connection counts are None if
+        they're unavailable, see pool_stats()
+        :rtype: dict[str, dict[str, int | float | None]]
+        """
+        with self._lock:
+            stats = {host: host_stats.stats() for host, host_stats in self.hosts.items()}
+        pools = self.pool_stats()
+        if pools is None:
+            for host_stats in stats.values():
+                host_stats.update(connections=None, idle=None)
+            return stats
+        for host, pool in pools.items():
+            # the default ports aren't in the recorded hosts either
+            stats.setdefault(host, HostStats().stats()).update(pool)
+        return stats
+
+
+def get_client():
+    """
+    Returns the bot's client, creating a default one if the bot hasn't
+    :rtype: HttpClient
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                client = HttpClient()
+    return client
+
+
+def request(*args, **kwargs):
+    return get_client().request(*args, **kwargs)
+
+
+def open(*args, **kwargs):
+    return get_client().open(*args, **kwargs)
+
+
+def get(*args, **kwargs):
+    return get_client().get(*args, **kwargs)
+
+
+def get_url(*args, **kwargs):
+    return get_client().get_url(*args, **kwargs)
+
+
+def get_json(*args, **kwargs):
+    return get_client().get_json(*args, **kwargs)
+
+
+def get_soup(*args, **kwargs):
+    return get_client().get_soup(*args, **kwargs)
+
+
+def get_html(*args, **kwargs):
+    return get_client().get_html(*args, **kwargs)
+
+
+def get_xml(*args, **kwargs):
+    return get_client().get_xml(*args, **kwargs)
+
+
+def request_async(*args, **kwargs):
+    return get_client().request_async(*args, **kwargs)
+
+
+def get_async(*args, **kwargs):
+    return get_client().get_async(*args, **kwargs)
+
+
+def get_json_async(*args, **kwargs):
+    return get_client().get_json_async(*args, **kwargs)
+
+
+def get_soup_async(*args, **kwargs):
+    return get_client().get_soup_async(*args, **kwargs)
@@ -0,0 +1,113 @@
+"""
+inbound.py
+
+Bounds the work a connection's incoming lines can queue up, so a burst of lines (a netsplit rejoin storm, a bouncer
+replaying its buffer, ...) can't start thousands of hooks at once.
+
+Lines are queued and processed a few at a time. Lines about the bot itself which core hooks need (004, the bot's own
+JOINs, NICKs and KICKs, ...) go in a priority lane, which is processed first and has its own limit, so the bot's
+own state stays correct. Once the queue is half full the remaining lines are processed in shedding mode, where
+only core hooks and commands are run, and once it's full any further low priority lines are dropped.
+"""
+
+from collections import deque
+
+
+class InboundQueue:
+    """
+    :type queue_size: int
+    :type priority_size: int
+    :type shed_threshold: int
+    :type priority: deque
+    :type normal: deque
+    """
+
+    def __init__(self, queue_size=1000, shed_threshold=None, priority_size=1000):
+        """
+        :param queue_size: The number of low priority lines which can be waiting, after which they're dropped
+        :param shed_threshold: The number of waiting lines after which low priority hooks are skipped, defaults to
+                               half of queue_size
+        :param priority_size: The number of essential lines which can be waiting, after which they're dropped too
+        :type queue_size: int
+        :type shed_threshold: int
+        :type priority_size: int
+        """
+        self.queue_size = queue_size
+        self.priority_size = priority_size
+        if shed_threshold is None:
+            shed_threshold = queue_size // 2
+        self.shed_threshold = shed_threshold
+        self.priority = deque()
+        self.normal = deque()
+
+        self.received = 0
+        self.processed = 0
+        # lines dropped because the queue was full
+        self.dropped = 0
+        # lines processed while shedding, and the hooks skipped because of it
+        self.shed_lines = 0
+        self.shed_hooks = 0
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.priority) + len(self.normal)
+
+    def put(self, item, essential=False):
+        """
+        Adds a line to the end of its lane, returning False if it was dropped instead
+        :param essential: Whether core hooks need this line to keep track of the bot's state, in which case it goes
+                          in the priority lane
+        :type essential: bool
+        :rtype: bool
+        """
+        self.received += 1
+        lane, size = (self.priority, self.priority_size) if essential else (self.normal, self.queue_size)
+        if len(lane) >= size:
+            self.dropped += 1
+            return False
+        lane.append(item)
+
+        depth = len(self.priority) + len(self.normal)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def pop(self):
+        """
+        Removes and returns the next line to process, and whether the queue is backed up enough to shed low priority
+        hooks for it, or (None, False) if the queue is empty
+        :rtype: (object, bool)
+        """
+        shedding = len(self.priority) + len(self.normal) >= self.shed_threshold
+        if self.priority:
+            item = self.priority.popleft()
+        elif self.normal:
+            item = self.normal.popleft()
+        else:
+            return None, False
+
+        self.processed += 1
+        if shedding:
+            self.shed_lines += 1
+        return item, shedding
+
+    def clear(self):
+        """
+        Discards all queued lines
+        """
+        self.priority.clear()
+        self.normal.clear()
+
+    def stats(self):
+        """
+        :rtype: dict[str, int]
+        """
+        return {
+            "depth": len(self),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "shed_lines": self.shed_lines,
+            "shed_hooks": self.shed_hooks,
+        }
@@ -0,0 +1,205 @@
+"""
+ircparse.py
+
+Parses IRC lines received from a server in a single pass, using str.find and str.partition rather than regexes.
+
+Lines may start with IRCv3 message tags (@key=value;key2 ...). Tags are kept as a raw string until they're first
+looked at, since almost nothing uses them.
+"""
+
+from collections.abc import Mapping
+
+# control characters, which are removed from message content
+irc_bad_chars = ''.join([chr(x) for x in list(range(0, 32)) + list(range(127, 160))])
+_clean_table = str.maketrans("", "", irc_bad_chars)
+
+# escape sequences in tag values, see http://ircv3.net/specs/core/message-tags-3.2.html
+_tag_escapes = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def irc_clean(dirty):
+    """
+    Removes control characters (formatting, CTCP delimiters, etc.) from a string
+    :type dirty: str
+    :rtype: str
+    """
+    if dirty.isprintable():
+        # nothing to remove, which is almost always the case
+        return dirty
+    return dirty.translate(_clean_table)
+
+
+def unescape_tag_value(value):
+    """
+    :type value: str
+    :rtype: str
+    """
+    if "\\" not in value:
+        return value
+    result = []
+    position = 0
+    while True:
+        backslash = value.find("\\", position)
+        if backslash == -1:
+            result.append(value[position:])
+            break
+        result.append(value[position:backslash])
+        escaped = value[backslash + 1:backslash + 2]
+        # unknown escapes are just the character, and a trailing backslash is dropped
+        result.append(_tag_escapes.get(escaped, escaped))
+        position = backslash + 2
+    return "".join(result)
+
+
+class MessageTags(Mapping):
+    """
+    The IRCv3 tags of a line, parsed the first time they're read. Tags without a value map to an empty string.
+    :type raw: str
+    """
+
+    __slots__ = ("raw", "_tags")
+
+    def __init__(self, raw):
+        """
+        :param raw: The tags, without the leading @
+        :type raw: str
+        """
+        self.raw = raw
+        self._tags = None
+
+    def _parse(self):
+        """
+        :rtype: dict[str, str]
+        """
+        tags = {}
+        for tag in self.raw.split(";"):
+            if not tag:
+                continue
+            key, _, value = tag.partition("=")
+            tags[key] = unescape_tag_value(value)
+        self._tags = tags
+        return tags
+
+    def __getitem__(self, key):
+        tags = self._tags
+        if tags is None:
+            tags = self._parse()
+        return tags[key]
+
+    def __iter__(self):
+        tags = self._tags
+        if tags is None:
+            tags = self._parse()
+        return iter(tags)
+
+    def __len__(self):
+        tags = self._tags
+        if tags is None:
+            tags = self._parse()
+        return len(tags)
+
+    def __repr__(self):
+        return "MessageTags({!r})".format(self.raw)
+
+
+class ParsedLine:
+    """
+    A line received from the server.
+
+    `params` are in the form CloudBot has always passed them to hooks: the trailing parameter keeps its leading ':',
+    so hooks can tell it apart from the others.
+
+    :type raw: str
+    :type tags: MessageTags | None
+    :type prefix: str | None
+    :type nick: str | None
+    :type user: str | None
+    :type host: str | None
+    :type command: str
+    :type params: list[str]
+    """
+
+    __slots__ = ("raw", "tags", "prefix", "nick", "user", "host", "command", "params")
+
+    def __init__(self, raw, tags, prefix, nick, user, host, command, params):
+        self.raw = raw
+        self.tags = tags
+        self.prefix = prefix
+        self.nick = nick
+        self.user = user
+        self.host = host
+        self.command = command
+        self.params = params
+
+    @property
+    def trailing(self):
+        """
+        The content of the trailing parameter, without its ':', or None if the line doesn't have one
+        :rtype: str | None
+        """
+        if self.params and self.params[-1].startswith(":"):
+            return self.params[-1][1:]
+        return None
+
+    def __repr__(self):
+        return "ParsedLine({!r})".format(self.raw)
+
+
+def parse_params(text):
+    """
+    Splits the parameters of a line on spaces, keeping everything after a parameter starting with ':' together.
+    :type text: str
+    :rtype: list[str]
+    """
+    if text[:1] == ":":
+        return [text]
+
+    trailing_start = text.find(" :")
+    if trailing_start == -1:
+        params = text.split(" ")
+    else:
+        params = text[:trailing_start].split(" ")
+        params.append(text[trailing_start + 1:])
+
+    if "" in params:
+        # repeated spaces, which don't separate anything
+        params = [param for param in params if param]
+    return params
+
+
+def parse_line(line):
+    """
+    Parses a line from the server, returning None if it isn't a valid IRC line.
+    :type line: str
+    :rtype: ParsedLine | None
+    """
+    if line[:1] == "@":
+        raw_tags, _, rest = line.partition(" ")
+        tags = MessageTags(raw_tags[1:])
+    else:
+        tags = None
+        rest = line
+
+    if rest[:1] == ":":
+        prefix, _, rest = rest.partition(" ")
+        prefix = prefix[1:]
+
+        nick, bang, user_host = prefix.partition("!")
+        if bang and "@" not in nick and "@" in user_host:
+            user, _, host = user_host.partition("@")
+        else:
+            # a server, or just a nick
+            nick = prefix
+            user = None
+            host = None
+    else:
+        prefix = None
+        nick = None
+        user = None
+        host = None
+
+    command, _, params = rest.partition(" ")
+    if not command:
+        return None
+
+    return ParsedLine(line, tags, prefix, nick, user, host, command, parse_params(params))
@@ -0,0 +1,71 @@
+"""
+keyedlock.py
+
+One lock per key, for running a hook one event at a time per channel, connection, etc. rather than one event at a time
+overall. Locks only exist while they're held, so keys which have gone quiet don't use any memory.
+"""
+
+import asyncio
+from collections import deque
+
+
+class KeyedLocks:
+    """
+    :type waiting: dict[object, deque[asyncio.Future]]
+    """
+
+    def __init__(self):
+        # keys which are held, and the futures of everything waiting for them
+        self.waiting = {}
+        # the number of times something had to wait for a key, and the longest queue for a key so far
+        self.waits = 0
+        self.max_waiting = 0
+        self.max_waiting_key = None
+
+    def __contains__(self, key):
+        return key in self.waiting
+
+    def acquire(self, key, loop=None):
+        """
+        Takes the lock for the given key if it's free, and returns None. If it's held, returns a future which is set
+        once the lock has been passed on to the caller, who must release it afterwards.
+        :type loop: asyncio.AbstractEventLoop
+        :rtype: asyncio.Future | None
+        """
+        waiting = self.waiting.get(key)
+        if waiting is None:
+            self.waiting[key] = deque()
+            return None
+
+        future = asyncio.Future(loop=loop)
+        waiting.append(future)
+        self.waits += 1
+        if len(waiting) > self.max_waiting:
+            self.max_waiting = len(waiting)
+            self.max_waiting_key = key
+        return future
+
+    def release(self, key):
+        """
+        Passes the lock for the given key on to the next waiter, or frees it if nothing is waiting
+        """
+        waiting = self.waiting[key]
+        while waiting:
+            future = waiting.popleft()
+            # waiters which were cancelled have given up on the lock
+            if not future.done():
+                future.set_result(None)
+                return
+        del self.waiting[key]
+
+    def queue_lengths(self):
+        """
+        Returns how many waiters are queued for each held key
+        :rtype: dict[object, int]
+        """
+        return {key: len(waiting) for key, waiting in self.waiting.items()}
+
+    def reset_stats(self):
+        self.waits = 0
+        self.max_waiting = 0
+        self.max_waiting_key = None
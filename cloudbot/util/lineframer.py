@@ -0,0 +1,86 @@
+"""
+lineframer.py
+
+Splits the stream of bytes received from a server into lines.
+
+Data is appended to a single bytearray, each byte is searched once for a line ending, and the consumed lines are
+removed from the front of the buffer once per read, so a large burst costs time proportional to its size. Lines may
+end in \r\n or a bare \n. Lines longer than the maximum length are dropped rather than buffered without limit.
+"""
+
+# 8191 bytes of IRCv3 message tags, plus the 512 bytes of a regular line
+default_max_line_length = 8703
+
+
+class LineFramer:
+    """
+    :type max_line_length: int
+    :type dropped: int
+    """
+
+    def __init__(self, max_line_length=default_max_line_length):
+        """
+        :param max_line_length: The longest line to accept, not counting the line ending
+        :type max_line_length: int
+        """
+        self.max_line_length = max_line_length
+        # the number of lines which were too long, and have been dropped
+        self.dropped = 0
+
+        self._buffer = bytearray()
+        # set while we're skipping the rest of a line which was too long
+        self._discarding = False
+
+    def __len__(self):
+        """
+        Returns the number of bytes waiting for a line ending
+        :rtype: int
+        """
+        return len(self._buffer)
+
+    def feed(self, data):
+        """
+        Adds received data to the buffer, and returns every complete line, without line endings. Empty lines are
+        skipped.
+        :type data: bytes
+        :rtype: list[bytes]
+        """
+        buffer = self._buffer
+        # everything already in the buffer has been searched, and there's no line ending in it
+        position = len(buffer)
+        buffer += data
+
+        lines = []
+        start = 0
+        max_line_length = self.max_line_length
+        with memoryview(buffer) as view:
+            while True:
+                end = buffer.find(b"\n", position)
+                if end == -1:
+                    break
+
+                line_end = end
+                if line_end > start and buffer[line_end - 1] == 13:  # \r
+                    line_end -= 1
+
+                if self._discarding:
+                    # this is the end of a line we've already dropped
+                    self._discarding = False
+                elif line_end - start > max_line_length:
+                    self.dropped += 1
+                elif line_end > start:
+                    lines.append(bytes(view[start:line_end]))
+
+                start = position = end + 1
+
+        if start:
+            del buffer[:start]
+
+        if len(buffer) > max_line_length:
+            # no point keeping the start of a line we're going to drop, skip everything up to its line ending
+            if not self._discarding:
+                self.dropped += 1
+                self._discarding = True
+            buffer.clear()
+
+        return lines
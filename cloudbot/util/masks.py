@@ -0,0 +1,140 @@
+"""
+masks.py
+
+Matches IRC masks (nick!user@host) against a collection of fnmatch-style patterns, without calling fnmatch for every
+pattern.
+
+Patterns without wildcards are kept in a set of exact masks, patterns in the form `nick!*@*` (the most common kind)
+are kept in a set of nicks, and all other patterns are combined into a single compiled regex. Matching has the same
+results as calling fnmatch.fnmatchcase with each pattern.
+"""
+
+import fnmatch
+import re
+
+_wildcard_chars = frozenset("*?[")
+
+
+def _has_wildcards(text):
+    """
+    :type text: str
+    :rtype: bool
+    """
+    return not _wildcard_chars.isdisjoint(text)
+
+
+def _translate(pattern):
+    """
+    Translates a pattern to a regex which can be combined with others, using the same rules as fnmatch.
+    :type pattern: str
+    :rtype: str
+    """
+    regex = fnmatch.translate(pattern)
+    # older versions of python add the flags to the end of the pattern, we compile with them instead
+    if regex.endswith("(?ms)"):
+        regex = regex[:-5]
+    return "(?:{})".format(regex)
+
+
+class MaskMatcher:
+    """
+    :type exact: set[str]
+    :type nicks: set[str]
+    :type wildcards: set[str]
+    """
+
+    def __init__(self, patterns=()):
+        """
+        :type patterns: collections.Iterable[str]
+        """
+        self.exact = set()
+        self.nicks = set()
+        self.wildcards = set()
+        self._regex = None
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern):
+        """
+        :type pattern: str
+        """
+        if not _has_wildcards(pattern):
+            self.exact.add(pattern)
+            return
+
+        nick, sep, rest = pattern.partition("!")
+        if sep and rest == "*@*" and not _has_wildcards(nick):
+            self.nicks.add(nick)
+        else:
+            self.wildcards.add(pattern)
+            self._regex = None
+
+    def remove(self, pattern):
+        """
+        Removes a pattern, if it's present.
+        :type pattern: str
+        """
+        if not _has_wildcards(pattern):
+            self.exact.discard(pattern)
+            return
+
+        nick, sep, rest = pattern.partition("!")
+        if sep and rest == "*@*" and not _has_wildcards(nick):
+            self.nicks.discard(nick)
+        elif pattern in self.wildcards:
+            self.wildcards.remove(pattern)
+            self._regex = None
+
+    def __contains__(self, pattern):
+        """
+        Checks whether the given pattern has been added (not whether it matches).
+        :type pattern: str
+        :rtype: bool
+        """
+        if not _has_wildcards(pattern):
+            return pattern in self.exact
+
+        nick, sep, rest = pattern.partition("!")
+        if sep and rest == "*@*" and not _has_wildcards(nick):
+            return nick in self.nicks
+        return pattern in self.wildcards
+
+    def __iter__(self):
+        yield from self.exact
+        for nick in self.nicks:
+            yield "{}!*@*".format(nick)
+        yield from self.wildcards
+
+    def __len__(self):
+        return len(self.exact) + len(self.nicks) + len(self.wildcards)
+
+    def _compile(self):
+        """
+        :rtype: re.__Regex
+        """
+        regex = re.compile("|".join(_translate(pattern) for pattern in self.wildcards), re.DOTALL)
+        self._regex = regex
+        return regex
+
+    def match(self, mask):
+        """
+        Returns whether the given mask matches any of the patterns.
+        :type mask: str
+        :rtype: bool
+        """
+        if mask in self.exact:
+            return True
+
+        if self.nicks:
+            nick, sep, rest = mask.partition("!")
+            if sep and nick in self.nicks and "@" in rest:
+                return True
+
+        if self.wildcards:
+            regex = self._regex
+            if regex is None:
+                regex = self._compile()
+            if regex.match(mask):
+                return True
+
+        return False
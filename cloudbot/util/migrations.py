@@ -0,0 +1,175 @@
+"""
+migrations.py
+
+Lightweight schema migrations for plugin tables.
+
+A plugin lists its migrations in a module-level `migrations` list. Each has a version number, and the highest version
+applied for each plugin is recorded in the schema_versions table, so every migration is applied once per database,
+in order, when the plugin is loaded. Migrations run after the plugin's tables are created, and their steps are written
+to be harmless if there's nothing to do, so new and existing databases end up the same.
+
+    migrations = [
+        Migration(1, add_index("tells_unread", "tells", "connection", "target", "is_read"), analyze("tells")),
+        Migration(2, add_column("tells", "channel", "VARCHAR(25)")),
+    ]
+"""
+
+import re
+from abc import ABC, abstractmethod
+
+versions_table = "schema_versions"
+
+_identifier_re = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _check_identifier(name):
+    """
+    Table, column and index names are put straight into statements, so only allow plain identifiers
+    :type name: str
+    :rtype: str
+    """
+    if not _identifier_re.match(name):
+        raise ValueError("Invalid identifier: {!r}".format(name))
+    return name
+
+
+class Migration:
+    """
+    :type version: int
+    :type steps: tuple[str | (MigrationContext) -> None]
+    :type description: str
+    """
+
+    def __init__(self, version, *steps, description=None):
+        """
+        :param version: Versions are applied in order, starting at 1
+        :param steps: SQL statements, or functions which are given a MigrationContext
+        :type version: int
+        :type description: str
+        """
+        self.version = version
+        self.steps = steps
+        self.description = description
+
+    def apply(self, context):
+        """
+        :type context: MigrationContext
+        """
+        for step in self.steps:
+            if callable(step):
+                step(context)
+            else:
+                context.execute(step)
+
+    def __repr__(self):
+        return "Migration({}, {})".format(self.version, self.description or "{} steps".format(len(self.steps)))
+
+
+class MigrationContext(ABC):
+    """
+    What migrations need from the database, implemented for the bot's engine in cloudbot.plugin.
+    """
+
+    @abstractmethod
+    def execute(self, statement, params=None):
+        """
+        Runs a statement, and returns its rows
+        :type statement: str
+        :type params: dict
+        :rtype: collections.Iterable
+        """
+
+    @abstractmethod
+    def columns(self, table):
+        """
+        Returns the names of the given table's columns
+        :type table: str
+        :rtype: list[str]
+        """
+
+
+def add_index(name, table, *columns):
+    """
+    Returns a step which creates an index, if it doesn't already exist
+    :type name: str
+    :type table: str
+    :type columns: str
+    :rtype: str
+    """
+    if not columns:
+        raise ValueError("An index needs at least one column")
+    return "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+        _check_identifier(name), _check_identifier(table), ", ".join(_check_identifier(column) for column in columns))
+
+
+def add_column(table, column, definition):
+    """
+    Returns a step which adds a column to a table, if it doesn't already have it
+    :param definition: The column's type and constraints, e.g. "INTEGER DEFAULT 0"
+    :type table: str
+    :type column: str
+    :type definition: str
+    """
+    _check_identifier(table)
+    _check_identifier(column)
+
+    def step(context):
+        if column not in context.columns(table):
+            context.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, definition))
+
+    return step
+
+
+def analyze(table=None):
+    """
+    Returns a step which updates the query planner's statistics, for all tables or just the given one. Worth doing
+    after adding an index, so the planner knows to use it.
+    :type table: str
+    :rtype: str
+    """
+    if table is None:
+        return "ANALYZE"
+    return "ANALYZE {}".format(_check_identifier(table))
+
+
+def current_version(context, plugin):
+    """
+    Returns the highest migration version applied for the given plugin, or 0 if none have been
+    :type context: MigrationContext
+    :type plugin: str
+    :rtype: int
+    """
+    context.execute("CREATE TABLE IF NOT EXISTS {} (plugin VARCHAR(100) PRIMARY KEY, version INTEGER NOT NULL)".format(
+        versions_table))
+    rows = list(context.execute("SELECT version FROM {} WHERE plugin = :plugin".format(versions_table),
+                                {"plugin": plugin}))
+    if not rows:
+        return 0
+    return rows[0][0]
+
+
+def migrate(context, plugin, migrations):
+    """
+    Applies the given plugin's migrations which haven't been applied yet, and returns their versions. The caller
+    should run this in a transaction, so a failed migration doesn't leave a half-applied schema behind.
+    :type context: MigrationContext
+    :type plugin: str
+    :type migrations: list[Migration]
+    :rtype: list[int]
+    """
+    version = current_version(context, plugin)
+    applied = []
+    for migration in sorted(migrations, key=lambda item: item.version):
+        if migration.version <= version:
+            continue
+        migration.apply(context)
+        applied.append(migration.version)
+
+    if applied:
+        params = {"plugin": plugin, "version": applied[-1]}
+        if version:
+            context.execute("UPDATE {} SET version = :version WHERE plugin = :plugin".format(versions_table), params)
+        else:
+            context.execute("INSERT INTO {} (plugin, version) VALUES (:plugin, :version)".format(versions_table),
+                            params)
+    return applied
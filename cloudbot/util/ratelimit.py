@@ -0,0 +1,292 @@
+"""
+ratelimit.py
+
+Token bucket rate limiting for many keys at once, like one bucket per user.
+
+Buckets are kept in order of when they were last used. A bucket which has been left alone long enough to fill back up
+is the same as a new one, so it can be forgotten, and since the least recently used buckets are at the front, expiring
+them only ever looks at the buckets which are actually due to go.
+
+CommandRateLimits holds the per-user, per-channel and per-network limits for a connection's commands, from the
+"ratelimit" section of its config:
+
+    "ratelimit": {
+        "max_tokens": 17.5,
+        "restore_rate": 2.5,
+        "message_cost": 5,
+        "strict": true,
+        "channel": {"max_tokens": 40, "restore_rate": 5, "message_cost": 5},
+        "network": {"max_tokens": 100, "restore_rate": 10, "message_cost": 5}
+    }
+
+The top level settings limit each user in each channel. The channel and network limits are optional, and take any
+settings they don't give from the top level, except for "strict": emptying a bucket everyone shares would lock the
+whole channel or network out because of one user, so it's off unless they set it themselves.
+"""
+
+import threading
+from collections import OrderedDict
+from time import time
+
+
+class RateLimit:
+    """
+    The settings for a set of token buckets
+    :type max_tokens: float
+    :type restore_rate: float
+    :type cost: float
+    :type strict: bool
+    """
+
+    def __init__(self, max_tokens, restore_rate, cost=1, strict=False):
+        """
+        :param max_tokens: The most tokens a bucket can hold, which it starts with
+        :param restore_rate: The tokens given back to a bucket each second
+        :param cost: The tokens taken for each action
+        :param strict: Whether a bucket is emptied when an action is refused, so it has to wait for a full refill
+        """
+        if max_tokens <= 0 or restore_rate <= 0:
+            raise ValueError("Rate limits need a positive max_tokens and restore_rate")
+        self.max_tokens = float(max_tokens)
+        self.restore_rate = float(restore_rate)
+        self.cost = float(cost)
+        self.strict = strict
+
+    @classmethod
+    def from_config(cls, config, default=None):
+        """
+        Reads a limit from a config section, using the given limit's settings for anything missing
+        :type config: dict
+        :type default: RateLimit
+        :rtype: RateLimit
+        """
+        if default is None:
+            default = cls(17.5, 2.5, 5, True)
+        # older configs call max_tokens "tokens"
+        max_tokens = config.get("max_tokens", config.get("tokens", default.max_tokens))
+        return cls(max_tokens, config.get("restore_rate", default.restore_rate),
+                   config.get("message_cost", default.cost), config.get("strict", default.strict))
+
+    @property
+    def idle_time(self):
+        """
+        The seconds it takes an empty bucket to fill up, after which it can be forgotten
+        :rtype: float
+        """
+        return self.max_tokens / self.restore_rate
+
+    def __eq__(self, other):
+        return isinstance(other, RateLimit) and (self.max_tokens, self.restore_rate, self.cost, self.strict) == (
+            other.max_tokens, other.restore_rate, other.cost, other.strict)
+
+    def __repr__(self):
+        return "RateLimit({}, {}, {}, strict={})".format(self.max_tokens, self.restore_rate, self.cost, self.strict)
+
+
+class RateLimiter:
+    """
+    A token bucket for each key, all with the same limit.
+
+    :type limit: RateLimit
+    :type allowed: int
+    :type refused: int
+    """
+
+    def __init__(self, limit, clock=time):
+        """
+        :type limit: RateLimit
+        :param clock: Returns the current time in seconds
+        """
+        self.limit = limit
+        self.clock = clock
+        # key -> [tokens, last used], least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.allowed = 0
+        self.refused = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def __contains__(self, key):
+        return key in self._buckets
+
+    def _expire(self, now):
+        idle_time = self.limit.idle_time
+        buckets = self._buckets
+        while buckets:
+            key, (_, last_used) = next(iter(buckets.items()))
+            if now - last_used < idle_time:
+                break
+            del buckets[key]
+            self.expired += 1
+
+    def _tokens(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return self.limit.max_tokens
+        tokens, last_used = bucket
+        return min(self.limit.max_tokens, tokens + (now - last_used) * self.limit.restore_rate)
+
+    def _cost(self, cost):
+        return self.limit.cost if cost is None else cost
+
+    def tokens(self, key):
+        """
+        Returns the tokens the given key's bucket has now
+        :rtype: float
+        """
+        with self._lock:
+            return self._tokens(key, self.clock())
+
+    def check(self, key, cost=None):
+        """
+        Returns whether the given key's bucket has enough tokens, without taking any
+        :rtype: bool
+        """
+        with self._lock:
+            return self._tokens(key, self.clock()) >= self._cost(cost)
+
+    def consume(self, key, cost=None):
+        """
+        Takes tokens from the given key's bucket, and returns whether it had enough
+        :param cost: The tokens to take, or None for the limit's cost
+        :rtype: bool
+        """
+        cost = self._cost(cost)
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            tokens = self._tokens(key, now)
+            if tokens >= cost:
+                tokens -= cost
+                self.allowed += 1
+                allowed = True
+            else:
+                if self.limit.strict:
+                    tokens = 0.0
+                self.refused += 1
+                allowed = False
+
+            # move it to the back, it's the most recently used now
+            self._buckets.pop(key, None)
+            self._buckets[key] = [tokens, now]
+            return allowed
+
+    def wait_time(self, key, cost=None):
+        """
+        Returns the seconds until the given key's bucket will have enough tokens
+        :rtype: float
+        """
+        cost = self._cost(cost)
+        with self._lock:
+            missing = cost - self._tokens(key, self.clock())
+        return max(missing / self.limit.restore_rate, 0.0)
+
+    def set_limit(self, limit):
+        """
+        Changes the limit, keeping the buckets
+        :type limit: RateLimit
+        """
+        with self._lock:
+            self.limit = limit
+            for bucket in self._buckets.values():
+                bucket[0] = min(bucket[0], limit.max_tokens)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        """
+        :rtype: dict[str, int]
+        """
+        return {"buckets": len(self._buckets), "allowed": self.allowed, "refused": self.refused,
+                "expired": self.expired}
+
+
+class CommandRateLimits:
+    """
+    The per-user, per-channel and per-network rate limits for one connection's commands.
+
+    :type user: RateLimiter
+    :type channel: RateLimiter | None
+    :type network: RateLimiter | None
+    """
+
+    def __init__(self, config=None, clock=time):
+        """
+        :param config: The connection's "ratelimit" config section
+        :type config: dict
+        """
+        self.clock = clock
+        self.user = None
+        self.channel = None
+        self.network = None
+        self.configure(config or {})
+
+    def configure(self, config):
+        """
+        Reads the limits from the connection's "ratelimit" config section, keeping the buckets of limits which are
+        still there
+        :type config: dict
+        """
+        user_limit = RateLimit.from_config(config)
+        if self.user is None:
+            self.user = RateLimiter(user_limit, self.clock)
+        else:
+            self.user.set_limit(user_limit)
+
+        self.channel = self._configure_level(self.channel, config.get("channel"), user_limit)
+        self.network = self._configure_level(self.network, config.get("network"), user_limit)
+
+    def _configure_level(self, limiter, config, default):
+        if not config:
+            return None
+        # only the per-user limit is strict by default
+        limit = RateLimit.from_config(config, RateLimit(default.max_tokens, default.restore_rate, default.cost))
+        if limiter is None:
+            return RateLimiter(limit, self.clock)
+        limiter.set_limit(limit)
+        return limiter
+
+    def levels(self, chan, nick):
+        """
+        Returns the (name, limiter, key) of each limit which applies to a command from the given nick and channel
+        :type chan: str
+        :type nick: str
+        :rtype: list[(str, RateLimiter, object)]
+        """
+        levels = [("user", self.user, (chan.lower(), nick.lower()))]
+        if self.channel is not None:
+            levels.append(("channel", self.channel, chan.lower()))
+        if self.network is not None:
+            levels.append(("network", self.network, None))
+        return levels
+
+    def consume(self, chan, nick):
+        """
+        Takes a command's cost from each limit, if they all have enough. Returns None if the command is allowed, or
+        the name of the first limit that refused it.
+        :type chan: str
+        :type nick: str
+        :rtype: str | None
+        """
+        levels = self.levels(chan, nick)
+        for name, limiter, key in levels:
+            if not limiter.check(key):
+                # count the refusal, and empty the bucket if the limit is strict
+                limiter.consume(key)
+                return name
+        for name, limiter, key in levels:
+            limiter.consume(key)
+        return None
+
+    def stats(self):
+        """
+        :rtype: dict[str, dict[str, int]]
+        """
+        return {name: limiter.stats() for name, limiter in
+                (("user", self.user), ("channel", self.channel), ("network", self.network)) if limiter is not None}
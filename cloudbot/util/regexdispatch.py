@@ -0,0 +1,336 @@
+"""
+regexdispatch.py
+
+Dispatches messages to regex hooks without running every hook's regex against every message.
+
+For each registered regex, a set of literal strings is extracted such that any text the regex matches must contain
+at least one of them (for example "youtu" or "twitter.com"). All literals are combined into one alternation, which is
+searched once per message to find the few hooks whose regex could possibly match. Only those hooks run their full
+regex. Regexes we can't extract a literal from are always run.
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+# the largest set of alternative literals we'll keep for one regex, before giving up on the more specific ones
+MAX_LITERALS = 16
+
+# with IGNORECASE, re matches 'i' and 's' to these, even though they don't lower-case to them. 'İ' is applied before
+# lower-casing, since it lower-cases to two characters ('i' and a combining dot)
+_casefix_table = {0x130: "i", 0x131: "i", 0x17f: "s"}
+
+
+def _is_usable(char):
+    """
+    Returns whether a character can be part of an extracted literal. Literals are matched against the lower-cased
+    message, so we only use ASCII, which always lower-cases to a single character.
+    :type char: str
+    :rtype: bool
+    """
+    return ord(char) < 128
+
+
+def _fold(content):
+    """
+    Lower-cases a message for matching against extracted literals.
+    :type content: str
+    :rtype: str
+    """
+    return content.translate(_casefix_table).lower()
+
+
+def _better(a, b):
+    """
+    Returns the more selective of two required literal sets, either of which may be None.
+    :type a: set[str] | None
+    :type b: set[str] | None
+    :rtype: set[str] | None
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    a_key = (min(len(s) for s in a), -len(a))
+    b_key = (min(len(s) for s in b), -len(b))
+    return a if a_key >= b_key else b
+
+
+def _as_required(literals):
+    """
+    :type literals: set[str] | None
+    :rtype: set[str] | None
+    """
+    if not literals or "" in literals or len(literals) > MAX_LITERALS:
+        return None
+    return literals
+
+
+def _concat(a, b):
+    """
+    Returns every combination of a string from `a` followed by a string from `b`, or None if there are too many.
+    :type a: set[str]
+    :type b: set[str]
+    :rtype: set[str] | None
+    """
+    if len(a) * len(b) > MAX_LITERALS:
+        return None
+    return {x + y for x in a for y in b}
+
+
+def _analyze_sequence(items):
+    """
+    Analyzes a parsed sequence of regex items.
+
+    Returns a tuple of (exact, required, prefixes):
+    - `exact` is the set of all strings the sequence can match, or None if that isn't a small, known set.
+    - `required` is a set of strings, one of which must be in any text the sequence matches, or None if we couldn't
+      find one.
+    - `prefixes` is a set of strings, one of which any text the sequence matches must start with, or None.
+    :rtype: (set[str] | None, set[str] | None, set[str] | None)
+    """
+    run = {""}
+    required = None
+    prefixes = None
+    broken = False
+
+    for op, av in items:
+        exact, item_required, item_prefixes = _analyze_item(op, av)
+        if exact is not None:
+            combined = _concat(run, exact)
+            if combined is not None:
+                run = combined
+                continue
+            # too many combinations, treat what we have as a literal and start over
+            required = _better(required, _as_required(run))
+            if not broken:
+                prefixes = _as_required(run)
+            run = exact
+            broken = True
+            continue
+
+        # the text matched so far is followed by one of the item's prefixes, so we can extend the run with those
+        extended = _concat(run, item_prefixes) if item_prefixes is not None else None
+        if extended is None:
+            extended = run
+        required = _better(required, _as_required(extended))
+        required = _better(required, item_required)
+        if not broken:
+            prefixes = _as_required(extended)
+        run = {""}
+        broken = True
+
+    required = _better(required, _as_required(run))
+    if broken:
+        return None, required, prefixes
+    return run, required, _as_required(run)
+
+
+def _analyze_item(op, av):
+    """
+    :rtype: (set[str] | None, set[str] | None, set[str] | None)
+    """
+    if op is sre_constants.LITERAL:
+        char = chr(av)
+        if _is_usable(char):
+            return {char.lower()}, None, {char.lower()}
+        return None, None, None
+
+    if op is sre_constants.AT:
+        # anchors don't consume anything
+        return {""}, None, None
+
+    if op is sre_constants.IN:
+        chars = set()
+        for in_op, in_av in av:
+            if in_op is not sre_constants.LITERAL:
+                return None, None, None
+            char = chr(in_av)
+            if not _is_usable(char):
+                return None, None, None
+            chars.add(char.lower())
+        return chars, None, chars
+
+    if op is sre_constants.SUBPATTERN:
+        if len(av) == 4:
+            # (group, add_flags, del_flags, pattern) - don't try to follow scoped flags
+            if av[1] or av[2]:
+                return None, None, None
+            pattern = av[3]
+        else:
+            pattern = av[1]
+        return _analyze_sequence(pattern)
+
+    if op is sre_constants.BRANCH:
+        exact = set()
+        required = set()
+        prefixes = set()
+        for alternative in av[1]:
+            alt_exact, alt_required, alt_prefixes = _analyze_sequence(alternative)
+            if exact is not None:
+                exact = exact | alt_exact if alt_exact is not None else None
+            if required is not None:
+                alt_required = _better(_as_required(alt_exact), alt_required)
+                required = required | alt_required if alt_required is not None else None
+            if prefixes is not None:
+                prefixes = prefixes | alt_prefixes if alt_prefixes is not None else None
+        if exact is not None and len(exact) > MAX_LITERALS:
+            exact = None
+        return exact, _as_required(required), _as_required(prefixes)
+
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        min_count, max_count, pattern = av
+        if min_count == 0:
+            return None, None, None
+        item_exact, item_required, item_prefixes = _analyze_sequence(pattern)
+        if min_count == max_count == 1:
+            return item_exact, item_required, item_prefixes
+        return None, _better(_as_required(item_exact), item_required), item_prefixes
+
+    return None, None, None
+
+
+def required_literals(regex):
+    """
+    Returns a set of lower-case strings, at least one of which is present in the lower-cased version of any string the
+    given regex can find a match in. Returns None if no such set could be found.
+    :type regex: re.__Regex
+    :rtype: set[str] | None
+    """
+    if not isinstance(regex.pattern, str):
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+        exact, required, prefixes = _analyze_sequence(parsed)
+    except Exception:
+        # we should never break a hook just because we can't understand its regex
+        return None
+    return _better(_as_required(exact), required)
+
+
+class RegexDispatcher:
+    """
+    Holds the (regex, hook) pairs for all regex hooks, and finds the ones matching a message.
+
+    :type _entries: list[(re.__Regex, cloudbot.plugin.RegexHook)]
+    :type _literals: dict[(re.__Regex, cloudbot.plugin.RegexHook), set[str] | None]
+    :type _always: list[(re.__Regex, cloudbot.plugin.RegexHook)]
+    :type _by_literal: dict[str, list[(re.__Regex, cloudbot.plugin.RegexHook)]]
+    :type _literal_re: re.__Regex
+    :type _literal_scan_re: re.__Regex
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._literals = {}
+        self._positions = {}
+        self._always = []
+        self._by_literal = {}
+        self._literal_re = None
+        self._literal_scan_re = None
+        self._dirty = False
+
+    def add(self, regex, hook):
+        """
+        :type regex: re.__Regex
+        :type hook: cloudbot.plugin.RegexHook
+        """
+        entry = (regex, hook)
+        self._entries.append(entry)
+        self._literals[entry] = required_literals(regex)
+        self._dirty = True
+
+    def remove(self, regex, hook):
+        """
+        :type regex: re.__Regex
+        :type hook: cloudbot.plugin.RegexHook
+        """
+        entry = (regex, hook)
+        self._entries.remove(entry)
+        if entry not in self._entries:
+            del self._literals[entry]
+        self._dirty = True
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _rebuild(self):
+        self._positions = {}
+        self._always = []
+        by_literal = {}
+        for position, entry in enumerate(self._entries):
+            self._positions.setdefault(entry, position)
+            literals = self._literals[entry]
+            if literals is None:
+                self._always.append(entry)
+                continue
+            for literal in literals:
+                by_literal.setdefault(literal, []).append(entry)
+
+        # a message containing a literal also contains every literal which is a prefix of it. the alternation only
+        # reports the longest literal at each position, so it needs to know about the shorter ones too.
+        self._by_literal = {}
+        for literal in by_literal:
+            entries = []
+            for other, other_entries in by_literal.items():
+                if literal.startswith(other):
+                    entries.extend(other_entries)
+            self._by_literal[literal] = entries
+
+        if by_literal:
+            # longest first, so each position reports the longest literal starting there
+            alternation = "|".join(re.escape(literal) for literal in sorted(by_literal, key=len, reverse=True))
+            # a plain alternation is the quickest way to reject a message, while the lookahead version finds
+            # overlapping literals once we know there's something to find
+            self._literal_re = re.compile(alternation)
+            self._literal_scan_re = re.compile("(?=({}))".format(alternation))
+        else:
+            self._literal_re = None
+            self._literal_scan_re = None
+
+        self._dirty = False
+
+    def candidates(self, content):
+        """
+        Returns the (regex, hook) pairs which could possibly match the given message, in the order they were added.
+        :type content: str
+        :rtype: list[(re.__Regex, cloudbot.plugin.RegexHook)]
+        """
+        if self._dirty:
+            self._rebuild()
+
+        if self._literal_re is None:
+            return list(self._always)
+
+        lowered = _fold(content)
+        first_match = self._literal_re.search(lowered)
+        if first_match is None:
+            # the common case - nothing in this message looks interesting
+            return list(self._always)
+
+        found = set(self._always)
+        for literal_match in self._literal_scan_re.finditer(lowered, first_match.start()):
+            found.update(self._by_literal[literal_match.group(1)])
+        return sorted(found, key=self._positions.__getitem__)
+
+    def search(self, content, is_command=False):
+        """
+        Runs the regexes which could possibly match the given message, yielding (regex, hook, match) for each one
+        which does, in the order they were added.
+        :param is_command: Whether the message is a command, in which case hooks without run_on_cmd are skipped
+        :type content: str
+        :type is_command: bool
+        """
+        for regex, hook in self.candidates(content):
+            if is_command and not hook.run_on_cmd:
+                continue
+            match = regex.search(content)
+            if match:
+                yield regex, hook, match
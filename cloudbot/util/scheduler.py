@@ -0,0 +1,263 @@
+"""
+scheduler.py
+
+Runs periodic hooks. Each job's runs are scheduled from the time it was first due, rather than from when the last run
+finished, so the time hooks take doesn't push every later run back.
+
+Jobs can be aligned to the wall clock (an hourly job runs on the hour), can have random jitter added to each run so
+jobs with the same interval don't all run at once, and limit how many of their runs can be going at the same time. If
+a job's runs fall behind (the loop was blocked, the machine was suspended, or its last runs are still going), its
+missed-run policy decides what happens:
+
+    skip:     a run that's a whole interval or more late is dropped, and the job waits for its next run
+    coalesce: all the missed runs are made up with a single run, straight away
+    catch_up: every missed run is made up (up to catch_up_limit), one after another
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+from functools import partial
+
+logger = logging.getLogger("cloudbot")
+
+missed_policies = ("skip", "coalesce", "catch_up")
+
+# the most missed runs a catch_up job makes up, the rest are coalesced
+catch_up_limit = 10
+# the longest a timer waits before checking the clock again, so a change to the system clock can't stall a job
+max_sleep = 300
+
+
+class Job:
+    """
+    :type name: str
+    :type interval: float
+    :type initial_interval: float | None
+    :type align: bool
+    :type jitter: float
+    :type missed: str
+    :type max_concurrency: int
+    :type scheduled: float
+    :type next_time: float
+    """
+
+    def __init__(self, name, function, interval, *, initial_interval=None, align=False, jitter=0, missed="coalesce",
+                 max_concurrency=1, owner=None):
+        """
+        :param function: Called with no arguments for each run, and returns a coroutine or future
+        :param interval: Seconds between runs
+        :param initial_interval: Seconds before the first run, the interval by default. For aligned jobs, the first run
+                                 is the first aligned time after this, which is straight away by default.
+        :param align: Whether to run at multiples of the interval since the epoch, like on the hour for 3600
+        :param jitter: The most seconds to add to each run at random, less than the interval
+        :param missed: What to do about runs which are missed, one of missed_policies
+        :param max_concurrency: The most runs which can be going at once. Runs which come due while the job is at its
+                                limit wait for one to finish.
+        :param owner: Whatever the job belongs to, so all of its jobs can be cancelled together
+        """
+        if interval <= 0:
+            raise ValueError("Invalid interval for {}: {!r}".format(name, interval))
+        if not 0 <= jitter < interval:
+            raise ValueError("Invalid jitter for {}: {!r}, it must be less than the interval".format(name, jitter))
+        if missed not in missed_policies:
+            raise ValueError("Invalid missed-run policy for {}: {!r}".format(name, missed))
+        if max_concurrency < 1:
+            raise ValueError("Invalid max_concurrency for {}: {!r}".format(name, max_concurrency))
+
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.initial_interval = initial_interval
+        self.align = align
+        self.jitter = jitter
+        self.missed = missed
+        self.max_concurrency = max_concurrency
+        self.owner = owner
+
+        # when the next run is due, and when it will actually start with jitter added
+        self.scheduled = None
+        self.next_time = None
+        self.running = 0
+        self.cancelled = False
+
+        self.runs = 0
+        self.skipped = 0
+        self.coalesced = 0
+        # the number of times a run came due while the job was at its concurrency limit
+        self.deferred = 0
+        self.last_run = None
+        self.last_duration = None
+
+        self._timer = None
+        # whether a run came due while the job was at its limit
+        self.waiting = False
+
+    def first_time(self, now):
+        """
+        :type now: float
+        :rtype: float
+        """
+        if self.align:
+            start = now + (self.initial_interval or 0)
+            return math.ceil(start / self.interval) * self.interval
+        if self.initial_interval is None:
+            return now + self.interval
+        return now + self.initial_interval
+
+    def advance(self, now):
+        """
+        Moves the schedule on from the run which is due, and returns whether to start a run now
+        :type now: float
+        :rtype: bool
+        """
+        # how many of the runs after the one which is due have also been missed
+        missed = int((now - self.scheduled) // self.interval)
+        if self.missed == "catch_up" and missed < catch_up_limit:
+            self.scheduled += self.interval
+            return True
+
+        self.scheduled += (missed + 1) * self.interval
+        if self.missed == "skip" and missed:
+            self.skipped += missed + 1
+            return False
+        self.coalesced += missed
+        return True
+
+    def stats(self):
+        """
+        :rtype: dict[str, object]
+        """
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "next_time": self.next_time,
+            "running": self.running,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "deferred": self.deferred,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+        }
+
+    def __repr__(self):
+        return "Job({}, interval: {}, next: {})".format(self.name, self.interval, self.next_time)
+
+
+class PeriodicScheduler:
+    """
+    Runs jobs on an event loop, with one timer for each job.
+
+    :type loop: asyncio.AbstractEventLoop
+    :type jobs: list[Job]
+    """
+
+    def __init__(self, loop, clock=time.time, rng=None):
+        """
+        :param clock: Returns the wall clock time, for scheduling
+        :type loop: asyncio.AbstractEventLoop
+        :type rng: random.Random
+        """
+        self.loop = loop
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.jobs = []
+
+    def add(self, job):
+        """
+        :type job: Job
+        :rtype: Job
+        """
+        job.scheduled = job.first_time(self.clock())
+        self.jobs.append(job)
+        self._arm(job)
+        return job
+
+    def cancel(self, job):
+        """
+        Stops a job from running again. Runs which have already started are left to finish.
+        :type job: Job
+        """
+        job.cancelled = True
+        if job._timer is not None:
+            job._timer.cancel()
+            job._timer = None
+        job.next_time = None
+        if job in self.jobs:
+            self.jobs.remove(job)
+
+    def cancel_owner(self, owner):
+        """
+        Cancels all of the jobs with the given owner, and returns how many there were
+        :rtype: int
+        """
+        jobs = [job for job in self.jobs if job.owner is owner]
+        for job in jobs:
+            self.cancel(job)
+        return len(jobs)
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            self.cancel(job)
+
+    def upcoming(self):
+        """
+        Returns the jobs, soonest first
+        :rtype: list[Job]
+        """
+        return sorted(self.jobs, key=lambda job: job.next_time)
+
+    def _arm(self, job):
+        job.next_time = job.scheduled
+        if job.jitter:
+            job.next_time += self.rng.uniform(0, job.jitter)
+        self._set_timer(job)
+
+    def _set_timer(self, job):
+        delay = min(max(job.next_time - self.clock(), 0), max_sleep)
+        job._timer = self.loop.call_at(self.loop.time() + delay, self._fire, job)
+
+    def _fire(self, job):
+        job._timer = None
+        if job.cancelled:
+            return
+
+        now = self.clock()
+        if now < job.next_time:
+            # the timer was capped, or the clock has gone back
+            self._set_timer(job)
+            return
+
+        if job.running >= job.max_concurrency:
+            # this is run again when one of its runs finishes
+            job.deferred += 1
+            job.waiting = True
+            return
+
+        if job.advance(now):
+            self._start(job, now)
+        self._arm(job)
+
+    def _start(self, job, now):
+        job.running += 1
+        job.runs += 1
+        job.last_run = now
+        task = job.function()
+        if not isinstance(task, asyncio.Future):
+            task = self.loop.create_task(task)
+        task.add_done_callback(partial(self._finished, job, now))
+
+    def _finished(self, job, started, task):
+        job.running -= 1
+        job.last_duration = self.clock() - started
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            logger.error("Error in periodic job {}".format(job.name),
+                         exc_info=(type(error), error, error.__traceback__))
+
+        if job.waiting and not job.cancelled:
+            job.waiting = False
+            self._fire(job)
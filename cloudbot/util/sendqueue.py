@@ -0,0 +1,165 @@
+"""
+sendqueue.py
+
+Orders and rate limits the lines a connection sends, so long replies don't get the bot kicked for flooding.
+
+Lines are released according to a token bucket, one token per line. Lines needed to stay connected (PONG, NICK, QUIT
+and the registration commands) go in a priority lane, which is sent first and isn't held back by the bucket. All
+other lines are queued per target and released round-robin, so one channel's long output can't hold up another's.
+"""
+
+from collections import OrderedDict, deque
+from time import time
+
+from cloudbot.util.tokenbucket import TokenBucket
+
+# commands which are sent ahead of everything else. PASS and USER are here so they aren't reordered around NICK
+priority_commands = frozenset(["PONG", "NICK", "QUIT", "PASS", "USER"])
+
+# the longest line we can send, not counting the \r\n
+max_line_length = 510
+
+
+def encode_line(line):
+    """
+    Encodes an outgoing IRC line, including the line ending. Lines longer than the IRC limit are cut down to it,
+    without splitting a multibyte character.
+    :type line: str
+    :rtype: bytes
+    """
+    data = line.encode("utf-8", "replace")
+    if len(data) > max_line_length:
+        end = max_line_length
+        # step back over continuation bytes (0b10xxxxxx) to the start of the character we'd otherwise cut in half
+        while end > 0 and data[end] & 0xC0 == 0x80:
+            end -= 1
+        data = data[:end]
+    return data + b"\r\n"
+
+
+def parse_line(line):
+    """
+    Returns the (command, target) of an outgoing IRC line. The target is the first parameter, if there is one.
+    :type line: str
+    :rtype: (str, str | None)
+    """
+    command, _, params = line.partition(" ")
+    if not params or params.startswith(":"):
+        return command.upper(), None
+    target = params.split(" ", 1)[0]
+    return command.upper(), target.lower()
+
+
+class SendQueue:
+    """
+    :type bucket: TokenBucket
+    :type priority: deque[(str, float)]
+    :type targets: OrderedDict[str | None, deque[(str, float)]]
+    """
+
+    def __init__(self, burst=5, rate=2):
+        """
+        :param burst: The number of lines which can be sent at once, after being idle
+        :param rate: The number of lines per second which can be sent after that
+        :type burst: float
+        :type rate: float
+        """
+        self.bucket = TokenBucket(burst, rate)
+        self.priority = deque()
+        self.targets = OrderedDict()
+
+        self._depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __len__(self):
+        return self._depth
+
+    def put(self, line):
+        """
+        Adds a line to the end of its lane
+        :type line: str
+        """
+        command, target = parse_line(line)
+        if command in priority_commands:
+            self.priority.append((line, time()))
+        else:
+            lane = self.targets.get(target)
+            if lane is None:
+                lane = self.targets[target] = deque()
+            lane.append((line, time()))
+
+        self._depth += 1
+        if self._depth > self.max_depth:
+            self.max_depth = self._depth
+
+    def clear(self):
+        """
+        Discards all queued lines
+        """
+        self.priority.clear()
+        self.targets.clear()
+        self._depth = 0
+
+    def _record(self, queued_at, now):
+        latency = now - queued_at
+        self.sent += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def pop_ready(self):
+        """
+        Removes and returns all lines which can be sent right now, in the order they should be sent
+        :rtype: list[str]
+        """
+        now = time()
+        ready = []
+
+        while self.priority:
+            line, queued_at = self.priority.popleft()
+            # these have to go out regardless, but still use up tokens if there are any
+            self.bucket.consume(1)
+            self._record(queued_at, now)
+            ready.append(line)
+
+        while self.targets and self.bucket.consume(1):
+            target, lane = self.targets.popitem(last=False)
+            line, queued_at = lane.popleft()
+            if lane:
+                # back of the line for this target
+                self.targets[target] = lane
+            self._record(queued_at, now)
+            ready.append(line)
+
+        self._depth -= len(ready)
+        return ready
+
+    def delay(self):
+        """
+        Returns the number of seconds until pop_ready() will return something, or None if the queue is empty
+        :rtype: float | None
+        """
+        if self.priority:
+            return 0
+        if not self.targets:
+            return None
+        missing = 1 - self.bucket.tokens
+        if missing <= 0:
+            return 0
+        return missing / self.bucket.fill_rate
+
+    def stats(self):
+        """
+        :rtype: dict[str, float]
+        """
+        return {
+            "depth": self._depth,
+            "max_depth": self.max_depth,
+            "targets": len(self.targets),
+            "sent": self.sent,
+            "average_latency": self.total_latency / self.sent if self.sent else 0.0,
+            "max_latency": self.max_latency,
+        }
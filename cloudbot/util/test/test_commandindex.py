@@ -0,0 +1,72 @@
+from cloudbot.util.commandindex import CommandIndex
+
+
+class MockHook:
+    def __init__(self, name):
+        self.name = name
+
+
+weather = MockHook("weather")
+wolfram = MockHook("wolframalpha")
+help_hook = MockHook("help")
+
+
+def make_index():
+    index = CommandIndex()
+    index["weather"] = weather
+    index["we"] = weather
+    index["wolframalpha"] = wolfram
+    index["wa"] = wolfram
+    index["help"] = help_hook
+    return index
+
+
+def test_mapping():
+    index = make_index()
+    assert len(index) == 5
+    assert "weather" in index
+    assert "weat" not in index
+    assert index["wa"] is wolfram
+    assert set(index) == {"weather", "we", "wolframalpha", "wa", "help"}
+    assert set(index.values()) == {weather, wolfram, help_hook}
+
+
+def test_prefix_matches():
+    index = make_index()
+    assert index.prefix_matches("w") == ["wa", "we", "weather", "wolframalpha"]
+    assert index.prefix_matches("we") == ["we", "weather"]
+    assert index.prefix_matches("x") == []
+    assert index.prefix_matches("") == ["help", "wa", "we", "weather", "wolframalpha"]
+
+
+def test_resolve():
+    index = make_index()
+    # exact matches win, even when they're also a prefix of another command
+    assert index.resolve("we") is weather
+    assert index.resolve("wea") is weather
+    assert index.resolve("wol") is wolfram
+    assert index.resolve("h") is help_hook
+    # ambiguous
+    assert index.resolve("w") is None
+    # unknown
+    assert index.resolve("x") is None
+
+
+def test_delete():
+    index = make_index()
+    del index["wa"]
+    del index["wolframalpha"]
+    assert "wa" not in index
+    assert index.prefix_matches("w") == ["we", "weather"]
+    assert index.prefix_matches("wo") == []
+    assert index.resolve("wo") is None
+
+    index["wolframalpha"] = wolfram
+    assert index.resolve("wo") is wolfram
+
+
+def test_hooks():
+    index = make_index()
+    assert index.hooks() == [help_hook, weather, wolfram]
+    assert index.hooks("w") == [weather, wolfram]
+    assert index.hooks("z") == []
@@ -0,0 +1,58 @@
+from cloudbot.util.commandmatch import CommandMatcher
+
+
+def test_channel_prefix():
+    matcher = CommandMatcher("CloudBot", ".")
+    match = matcher.match(".weather  London ")
+    assert match.group(1) == "weather"
+    assert match.group(2).strip() == "London"
+
+    assert matcher.match(".help").group(1) == "help"
+    assert matcher.match("help") is None
+    assert matcher.match("hello there") is None
+    assert matcher.match("") is None
+    assert matcher.match(". not a command") is None
+
+
+def test_channel_nick():
+    matcher = CommandMatcher("CloudBot", ".")
+    assert matcher.match("cloudbot: weather London").group(1) == "weather"
+    assert matcher.match("CloudBot, help").group(1) == "help"
+    assert matcher.match("CloudBot help") is None
+    assert matcher.match("CloudBotter: help") is None
+
+
+def test_private():
+    matcher = CommandMatcher("CloudBot", ".")
+    assert matcher.match("weather London", private=True).group(1) == "weather"
+    assert matcher.match(".weather London", private=True).group(1) == "weather"
+    assert matcher.match("weather London") is None
+
+
+def test_multiple_prefixes():
+    matcher = CommandMatcher("CloudBot", ".!")
+    assert matcher.match("!help").group(1) == "help"
+    assert matcher.match(".help").group(1) == "help"
+    assert matcher.match("?help") is None
+
+
+def test_special_characters():
+    # nicks and prefixes with regex characters shouldn't break the patterns
+    matcher = CommandMatcher("[Bot]^", "^")
+    assert matcher.match("[bot]^: help").group(1) == "help"
+    assert matcher.match("^help").group(1) == "help"
+    assert matcher.match("b: help") is None
+
+
+def test_update():
+    matcher = CommandMatcher("CloudBot", ".")
+    channel_re = matcher.channel_re
+    assert matcher.update("CloudBot", ".") is False
+    assert matcher.channel_re is channel_re
+
+    assert matcher.update("OtherBot", "!") is True
+    assert matcher.channel_re is not channel_re
+    assert matcher.match("otherbot: help").group(1) == "help"
+    assert matcher.match("cloudbot: help") is None
+    assert matcher.match("!help").group(1) == "help"
+    assert matcher.match(".help") is None
@@ -1,6 +1,87 @@
-from cloudbot.util.database import metadata, base
+import sqlite3
+
+from cloudbot.util.database import metadata, base, WriteBehindQueue
 
 
 def test_database():
     assert metadata is None
     assert base is None
+
+
+def make_queue(tmpdir, **kwargs):
+    path = str(tmpdir.join("test.db"))
+    connection = sqlite3.connect(path)
+    connection.execute("create table seen(name primary key, quote)")
+    connection.execute("create table log(line)")
+    connection.commit()
+    connection.close()
+    # sqlite3 connections have the execute, commit, rollback and close of a session
+    return WriteBehindQueue(lambda: sqlite3.connect(path), **kwargs), path
+
+
+def select(path, query):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+def test_coalesce(tmpdir):
+    queue, path = make_queue(tmpdir)
+    for number in range(5):
+        queue.enqueue("insert or replace into seen values(:name, :quote)", {"name": "nick", "quote": str(number)},
+                      key=("seen", "nick"))
+    queue.enqueue("insert or replace into seen values(:name, :quote)", {"name": "other", "quote": "x"},
+                  key=("seen", "other"))
+    assert len(queue) == 2
+    assert queue.coalesced == 4
+    # nothing is written until the queue is flushed
+    assert select(path, "select * from seen") == []
+
+    assert queue.flush() == 2
+    assert sorted(select(path, "select * from seen")) == [("nick", "4"), ("other", "x")]
+    assert queue.flush() == 0
+    assert queue.stats()["written"] == 2
+
+
+def test_order(tmpdir):
+    queue, path = make_queue(tmpdir)
+    for number in range(10):
+        queue.enqueue("insert into log values(:line)", {"line": number})
+    queue.flush()
+    assert select(path, "select line from log order by rowid") == [(number,) for number in range(10)]
+
+
+def test_bad_statement(tmpdir):
+    queue, path = make_queue(tmpdir)
+    queue.enqueue("insert into log values(1)")
+    queue.enqueue("insert into missing values(1)")
+    queue.enqueue("insert into log values(2)")
+    assert queue.flush() == 3
+    # the rest of the batch is still written
+    assert select(path, "select line from log order by rowid") == [(1,), (2,)]
+    assert queue.failed == 1
+    assert queue.written == 2
+
+
+def test_background(tmpdir):
+    queue, path = make_queue(tmpdir, interval=60, batch_size=5)
+    queue.start()
+    try:
+        queue.enqueue("insert into log values(1)")
+        queue.stop()
+        # stopping flushes what's left
+        assert select(path, "select * from log") == [(1,)]
+
+        queue.start()
+        for number in range(5):
+            queue.enqueue("insert into log values(:line)", {"line": number})
+        # a full batch is flushed without waiting for the interval
+        for _ in range(100):
+            if queue.written == 6:
+                break
+            queue._thread.join(0.05)
+        assert len(select(path, "select * from log")) == 6
+    finally:
+        queue.stop()
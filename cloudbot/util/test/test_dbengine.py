@@ -0,0 +1,88 @@
+import pytest
+
+from cloudbot.util.dbengine import StatementTimer, engine_arguments, is_sqlite, sqlite_pragmas
+
+
+def test_sqlite_pragmas():
+    pragmas = sqlite_pragmas({})
+    assert "PRAGMA journal_mode=wal" in pragmas
+    assert "PRAGMA busy_timeout=5000" in pragmas
+    assert "PRAGMA cache_size=-8000" in pragmas
+
+    pragmas = sqlite_pragmas({"sqlite": {"synchronous": "full", "mmap_size": None, "foreign_keys": True}})
+    assert "PRAGMA synchronous=full" in pragmas
+    assert "PRAGMA foreign_keys=1" in pragmas
+    assert not any("mmap_size" in pragma for pragma in pragmas)
+
+
+def test_invalid_pragmas():
+    with pytest.raises(ValueError):
+        sqlite_pragmas({"sqlite": {"journal_mode; drop table seen_user": "wal"}})
+    with pytest.raises(ValueError):
+        sqlite_pragmas({"sqlite": {"journal_mode": "wal; drop table seen_user"}})
+
+
+def test_engine_arguments():
+    assert is_sqlite("sqlite:///cloudbot.db")
+    # sqlite pools don't take sizes
+    assert engine_arguments("sqlite:///cloudbot.db", {"pool_size": 20}) == {}
+    assert engine_arguments("sqlite:///cloudbot.db", {"pool_class": "StaticPool"}) == {"poolclass_name": "StaticPool"}
+
+    arguments = engine_arguments("postgresql://localhost/cloudbot", {"pool_size": 20})
+    assert arguments["pool_size"] == 20
+    assert arguments["max_overflow"] == 10
+    assert arguments["pool_recycle"] == 3600
+
+    arguments = engine_arguments("postgresql://localhost/cloudbot", {"pool_class": "NullPool"})
+    assert arguments == {"poolclass_name": "NullPool", "pool_recycle": 3600}
+
+    with pytest.raises(ValueError):
+        engine_arguments("postgresql://localhost/cloudbot", {"pool_class": "os.system"})
+
+
+class ExecutionContext:
+    pass
+
+
+def test_statement_timer():
+    timer = StatementTimer(slow_threshold=0.5)
+    timer.record("SELECT * FROM seen_user", 0.01)
+    timer.record("  select name FROM seen_user", 0.03)
+    timer.record("INSERT INTO karma VALUES (?)", 1.0)
+
+    stats = timer.stats()
+    assert stats["SELECT"]["count"] == 2
+    assert stats["SELECT"]["max"] == 0.03
+    assert stats["SELECT"]["average"] == pytest.approx(0.02)
+    assert timer.slow == 1
+    assert timer.slowest.startswith("INSERT")
+
+    # as the engine calls it
+    context = ExecutionContext()
+    timer.before_execute(None, None, "UPDATE karma", {}, context, False)
+    timer.after_execute(None, None, "UPDATE karma", {}, context, False)
+    assert timer.stats()["UPDATE"]["count"] == 1
+
+    timer.reset()
+    assert timer.stats() == {}
+    assert timer.slow == 0
+
+
+def test_statement_timer_errors(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cloudbot.util.dbengine.time", lambda: now[0])
+    timer = StatementTimer()
+    # a statement which raises never gets an after_cursor_execute
+    timer.before_execute(None, None, "SELECT broken", {}, ExecutionContext(), False)
+    now[0] += 10
+    context = ExecutionContext()
+    timer.before_execute(None, None, "SELECT 1", {}, context, False)
+    now[0] += 0.25
+    timer.after_execute(None, None, "SELECT 1", {}, context, False)
+    # timed from its own start, not the failed statement's
+    assert timer.stats()["SELECT"]["max"] == 0.25
+
+    # statements without a context aren't timed
+    timer.before_execute(None, None, "DELETE FROM seen_user", {}, None, False)
+    timer.after_execute(None, None, "DELETE FROM seen_user", {}, None, False)
+    assert "DELETE" not in timer.stats()
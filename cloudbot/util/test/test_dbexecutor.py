@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudbot.util.dbexecutor import DatabaseExecutor, max_idle_sessions
+
+
+class MockSession:
+    # sessions which haven't been garbage collected
+    alive = 0
+
+    def __init__(self):
+        MockSession.alive += 1
+        self.thread = threading.current_thread()
+        self.open = True
+
+    def query(self):
+        # like sqlite, sessions can only be used from the thread which created them
+        assert threading.current_thread() is self.thread
+        return 1
+
+    def close(self):
+        self.open = False
+
+    def __del__(self):
+        MockSession.alive -= 1
+
+
+def run_hook(executor):
+    """
+    Does what Event.prepare(), a coroutine hook using its db, and Event.close() do
+    """
+    worker = executor.assign()
+    try:
+        session = worker.submit(worker.checkout).result()
+        assert worker.submit(session.query).result() == 1
+        worker.submit(worker.checkin, session).result()
+        assert not session.open
+    finally:
+        executor.release(worker)
+
+
+def test_reuse():
+    executor = DatabaseExecutor(MockSession, workers=1)
+    for _ in range(10):
+        run_hook(executor)
+    stats = executor.stats()
+    assert stats["sessions_created"] == 1
+    assert stats["idle"] == 1
+    assert stats["checked_out"] == 0
+    assert stats["assigned"] == 0
+    executor.shutdown()
+
+
+def test_assign():
+    executor = DatabaseExecutor(MockSession, workers=3)
+    workers = [executor.assign() for _ in range(6)]
+    # spread evenly over the workers
+    assert sorted(worker.index for worker in workers) == [0, 0, 1, 1, 2, 2]
+    for worker in workers:
+        executor.release(worker)
+    assert executor.stats()["assigned"] == 0
+    executor.shutdown()
+
+
+def test_soak():
+    """
+    Many concurrent hook calls shouldn't start threads or leave sessions behind
+    """
+    workers = 4
+    concurrency = 16
+    executor = DatabaseExecutor(MockSession, workers=workers)
+    callers = ThreadPoolExecutor(concurrency)
+
+    def run_many(count):
+        for future in [callers.submit(run_hook, executor) for _ in range(count)]:
+            future.result()
+
+    # start every thread
+    run_many(200)
+    threads = threading.active_count()
+
+    for _ in range(10):
+        run_many(500)
+        assert threading.active_count() == threads
+        # at most every worker's idle sessions, plus the ones which were in use at once
+        assert MockSession.alive <= workers * max_idle_sessions + concurrency
+
+    stats = executor.stats()
+    assert stats["checked_out"] == 0
+    assert stats["assigned"] == 0
+    assert stats["idle"] <= workers * max_idle_sessions
+
+    callers.shutdown()
+    executor.shutdown()
@@ -0,0 +1,63 @@
+from cloudbot.util.decoding import Decoder
+
+
+def test_ascii():
+    decoder = Decoder()
+    assert decoder.decode(b"PRIVMSG #chan :hello") == "PRIVMSG #chan :hello"
+    assert decoder.ascii_lines == decoder.lines == 1
+
+
+def test_utf8():
+    decoder = Decoder()
+    assert decoder.decode("café ☃".encode("utf-8")) == "café ☃"
+    # an actual replacement character is still valid UTF-8
+    assert decoder.decode("�".encode("utf-8")) == "�"
+    assert decoder.utf8_lines == 2
+
+
+def test_fallbacks():
+    decoder = Decoder()
+    # cp1252 gets smart quotes right
+    assert decoder.decode("“quoted” café".encode("cp1252")) == "“quoted” café"
+    # 0x81 isn't valid cp1252, so this falls through to iso-8859-1
+    assert decoder.decode(b"\x81abc") == "\x81abc"
+    assert decoder.fallback_lines == {"cp1252": 1, "iso8859-1": 1}
+    assert decoder.undecodable == 0
+
+
+def test_fallback_order():
+    # single-byte codecs decode almost anything, so they go after multibyte ones no matter the order they're given in
+    decoder = Decoder(["utf-8", "cp1252", "shift_jis"])
+    assert decoder.stats()["fallbacks"] == ["shift_jis", "cp1252"]
+    assert decoder.decode("日本語".encode("shift_jis")) == "日本語"
+    assert decoder.decode("café".encode("cp1252")) == "café"
+
+
+def test_learning():
+    decoder = Decoder(["utf-8", "shift_jis", "euc_jp", "cp1252"], window=10)
+    assert decoder.stats()["fallbacks"] == ["shift_jis", "euc_jp", "cp1252"]
+
+    # this is valid (but wrong) shift_jis, until we've seen the network uses euc_jp
+    ambiguous = "テスト".encode("euc_jp")
+    assert decoder.decode(ambiguous) != "テスト"
+
+    for _ in range(3):
+        assert decoder.decode("日本語".encode("euc_jp")) == "日本語"
+    assert decoder.stats()["fallbacks"] == ["euc_jp", "shift_jis", "cp1252"]
+    assert decoder.decode(ambiguous) == "テスト"
+
+    # valid UTF-8 is still decoded as UTF-8
+    assert decoder.decode("日本語".encode("utf-8")) == "日本語"
+
+
+def test_undecodable():
+    decoder = Decoder(["utf-8"])
+    assert decoder.decode(b"abc\xffdef") == "abcdef"
+    assert decoder.undecodable == 1
+
+
+def test_set_encodings():
+    decoder = Decoder(["UTF8", "latin1"])
+    assert decoder.encodings == ["utf-8", "iso8859-1"]
+    decoder.set_encodings([])
+    assert decoder.encodings == ["utf-8", "cp1252", "iso8859-1"]
@@ -0,0 +1,56 @@
+import threading
+
+from cloudbot.util.executors import ExecutorManager, MonitoredExecutor
+
+
+def test_stats():
+    executor = MonitoredExecutor("test", 1)
+    release = threading.Event()
+    first = executor.submit(release.wait, 5)
+    second = executor.submit(lambda a, b=0: a + b, 1, b=2)
+
+    stats = executor.stats()
+    assert stats["completed"] == 0
+    assert stats["queued"] + stats["active"] == 2
+
+    release.set()
+    assert first.result(5) is True
+    assert second.result(5) == 3
+
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
+    assert stats["max_active"] == 1
+    # the second task had to wait for the first
+    assert stats["max_wait"] > 0
+    executor.shutdown()
+
+
+def test_plugin_pools():
+    manager = ExecutorManager({"plugin_workers": 2, "pools": {"web": 3}, "plugins": {"youtube": "web",
+                                                                                     "broken": "missing"}})
+    assert manager.pool_name("youtube") == "web"
+    assert manager.pool_name("tell") == "plugin:tell"
+    # plugins assigned to pools which don't exist get their own
+    assert manager.pool_name("broken") == "plugin:broken"
+
+    assert manager.for_plugin("youtube") is manager.get("web")
+    assert manager.for_plugin("youtube").max_workers == 3
+    assert manager.for_plugin("tell").max_workers == 2
+    assert [pool["name"] for pool in manager.stats()] == ["plugin:tell", "web"]
+    manager.shutdown()
+    assert not manager.pools
+
+
+def test_configure():
+    manager = ExecutorManager({"pools": {"web": 3}})
+    web = manager.get("web")
+    tell = manager.for_plugin("tell")
+
+    manager.configure({"pools": {"web": 5}})
+    # resized pools are replaced, others are kept
+    assert manager.get("web") is not web
+    assert manager.get("web").max_workers == 5
+    assert manager.for_plugin("tell") is tell
+    manager.shutdown()
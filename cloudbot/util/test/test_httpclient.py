@@ -0,0 +1,164 @@
+import asyncio
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from cloudbot.util.httpclient import HttpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keep connections open between requests
+    protocol_version = "HTTP/1.1"
+    # the headers and body are written separately, which Nagle's algorithm would hold up on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.startswith("/json"):
+            body = json.dumps({"path": self.path, "agent": self.headers.get("User-Agent")}).encode()
+            self.reply(200, body, "application/json")
+        elif self.path == "/gzip":
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                self.reply(200, gzip.compress("compressed ✓".encode()), "text/plain", [("Content-Encoding", "gzip")])
+            else:
+                self.reply(200, b"uncompressed", "text/plain")
+        elif self.path == "/cookie":
+            self.reply(200, b"set", "text/plain", [("Set-Cookie", "session=abc; Path=/")])
+        elif self.path == "/echo-cookie":
+            self.reply(200, self.headers.get("Cookie", "none").encode(), "text/plain")
+        else:
+            self.reply(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.reply(200, body, "text/plain")
+
+    def reply(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    # each kept-alive connection has its own thread
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    httpd = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_get_json(server):
+    client = HttpClient({"user_agent": "test-agent"})
+    try:
+        data = client.get_json(server + "/json", query_params={"q": "a b"}, page=2)
+        assert data["path"] == "/json?q=a+b&page=2"
+        assert data["agent"] == "test-agent"
+        assert client.get_json(server + "/json", user_agent="other")["agent"] == "other"
+    finally:
+        client.close()
+
+
+def test_keep_alive(server):
+    client = HttpClient()
+    try:
+        for _ in range(5):
+            client.get(server + "/json")
+        host = server.split("//")[1]
+        stats = client.stats()[host]
+        assert stats["requests"] == 5
+        assert stats["errors"] == 0
+        # every request went over the same connection
+        assert stats["connections"] == 1
+        assert stats["idle"] == 1
+    finally:
+        client.close()
+
+
+def test_pool_stats_unavailable(server):
+    client = HttpClient()
+    try:
+        client.get(server + "/json")
+        # as if urllib3's internals had changed
+        manager, client._adapter.poolmanager = client._adapter.poolmanager, object()
+        assert client.pool_stats() is None
+        stats = client.stats()[server.split("//")[1]]
+        client._adapter.poolmanager = manager
+        assert stats["requests"] == 1
+        assert stats["connections"] is None
+    finally:
+        client.close()
+
+
+def test_compression(server):
+    client = HttpClient()
+    try:
+        assert client.get(server + "/gzip") == "compressed ✓"
+    finally:
+        client.close()
+
+
+def test_errors(server):
+    client = HttpClient()
+    try:
+        with pytest.raises(requests.HTTPError):
+            client.get(server + "/missing")
+        assert client.stats()[server.split("//")[1]]["errors"] == 1
+        assert client.get(server + "/post", post_data=b"posted") == "posted"
+    finally:
+        client.close()
+
+
+def test_cookies(server):
+    client = HttpClient()
+    try:
+        # cookies are only kept when asked for
+        client.get(server + "/cookie")
+        assert client.get(server + "/echo-cookie", cookies=True) == "none"
+        client.get(server + "/cookie", cookies=True)
+        assert client.get(server + "/echo-cookie", cookies=True) == "session=abc"
+        assert client.get(server + "/echo-cookie") == "none"
+    finally:
+        client.close()
+
+
+def test_async(server):
+    loop = asyncio.new_event_loop()
+    client = HttpClient(loop=loop)
+    try:
+        futures = [client.get_json_async(server + "/json", n=number) for number in range(3)]
+        results = loop.run_until_complete(asyncio.gather(*futures))
+        assert [result["path"] for result in results] == ["/json?n=0", "/json?n=1", "/json?n=2"]
+    finally:
+        client.close()
+        loop.close()
+
+
+def test_configure():
+    client = HttpClient({"pool_size": 4})
+    adapter = client._adapter
+    client.configure({"pool_size": 4, "timeout": 3})
+    # the pools are only replaced when their settings change
+    assert client._adapter is adapter
+    assert client.timeout == 3
+    client.configure({"pool_size": 8})
+    assert client._adapter is not adapter
+    client.close()
@@ -0,0 +1,67 @@
+from cloudbot.util.inbound import InboundQueue
+
+
+def test_order():
+    queue = InboundQueue(queue_size=10)
+    queue.put("PRIVMSG 1")
+    queue.put("JOIN", essential=True)
+    queue.put("PRIVMSG 2")
+    assert len(queue) == 3
+    # lines core hooks need are processed first
+    assert queue.pop() == ("JOIN", False)
+    assert queue.pop() == ("PRIVMSG 1", False)
+    assert queue.pop() == ("PRIVMSG 2", False)
+    assert queue.pop() == (None, False)
+    assert queue.processed == 3
+
+
+def test_drop():
+    queue = InboundQueue(queue_size=3)
+    for number in range(5):
+        queue.put(number)
+    assert queue.dropped == 2
+    assert len(queue) == 3
+    # essential lines have their own lane
+    assert queue.put("NICK", essential=True)
+    assert len(queue) == 4
+    assert queue.max_depth == 4
+    assert queue.received == 6
+
+
+def test_drop_priority():
+    queue = InboundQueue(queue_size=3, priority_size=2)
+    for number in range(3):
+        queue.put("JOIN {}".format(number), essential=True)
+    # the priority lane is limited too, and doesn't take space from the other lane
+    assert queue.dropped == 1
+    assert queue.put("PRIVMSG")
+    assert len(queue) == 3
+
+
+def test_shedding():
+    queue = InboundQueue(queue_size=10, shed_threshold=3)
+    for number in range(4):
+        queue.put(number)
+    assert queue.pop() == (0, True)
+    assert queue.pop() == (1, True)
+    # below the threshold again
+    assert queue.pop() == (2, False)
+    assert queue.shed_lines == 2
+
+    stats = queue.stats()
+    assert stats["depth"] == 1
+    assert stats["shed_lines"] == 2
+    assert stats["dropped"] == 0
+
+
+def test_default_threshold():
+    assert InboundQueue(queue_size=100).shed_threshold == 50
+
+
+def test_clear():
+    queue = InboundQueue()
+    queue.put(1)
+    queue.put(2, essential=True)
+    queue.clear()
+    assert len(queue) == 0
+    assert queue.pop() == (None, False)
@@ -0,0 +1,87 @@
+from cloudbot.util.ircparse import irc_clean, parse_line, parse_params, unescape_tag_value
+
+
+def test_privmsg():
+    line = parse_line(":dmnelson!~dmnelson@user/dmnelson PRIVMSG #cloudbot :.weather Seattle")
+    assert line.prefix == "dmnelson!~dmnelson@user/dmnelson"
+    assert line.nick == "dmnelson"
+    assert line.user == "~dmnelson"
+    assert line.host == "user/dmnelson"
+    assert line.command == "PRIVMSG"
+    assert line.params == ["#cloudbot", ":.weather Seattle"]
+    assert line.trailing == ".weather Seattle"
+    assert line.tags is None
+
+
+def test_server_prefix():
+    line = parse_line(":irc.example.net 353 CloudBot = #cloudbot :CloudBot @luke +dmnelson")
+    assert line.prefix == line.nick == "irc.example.net"
+    assert line.user is None
+    assert line.host is None
+    assert line.command == "353"
+    assert line.params == ["CloudBot", "=", "#cloudbot", ":CloudBot @luke +dmnelson"]
+
+
+def test_no_prefix():
+    line = parse_line("PING :irc.example.net")
+    assert line.prefix is None
+    assert line.nick is None
+    assert line.command == "PING"
+    assert line.params == [":irc.example.net"]
+
+    line = parse_line("QUIT")
+    assert line.command == "QUIT"
+    assert line.params == []
+    assert line.trailing is None
+
+
+def test_ipv6_host():
+    line = parse_line(":foxlet!foxlet@2001:db8::1 NICK :foxy")
+    assert line.nick == "foxlet"
+    assert line.host == "2001:db8::1"
+    assert line.params == [":foxy"]
+
+
+def test_params():
+    assert parse_params("#cloudbot +b *!*@bad.example.com") == ["#cloudbot", "+b", "*!*@bad.example.com"]
+    assert parse_params("#cloudbot ::) it works") == ["#cloudbot", "::) it works"]
+    assert parse_params("#cloudbot :a  b: c") == ["#cloudbot", ":a  b: c"]
+    assert parse_params("a  b  :c") == ["a", "b", ":c"]
+    assert parse_params(":") == [":"]
+    assert parse_params("") == []
+
+
+def test_tags():
+    line = parse_line("@account=luke;time=2015-05-08T12:35:01.002Z :luke!luke@staff.example.net PRIVMSG #cloudbot :hi")
+    assert line.nick == "luke"
+    assert line.command == "PRIVMSG"
+    assert line.params == ["#cloudbot", ":hi"]
+    assert line.tags.raw == "account=luke;time=2015-05-08T12:35:01.002Z"
+    assert dict(line.tags) == {"account": "luke", "time": "2015-05-08T12:35:01.002Z"}
+
+    line = parse_line(r"@+example.com/tag=semi\:colon\sspace\\slash;empty=;novalue PING :irc.example.net")
+    assert line.prefix is None
+    assert line.command == "PING"
+    assert line.tags["+example.com/tag"] == "semi;colon space\\slash"
+    assert line.tags["empty"] == ""
+    assert line.tags["novalue"] == ""
+    assert "missing" not in line.tags
+
+
+def test_unescape():
+    assert unescape_tag_value("plain") == "plain"
+    assert unescape_tag_value(r"a\sb\:c\\d\r\n") == "a b;c\\d\r\n"
+    assert unescape_tag_value("unknown\\x") == "unknownx"
+    assert unescape_tag_value("trailing\\") == "trailing"
+
+
+def test_invalid():
+    assert parse_line("") is None
+    assert parse_line(":irc.example.net") is None
+    assert parse_line("@time=now") is None
+    assert parse_line(":irc.example.net  ") is None
+
+
+def test_clean():
+    assert irc_clean("\x0303green\x03 \x02bold\x02 \x01ACTION\x01\x7f\x9f") == "03green bold ACTION"
+    assert irc_clean("café ☃") == "café ☃"
@@ -0,0 +1,61 @@
+import asyncio
+
+from cloudbot.util.keyedlock import KeyedLocks
+
+
+def test_independent_keys():
+    locks = KeyedLocks()
+    assert locks.acquire("#a") is None
+    # other keys don't wait
+    assert locks.acquire("#b") is None
+    assert "#a" in locks
+    locks.release("#a")
+    locks.release("#b")
+    # idle keys are freed
+    assert not locks.waiting
+    assert locks.waits == 0
+
+
+def test_waiting():
+    loop = asyncio.new_event_loop()
+    try:
+        locks = KeyedLocks()
+        assert locks.acquire("#a", loop=loop) is None
+        first = locks.acquire("#a", loop=loop)
+        second = locks.acquire("#a", loop=loop)
+        assert locks.queue_lengths() == {"#a": 2}
+        assert locks.waits == 2
+        assert locks.max_waiting == 2
+        assert locks.max_waiting_key == "#a"
+
+        # waiters get the lock in order
+        locks.release("#a")
+        assert first.done()
+        assert not second.done()
+        locks.release("#a")
+        assert second.done()
+        locks.release("#a")
+        assert "#a" not in locks
+    finally:
+        loop.close()
+
+
+def test_cancelled_waiter():
+    loop = asyncio.new_event_loop()
+    try:
+        locks = KeyedLocks()
+        locks.acquire("#a", loop=loop)
+        cancelled = locks.acquire("#a", loop=loop)
+        waiter = locks.acquire("#a", loop=loop)
+        cancelled.cancel()
+        # the cancelled waiter is skipped
+        locks.release("#a")
+        assert waiter.done() and not waiter.cancelled()
+        locks.release("#a")
+        assert not locks.waiting
+
+        locks.reset_stats()
+        assert locks.waits == 0
+        assert locks.max_waiting_key is None
+    finally:
+        loop.close()
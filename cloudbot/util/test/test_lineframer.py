@@ -0,0 +1,34 @@
+from cloudbot.util.lineframer import LineFramer
+
+
+def test_lines():
+    framer = LineFramer()
+    assert framer.feed(b"PING :a\r\nPING :b\r\n") == [b"PING :a", b"PING :b"]
+    assert len(framer) == 0
+
+
+def test_partial_lines():
+    framer = LineFramer()
+    assert framer.feed(b"PING") == []
+    assert framer.feed(b" :a\r") == []
+    assert framer.feed(b"\nPING :b\r\nPI") == [b"PING :a", b"PING :b"]
+    assert len(framer) == 2
+    assert framer.feed(b"NG :c\r\n") == [b"PING :c"]
+
+
+def test_bare_newlines():
+    framer = LineFramer()
+    assert framer.feed(b"PING :a\nPING :b\r\n\r\n\nPING :c\n") == [b"PING :a", b"PING :b", b"PING :c"]
+
+
+def test_long_lines():
+    framer = LineFramer(max_line_length=10)
+    assert framer.feed(b"0123456789\r\n01234567890\r\nshort\r\n") == [b"0123456789", b"short"]
+    assert framer.dropped == 1
+
+    # a long line split over several reads is only counted once, and doesn't stay in the buffer
+    assert framer.feed(b"0123456789012345") == []
+    assert len(framer) == 0
+    assert framer.feed(b"0123456789012345") == []
+    assert framer.feed(b"6789\r\nshort\r\n") == [b"short"]
+    assert framer.dropped == 2
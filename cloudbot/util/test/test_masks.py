@@ -0,0 +1,68 @@
+from fnmatch import fnmatchcase
+
+from cloudbot.util.masks import MaskMatcher
+
+test_patterns = [
+    "spammer!*@*",
+    "exact!user@host.example.com",
+    "*!*@*.badisp.net",
+    "troll*!*@*",
+    "?ot!*@*",
+    "[ab]ot!*@*",
+    "nick!user@*",
+]
+
+test_masks = [
+    "spammer!foo@bar.com",
+    "spammer2!foo@bar.com",
+    "exact!user@host.example.com",
+    "exact!user@host.example.org",
+    "someone!u@dsl-1.badisp.net",
+    "someone!u@badisp.net.example.com",
+    "trollface!u@h",
+    "bot!u@h",
+    "aot!u@h",
+    "cot!u@h",
+    "nick!user@anywhere",
+    "nick!other@anywhere",
+    "innocent!user@example.com",
+    "spammer!nohost",
+    "spammer",
+]
+
+
+def test_match():
+    matcher = MaskMatcher(test_patterns)
+    for mask in test_masks:
+        expected = any(fnmatchcase(mask, pattern) for pattern in test_patterns)
+        assert matcher.match(mask) == expected, mask
+
+
+def test_buckets():
+    matcher = MaskMatcher(test_patterns)
+    assert matcher.exact == {"exact!user@host.example.com"}
+    assert matcher.nicks == {"spammer"}
+    assert len(matcher) == len(test_patterns)
+    assert set(matcher) == set(test_patterns)
+
+
+def test_add_remove():
+    matcher = MaskMatcher()
+    assert not matcher
+    assert matcher.match("spammer!foo@bar.com") is False
+
+    matcher.add("spammer!*@*")
+    matcher.add("*!*@*.badisp.net")
+    assert "spammer!*@*" in matcher
+    assert "*!*@*.badisp.net" in matcher
+    assert "other!*@*" not in matcher
+    assert matcher.match("spammer!foo@bar.com")
+    assert matcher.match("x!y@a.badisp.net")
+
+    matcher.remove("*!*@*.badisp.net")
+    assert not matcher.match("x!y@a.badisp.net")
+    matcher.remove("spammer!*@*")
+    assert not matcher.match("spammer!foo@bar.com")
+    # removing something which isn't there is fine
+    matcher.remove("spammer!*@*")
+    assert len(matcher) == 0
@@ -0,0 +1,80 @@
+import sqlite3
+
+import pytest
+
+from cloudbot.util.migrations import Migration, MigrationContext, add_column, add_index, analyze, current_version, \
+    migrate
+
+
+class SQLiteContext(MigrationContext):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        return self.connection.execute(statement, params or {}).fetchall()
+
+    def columns(self, table):
+        return [row[1] for row in self.connection.execute("PRAGMA table_info({})".format(table))]
+
+
+def indexes(connection, table):
+    return sorted(row[1] for row in connection.execute("PRAGMA index_list({})".format(table)))
+
+
+@pytest.fixture
+def context():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("create table tells(connection, target, message, is_read)")
+    yield SQLiteContext(connection)
+    connection.close()
+
+
+def test_migrate(context):
+    migrations = [
+        Migration(2, add_column("tells", "channel", "VARCHAR(25)")),
+        Migration(1, add_index("tells_unread", "tells", "connection", "target", "is_read"), analyze("tells")),
+    ]
+    assert current_version(context, "tell") == 0
+    # applied in order
+    assert migrate(context, "tell", migrations) == [1, 2]
+    assert current_version(context, "tell") == 2
+    assert indexes(context.connection, "tells") == ["tells_unread"]
+    assert "channel" in context.columns("tells")
+
+    # only new migrations are applied
+    migrations.append(Migration(3, add_index("tells_target", "tells", "target")))
+    assert migrate(context, "tell", migrations) == [3]
+    assert migrate(context, "tell", migrations) == []
+    assert current_version(context, "tell") == 3
+    # other plugins have their own versions
+    assert current_version(context, "quote") == 0
+
+
+def test_existing_schema(context):
+    # a table created with the column and index already there, like a new database
+    context.execute("create table notes(connection, user, deleted)")
+    context.execute("create index notes_user on notes(connection, user)")
+    migrations = [Migration(1, add_index("notes_user", "notes", "connection", "user"),
+                            add_column("notes", "deleted", "BOOLEAN"))]
+    assert migrate(context, "notes", migrations) == [1]
+    assert context.columns("notes") == ["connection", "user", "deleted"]
+
+
+def test_raw_and_function_steps(context):
+    calls = []
+    migrate(context, "tell", [Migration(1, "create table extra(a)", calls.append)])
+    assert calls == [context]
+    assert context.columns("extra") == ["a"]
+
+
+def test_identifiers():
+    assert add_index("a_b", "tells", "target") == "CREATE INDEX IF NOT EXISTS a_b ON tells (target)"
+    assert analyze() == "ANALYZE"
+    with pytest.raises(ValueError):
+        add_index("bad name", "tells", "target")
+    with pytest.raises(ValueError):
+        add_index("index", "tells")
+    with pytest.raises(ValueError):
+        add_column("tells; drop table tells", "a", "INTEGER")
+    with pytest.raises(ValueError):
+        analyze("tells--")
@@ -0,0 +1,131 @@
+import pytest
+
+from cloudbot.util.ratelimit import RateLimit, RateLimiter, CommandRateLimits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limit_config():
+    limit = RateLimit.from_config({"max_tokens": 10, "restore_rate": 1, "message_cost": 2})
+    assert limit == RateLimit(10, 1, 2, True)
+    # the old name for max_tokens
+    assert RateLimit.from_config({"tokens": 20}).max_tokens == 20
+    assert RateLimit.from_config({}) == RateLimit(17.5, 2.5, 5, True)
+    assert RateLimit(10, 2).idle_time == 5
+    with pytest.raises(ValueError):
+        RateLimit(10, 0)
+
+
+def test_consume():
+    clock = Clock()
+    limiter = RateLimiter(RateLimit(10, 1, 5), clock)
+    assert limiter.consume("a")
+    assert limiter.consume("a")
+    assert not limiter.consume("a")
+    # other keys have their own buckets
+    assert limiter.consume("b")
+    assert limiter.wait_time("a") == 5
+
+    clock.now += 5
+    assert limiter.consume("a")
+    assert (limiter.allowed, limiter.refused) == (4, 1)
+
+
+def test_strict():
+    clock = Clock()
+    limiter = RateLimiter(RateLimit(10, 1, 4, strict=True), clock)
+    assert limiter.consume("a")
+    assert limiter.consume("a")
+    # refused with 2 tokens left, which are taken away
+    assert not limiter.consume("a")
+    assert limiter.tokens("a") == 0
+    clock.now += 3
+    assert not limiter.consume("a")
+    clock.now += 4
+    assert limiter.consume("a")
+
+
+def test_expiry():
+    clock = Clock()
+    limiter = RateLimiter(RateLimit(10, 1, 5), clock)
+    limiter.consume("a")
+    clock.now += 6
+    limiter.consume("b")
+    assert len(limiter) == 2
+
+    # "a" has had time to fill up, and goes on the next call, "b" hasn't yet
+    clock.now += 4
+    limiter.consume("c")
+    assert "a" not in limiter
+    assert "b" in limiter
+    assert limiter.expired == 1
+
+    # using a bucket keeps it around
+    clock.now += 5
+    limiter.consume("b")
+    clock.now += 6
+    limiter.consume("d")
+    assert list(limiter._buckets) == ["b", "d"]
+
+
+def test_set_limit():
+    clock = Clock()
+    limiter = RateLimiter(RateLimit(10, 1, 1), clock)
+    limiter.consume("a")
+    limiter.set_limit(RateLimit(5, 1, 1))
+    assert limiter.tokens("a") == 5
+
+
+def test_command_limits():
+    clock = Clock()
+    limits = CommandRateLimits({"max_tokens": 10, "restore_rate": 1, "message_cost": 5, "strict": False,
+                                "channel": {"max_tokens": 15}}, clock)
+    assert limits.network is None
+    assert limits.consume("#a", "Foo") is None
+    assert limits.consume("#A", "foo") is None
+    assert limits.consume("#a", "foo") == "user"
+    assert limits.consume("#a", "bar") is None
+    # the channel has used its 15 tokens, though bar hasn't used all of theirs
+    assert limits.consume("#a", "bar") == "channel"
+    assert limits.user.tokens(("#a", "bar")) == 5
+    assert limits.consume("#b", "bar") is None
+    assert limits.stats()["channel"]["refused"] == 1
+
+
+def test_shared_limits_not_strict():
+    clock = Clock()
+    limits = CommandRateLimits({"max_tokens": 10, "restore_rate": 1, "message_cost": 5,
+                                "channel": {"max_tokens": 15}}, clock)
+    assert limits.user.limit.strict
+    assert not limits.channel.limit.strict
+    for nick in ("foo", "bar", "baz"):
+        assert limits.consume("#a", nick) is None
+    # someone spamming the channel is refused, but doesn't use up the tokens it gets back for everyone else
+    assert limits.consume("#a", "spammer") == "channel"
+    clock.now += 5
+    assert limits.consume("#a", "foo") is None
+
+    limits.configure({"channel": {"max_tokens": 15, "strict": True}})
+    assert limits.channel.limit.strict
+
+
+def test_reconfigure():
+    clock = Clock()
+    limits = CommandRateLimits({"max_tokens": 10, "restore_rate": 1, "message_cost": 5}, clock)
+    limits.consume("#a", "foo")
+    user = limits.user
+    limits.configure({"max_tokens": 20, "restore_rate": 1, "message_cost": 5, "network": {}})
+    # buckets are kept, and empty sections don't add a limit
+    assert limits.user is user
+    assert limits.user.tokens(("#a", "foo")) == 5
+    assert limits.network is None
+
+    limits.configure({"network": {"max_tokens": 5}})
+    assert limits.consume("#a", "bar") is None
+    assert limits.consume("#b", "baz") == "network"
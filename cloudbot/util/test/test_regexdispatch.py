@@ -0,0 +1,99 @@
+import re
+
+from cloudbot.util.regexdispatch import RegexDispatcher, required_literals
+
+
+class MockHook:
+    def __init__(self, name, run_on_cmd=False):
+        self.name = name
+        self.run_on_cmd = run_on_cmd
+
+
+youtube_re = re.compile(r'(?:youtube.*?(?:v=|/v/)|youtu\.be/|yooouuutuuube.*?id=)([-_a-zA-Z0-9]+)', re.I)
+twitter_re = re.compile(r"(?:(?:www.twitter.com|twitter.com)/(?:[-_a-zA-Z0-9]+)/status/)([0-9]+)", re.I)
+karma_re = re.compile('^([a-z0-9_\-\[\]\\^{}|`]{3,})(\+\+|\-\-)$', re.I)
+correction_re = re.compile(r"^[sS]/(.*/.*(?:/[igx]{,4})?)\S*$")
+soundcloud_re = re.compile(r'(.*:)//(www.)?(soundcloud.com|snd.sc)(.*)', re.I)
+ctcp_re = re.compile(r'^\x01VERSION\x01$')
+anything_re = re.compile(r'\d+')
+
+test_lines = [
+    "hello everyone",
+    "check this out https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "YOUTUBE.COM/v/abc",
+    "https://twitter.com/someone/status/123456",
+    "cloudbot++",
+    "cloudbot--",
+    "bot++ is great",
+    "s/teh/the/",
+    "S/teh/the/g",
+    "https://snd.sc/abc",
+    "https://SoundCloud.com/artist/track",
+    "\x01VERSION\x01",
+    "there are 42 apples",
+    # 'ſ', 'ı' and 'İ' are matched by 's' and 'i' with IGNORECASE
+    "https://ſoundcloud.com/abc",
+    "https://twıtter.com/someone/status/123456",
+    "https://www.yoİtube.com/watch?v=abc",
+    "TWİTTER.COM/someone/STATUS/123456",
+    "",
+]
+
+
+def test_required_literals():
+    assert required_literals(youtube_re) == {"youtube", "youtu.be/", "yooouuutuuube"}
+    assert required_literals(twitter_re) == {"/status/"}
+    assert required_literals(karma_re) == {"++", "--"}
+    assert required_literals(correction_re) == {"s/"}
+    assert required_literals(soundcloud_re) == {"soundcloud", "snd"}
+    assert required_literals(ctcp_re) == {"\x01version\x01"}
+    assert required_literals(anything_re) is None
+    assert required_literals(re.compile(b"bytes")) is None
+
+
+def make_dispatcher():
+    dispatcher = RegexDispatcher()
+    for regex, name in ((youtube_re, "youtube"), (twitter_re, "twitter"), (karma_re, "karma"),
+                        (correction_re, "correction"), (soundcloud_re, "soundcloud"), (ctcp_re, "ctcp"),
+                        (anything_re, "anything")):
+        dispatcher.add(regex, MockHook(name, run_on_cmd=name == "anything"))
+    return dispatcher
+
+
+def test_same_matches():
+    dispatcher = make_dispatcher()
+    for line in test_lines:
+        expected = [(regex, hook) for regex, hook in dispatcher if regex.search(line)]
+        assert [(regex, hook) for regex, hook, match in dispatcher.search(line)] == expected, line
+        for regex, hook, match in dispatcher.search(line):
+            assert match.group(0) == regex.search(line).group(0)
+
+
+def test_dotted_capital_i():
+    dispatcher = RegexDispatcher()
+    dispatcher.add(re.compile("ix", re.I), MockHook("ix"))
+    for line in ("İX", "ıx", "IX"):
+        assert [hook.name for regex, hook, match in dispatcher.search(line)] == ["ix"], line
+
+
+def test_candidates():
+    dispatcher = make_dispatcher()
+    # only the hook without a literal is always a candidate
+    assert [hook.name for regex, hook in dispatcher.candidates("hello everyone")] == ["anything"]
+    assert [hook.name for regex, hook in dispatcher.candidates("youtu.be/abc++")] == ["youtube", "karma",
+                                                                                       "anything"]
+
+
+def test_run_on_cmd():
+    dispatcher = make_dispatcher()
+    assert [hook.name for regex, hook, match in dispatcher.search("s/a/b/ 42", is_command=True)] == ["anything"]
+
+
+def test_remove():
+    dispatcher = make_dispatcher()
+    for regex, hook in list(dispatcher):
+        if hook.name == "youtube":
+            dispatcher.remove(regex, hook)
+    assert len(dispatcher) == 6
+    assert [hook.name for regex, hook, match in dispatcher.search("youtu.be/abc")] == []
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import pytest
+
+from cloudbot.util.scheduler import Job, PeriodicScheduler, catch_up_limit
+
+
+def noop():
+    pass
+
+
+def test_first_time():
+    assert Job("a", noop, 60).first_time(1000) == 1060
+    assert Job("a", noop, 60, initial_interval=5).first_time(1000) == 1005
+    # aligned jobs run at multiples of their interval
+    assert Job("a", noop, 3600, align=True).first_time(7201) == 10800
+    assert Job("a", noop, 3600, align=True).first_time(7200) == 7200
+    assert Job("a", noop, 60, align=True, initial_interval=30).first_time(1000) == 1080
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        Job("a", noop, 0)
+    with pytest.raises(ValueError):
+        Job("a", noop, 60, jitter=60)
+    with pytest.raises(ValueError):
+        Job("a", noop, 60, missed="never")
+    with pytest.raises(ValueError):
+        Job("a", noop, 60, max_concurrency=0)
+
+
+def test_on_time():
+    job = Job("a", noop, 60)
+    job.scheduled = 1060
+    # runs are scheduled from when they were due, not from when they ran
+    assert job.advance(1061.5)
+    assert job.scheduled == 1120
+
+
+def test_coalesce():
+    job = Job("a", noop, 60)
+    job.scheduled = 1060
+    # 1060, 1120 and 1180 were all missed, and are made up with one run
+    assert job.advance(1200)
+    assert job.scheduled == 1240
+    assert job.coalesced == 2
+
+
+def test_skip():
+    job = Job("a", noop, 60, missed="skip")
+    job.scheduled = 1060
+    # a little late still runs
+    assert job.advance(1100)
+    assert job.scheduled == 1120
+    assert not job.advance(1200)
+    assert job.scheduled == 1240
+    assert job.skipped == 2
+
+
+def test_catch_up():
+    job = Job("a", noop, 60, missed="catch_up")
+    job.scheduled = 1060
+    assert job.advance(1200)
+    # the next missed run is due straight away
+    assert job.scheduled == 1120
+    assert job.advance(1200)
+    assert job.advance(1200)
+    assert job.scheduled == 1240
+
+    # too many missed runs are coalesced
+    job.scheduled = 1000
+    assert job.advance(1000 + 60 * (catch_up_limit + 5))
+    assert job.scheduled > 1000 + 60 * (catch_up_limit + 5)
+
+
+def finish_later(delay=0):
+    """
+    Returns a future for a run which takes the given time
+    """
+    loop = asyncio.get_event_loop()
+    future = asyncio.Future(loop=loop)
+    loop.call_later(delay, future.set_result, None)
+    return future
+
+
+def run_scheduler(jobs, duration):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        scheduler = PeriodicScheduler(loop)
+        for job in jobs:
+            scheduler.add(job)
+        loop.run_until_complete(finish_later(duration))
+        return scheduler
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_runs():
+    times = []
+
+    def run():
+        times.append(time.time())
+        return finish_later()
+
+    job = Job("a", run, 0.05, initial_interval=0)
+    run_scheduler([job], 0.28)
+    assert 5 <= len(times) <= 7
+    assert job.runs == len(times)
+    # no drift, each run is due a whole number of intervals after the first
+    for number, run_time in enumerate(times):
+        assert abs(run_time - (times[0] + number * 0.05)) < 0.04
+
+
+def test_concurrency():
+    state = {"running": 0, "most": 0}
+
+    def finished(_):
+        state["running"] -= 1
+
+    def slow():
+        state["running"] += 1
+        state["most"] = max(state["most"], state["running"])
+        future = finish_later(0.12)
+        future.add_done_callback(finished)
+        return future
+
+    job = Job("a", slow, 0.03, initial_interval=0, max_concurrency=2)
+    run_scheduler([job], 0.3)
+    assert state["most"] == 2
+    assert job.deferred > 0
+
+
+def test_cancel():
+    runs = []
+
+    def run():
+        runs.append(1)
+        return finish_later()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        scheduler = PeriodicScheduler(loop)
+        owner = object()
+        first = scheduler.add(Job("a", run, 0.02, initial_interval=0, owner=owner))
+        second = scheduler.add(Job("b", run, 0.5, owner=owner))
+        other = scheduler.add(Job("c", run, 10))
+        assert scheduler.upcoming() == [first, second, other]
+
+        loop.run_until_complete(finish_later(0.05))
+        assert scheduler.cancel_owner(owner) == 2
+        assert scheduler.jobs == [other]
+        count = len(runs)
+        loop.run_until_complete(finish_later(0.1))
+        assert len(runs) == count
+        assert first.next_time is None
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
@@ -0,0 +1,67 @@
+from cloudbot.util.sendqueue import SendQueue, encode_line, parse_line
+
+
+def test_parse_line():
+    assert parse_line("PRIVMSG #Channel :hello there") == ("PRIVMSG", "#channel")
+    assert parse_line("PONG :irc.example.com") == ("PONG", None)
+    assert parse_line("QUIT") == ("QUIT", None)
+    assert parse_line("mode #chan +o nick") == ("MODE", "#chan")
+
+
+def test_encode_line():
+    assert encode_line("PRIVMSG #chan :hello") == b"PRIVMSG #chan :hello\r\n"
+    assert encode_line("a" * 600) == b"a" * 510 + b"\r\n"
+    # cut on bytes, not characters
+    assert len(encode_line("\u00e9" * 300)) == 512
+    # but never in the middle of a character
+    data = encode_line("a" + "\u20ac" * 200)
+    assert len(data) == 510
+    assert data[:-2].decode("utf-8") == "a" + "\u20ac" * 169
+
+
+def test_burst():
+    queue = SendQueue(burst=3, rate=0.001)
+    for number in range(5):
+        queue.put("PRIVMSG #chan :line {}".format(number))
+    assert len(queue) == 5
+    assert queue.pop_ready() == ["PRIVMSG #chan :line 0", "PRIVMSG #chan :line 1", "PRIVMSG #chan :line 2"]
+    assert queue.pop_ready() == []
+    assert len(queue) == 2
+    assert queue.delay() > 0
+
+
+def test_priority():
+    queue = SendQueue(burst=2, rate=0.001)
+    queue.put("PRIVMSG #chan :first")
+    queue.put("PRIVMSG #chan :second")
+    queue.put("PONG :irc.example.com")
+    # PONG goes first, using up one of the tokens
+    assert queue.pop_ready() == ["PONG :irc.example.com", "PRIVMSG #chan :first"]
+    # and isn't held back by the empty bucket
+    queue.put("QUIT :bye")
+    assert queue.delay() == 0
+    assert queue.pop_ready() == ["QUIT :bye"]
+
+
+def test_round_robin():
+    queue = SendQueue(burst=6, rate=0.001)
+    for number in range(4):
+        queue.put("PRIVMSG #spam :spam {}".format(number))
+    queue.put("PRIVMSG #quiet :hello")
+    queue.put("NOTICE someone :hi")
+    assert queue.pop_ready() == ["PRIVMSG #spam :spam 0", "PRIVMSG #quiet :hello", "NOTICE someone :hi",
+                                 "PRIVMSG #spam :spam 1", "PRIVMSG #spam :spam 2", "PRIVMSG #spam :spam 3"]
+    assert queue.delay() is None
+
+
+def test_stats():
+    queue = SendQueue(burst=2, rate=0.001)
+    for number in range(3):
+        queue.put("PRIVMSG #chan :line {}".format(number))
+    queue.pop_ready()
+    stats = queue.stats()
+    assert stats["depth"] == 1
+    assert stats["max_depth"] == 3
+    assert stats["sent"] == 2
+    assert stats["targets"] == 1
+    assert stats["max_latency"] >= stats["average_latency"] >= 0
@@ -0,0 +1,85 @@
+import random
+
+from cloudbot.util.timerheap import TimerHeap
+
+
+def test_order():
+    heap = TimerHeap()
+    heap.push("c", 30, "third")
+    heap.push("a", 10, "first")
+    heap.push("b", 20, "second")
+    assert len(heap) == 3
+    assert heap.next_time() == 10
+    assert heap.get("b") == "second"
+
+    assert heap.pop_due(5) == []
+    assert heap.pop_due(20) == [("a", 10, "first"), ("b", 20, "second")]
+    assert heap.next_time() == 30
+    assert "a" not in heap
+    assert heap.pop_due(100) == [("c", 30, "third")]
+    assert heap.next_time() is None
+    assert not heap
+
+
+def test_same_time():
+    heap = TimerHeap()
+    # items due at the same time come out in the order they were added, and are never compared
+    for number in range(5):
+        heap.push(number, 1, {"number": number})
+    assert [key for key, _, _ in heap.pop_due(1)] == [0, 1, 2, 3, 4]
+
+
+def test_remove():
+    heap = TimerHeap()
+    heap.push("a", 10, "first")
+    heap.push("b", 20, "second")
+    assert heap.remove("a") == "first"
+    assert heap.remove("a") is None
+    # the removed entry doesn't hold up the next one
+    assert heap.next_time() == 20
+    assert heap.removed == 0
+
+    heap.push("b", 5, "moved")
+    assert heap.next_time() == 5
+    assert heap.pop_due(30) == [("b", 5, "moved")]
+    assert heap.next_time() is None
+
+
+def test_limit():
+    heap = TimerHeap()
+    for number in range(10):
+        heap.push(number, number, None)
+    assert len(heap.pop_due(100, limit=3)) == 3
+    assert len(heap) == 7
+    assert heap.next_time() == 3
+
+
+def test_compaction():
+    heap = TimerHeap()
+    for number in range(1000):
+        heap.push(number, number, None)
+    # removing from the back leaves removed entries in the heap until there are enough to rebuild it
+    for number in range(999, 99, -1):
+        heap.remove(number)
+    assert len(heap) == 100
+    assert len(heap._heap) < 300
+    assert [key for key, _, _ in heap.pop_due(1000)] == list(range(100))
+
+
+def test_random():
+    rng = random.Random(0)
+    heap = TimerHeap()
+    expected = {}
+    for number in range(5000):
+        if expected and rng.random() < 0.3:
+            key = rng.choice(list(expected))
+            assert heap.remove(key) == expected.pop(key)[1]
+        else:
+            when = rng.randrange(1000)
+            expected[number] = (when, "item {}".format(number))
+            heap.push(number, when, "item {}".format(number))
+        assert heap.next_time() == (min(when for when, _ in expected.values()) if expected else None)
+
+    due = heap.pop_due(500)
+    assert [when for _, when, _ in due] == sorted(when for when, _ in expected.values() if when <= 500)
+    assert len(heap) == len(expected) - len(due)
@@ -0,0 +1,117 @@
+"""
+timerheap.py
+
+A min-heap of things which are due at some time, which can also be removed by key. Adding and removing are O(log n),
+and finding the next due time is O(1), so something like the reminder plugin can keep a single timer for whatever is
+due next instead of scanning everything on an interval.
+
+Removed entries are left in the heap and skipped when they reach the top, and the heap is rebuilt once most of it is
+removed entries, so removing doesn't have to search the heap.
+"""
+
+import heapq
+import itertools
+
+# the key of each entry which has been removed, so it's skipped when it reaches the top
+_removed = object()
+
+
+class TimerHeap:
+    """
+    :type removed: int
+    """
+
+    def __init__(self):
+        # [when, sequence, key, item], so entries due at the same time come out in the order they were pushed, and
+        # keys and items are never compared
+        self._heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+        # the number of removed entries still in the heap
+        self.removed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __iter__(self):
+        """
+        Iterates over the keys, in no particular order
+        """
+        return iter(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the item pushed with the given key
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        return entry[3]
+
+    def push(self, key, when, item):
+        """
+        Adds an item which is due at the given time, replacing any item with the same key
+        :param when: Anything which can be compared, like a timestamp or a datetime
+        """
+        if key in self._entries:
+            self.remove(key)
+        entry = [when, next(self._sequence), key, item]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, key):
+        """
+        Removes the item with the given key, and returns it, or None if there isn't one
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        item = entry[3]
+        entry[2] = _removed
+        entry[3] = None
+        self.removed += 1
+        self._discard_removed()
+        return item
+
+    def _discard_removed(self):
+        heap = self._heap
+        while heap and heap[0][2] is _removed:
+            heapq.heappop(heap)
+            self.removed -= 1
+        # rebuild the heap once it's mostly removed entries, so they don't pile up
+        if self.removed > 64 and self.removed > len(heap) // 2:
+            self._heap = [entry for entry in heap if entry[2] is not _removed]
+            heapq.heapify(self._heap)
+            self.removed = 0
+
+    def next_time(self):
+        """
+        Returns when the next item is due, or None if there are none
+        """
+        if not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def pop_due(self, now, limit=None):
+        """
+        Removes and returns the items which are due by the given time, earliest first, as (key, when, item) tuples
+        :param limit: The most items to return, with the rest left for the next call
+        :type limit: int
+        :rtype: list[(object, object, object)]
+        """
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now and (limit is None or len(due) < limit):
+            when, _, key, item = heapq.heappop(heap)
+            del self._entries[key]
+            due.append((key, when, item))
+            self._discard_removed()
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+        self.removed = 0
@@ -20,8 +20,9 @@ def invite(irc_paramlist, conn):
 
 
 # Identify to NickServ (or other service)
+# joining takes a while with a lot of channels, so this isn't limited by the hook timeout
 @asyncio.coroutine
-@hook.irc_raw('004')
+@hook.irc_raw('004', timeout=0)
 def onjoin(conn, bot):
     """
     :type conn: cloudbot.clients.clients.IrcClient
@@ -63,8 +64,9 @@ def onjoin(conn, bot):
     bot.logger.info("[{}|misc] Bot has finished sending join commands for network.".format(conn.name))
 
 
+# runs for as long as the connection does
 @asyncio.coroutine
-@hook.irc_raw('004')
+@hook.irc_raw('004', timeout=0)
 def keep_alive(conn):
     """
     :type conn: cloudbot.clients.clients.IrcClient
@@ -1,4 +1,3 @@
-from operator import attrgetter
 import asyncio
 import re
 
@@ -23,8 +22,10 @@ def help_command(text, chan, conn, bot, notice, message, has_permission):
         searching_for = None
 
     if searching_for:
-        if searching_for in bot.plugin_manager.commands:
-            doc = bot.plugin_manager.commands[searching_for].doc
+        # accept unique abbreviations, the same as when running a command
+        command_hook = bot.plugin_manager.commands.resolve(searching_for)
+        if command_hook is not None:
+            doc = command_hook.doc
             if doc:
                 if doc.split()[0].isalpha():
                     # this is using the old format of `name <args> - doc`
@@ -40,8 +41,8 @@ def help_command(text, chan, conn, bot, notice, message, has_permission):
     else:
         commands = []
 
-        for plugin in sorted(set(bot.plugin_manager.commands.values()), key=attrgetter("name")):
-            # use set to remove duplicate commands (from multiple aliases), and sorted to sort by name
+        for plugin in bot.plugin_manager.commands.hooks():
+            # hooks() removes duplicate commands (from multiple aliases), and sorts them by name
 
             if plugin.permissions:
                 # check permissions
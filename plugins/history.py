@@ -4,7 +4,7 @@ import asyncio
 import re
 
 from cloudbot import hook
-from cloudbot.util import timeformat
+from cloudbot.util import timeformat, database
 from cloudbot.event import EventType
 
 db_ready = []
@@ -30,11 +30,11 @@ def track_seen(event, db, conn):
     db_init(db, conn)
     # keep private messages private
     if event.chan[:1] == "#" and not re.findall('^s/.*/.*/$', event.content.lower()):
-        db.execute(
+        # only the last message from each nick in each channel needs to be written
+        database.write_behind.enqueue(
             "insert or replace into seen_user(name, time, quote, chan, host) values(:name,:time,:quote,:chan,:host)",
             {'name': event.nick.lower(), 'time': time.time(), 'quote': event.content, 'chan': event.chan,
-             'host': event.mask})
-        db.commit()
+             'host': event.mask}, key=("seen_user", event.nick.lower(), event.chan))
 
 
 def track_history(event, message_time, conn):
@@ -54,7 +54,7 @@ def track_history(event, message_time, conn):
     history.append(data)
 
 
-@hook.event([EventType.message, EventType.action], singlethread=True)
+@hook.event([EventType.message, EventType.action], singlethread_key="chan")
 def chat_tracker(event, db, conn):
     """
     :type db: sqlalchemy.orm.Session
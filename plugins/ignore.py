@@ -1,10 +1,10 @@
 import asyncio
-from fnmatch import fnmatch
 
 from sqlalchemy import Table, Column, UniqueConstraint, PrimaryKeyConstraint, String, Boolean
 
 from cloudbot import hook
 from cloudbot.util import database
+from cloudbot.util.masks import MaskMatcher
 
 
 table = Table(
@@ -18,54 +18,75 @@ table = Table(
     PrimaryKeyConstraint("connection", "channel", "mask")
 )
 
+# ignored masks for each (connection, channel). global ignores are stored with a channel of "*"
+ignore_cache = {}
+# the matchers in ignore_cache for global ignores, which apply on every connection
+global_ignores = []
+
+
+def _cache_ignore(conn, chan, mask):
+    matcher = ignore_cache.get((conn, chan))
+    if matcher is None:
+        matcher = ignore_cache[(conn, chan)] = MaskMatcher()
+        if chan == "*":
+            global_ignores.append(matcher)
+    matcher.add(mask)
+
+
+def _uncache_ignore(conn, chan, mask):
+    matcher = ignore_cache.get((conn, chan))
+    if matcher is None:
+        return
+    matcher.remove(mask)
+    if not matcher:
+        del ignore_cache[(conn, chan)]
+        if chan == "*":
+            global_ignores.remove(matcher)
+
 
 @hook.on_start
 def load_cache(db):
     """
     :type db: sqlalchemy.orm.Session
     """
-    global ignore_cache
-    ignore_cache = []
+    ignore_cache.clear()
+    del global_ignores[:]
     for row in db.execute(table.select()):
-        conn = row["connection"]
-        chan = row["channel"]
-        mask = row["mask"]
-        ignore_cache.append((conn, chan, mask))
+        _cache_ignore(row["connection"], row["channel"], row["mask"])
 
 
 def add_ignore(db, conn, chan, mask):
-    if (conn, chan) in ignore_cache:
-        pass
-    else:
+    matcher = ignore_cache.get((conn, chan))
+    if matcher is None or mask not in matcher:
         db.execute(table.insert().values(connection=conn, channel=chan, mask=mask))
-
-    db.commit()
-    load_cache(db)
+        db.commit()
+    _cache_ignore(conn, chan, mask)
 
 
 def remove_ignore(db, conn, chan, mask):
     db.execute(table.delete().where(table.c.connection == conn).where(table.c.channel == chan)
                .where(table.c.mask == mask))
     db.commit()
-    load_cache(db)
+    _uncache_ignore(conn, chan, mask)
+
 
 def is_ignored(conn, chan, mask):
-    for _conn, _chan, _mask in ignore_cache:
-        if _chan == "*":
-            # this is a global ignore
-            if fnmatch(mask, _mask):
-                return True
-        else:
-            # this is a channel-specific ignore
-            if not (conn, chan) == (_conn, _chan):
-                continue
-            if fnmatch(mask, _mask):
-                return True
+    # global ignores
+    for matcher in global_ignores:
+        if matcher.match(mask):
+            return True
+
+    # channel-specific ignores
+    matcher = ignore_cache.get((conn, chan))
+    if matcher is not None and matcher.match(mask):
+        return True
+
+    return False
 
 
 # noinspection PyUnusedLocal
 @asyncio.coroutine
-@hook.sieve(priority=50)
+@hook.sieve(priority=50, cache_key="hook_type")
 def ignore_sieve(bot, event, _hook):
     """
     :type bot: cloudbot.bot.CloudBot
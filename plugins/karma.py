@@ -6,6 +6,8 @@ from sqlalchemy import select
 
 from cloudbot import hook
 from cloudbot.util import timeformat, database
+from cloudbot.util.migrations import Migration, add_index, analyze
+from cloudbot.util.ratelimit import RateLimit, RateLimiter
 
 
 CAN_DOWNVOTE = False
@@ -22,12 +24,18 @@ karma_table = Table(
     PrimaryKeyConstraint('nick_vote')
 )
 
-voters = {}
+migrations = [
+    # for the top and bottom karma lists
+    Migration(1, add_index("karma_total", "karma", "total_karma"), analyze("karma")),
+]
 
+# one vote per voter and target each TIME_LIMIT seconds
+voters = RateLimiter(RateLimit(1, 1 / TIME_LIMIT))
 
-def up(db, nick_vote):
+
+def up(nick_vote):
     """ gives one karma to a user """
-    db.execute("""INSERT or IGNORE INTO karma(
+    database.write_behind.enqueue("""INSERT or IGNORE INTO karma(
         nick_vote,
         up_karma,
         down_karma,
@@ -36,13 +44,12 @@ def up(db, nick_vote):
         up_karma=karma_table.c.up_karma + 1,
         total_karma=karma_table.c.total_karma + 1
     ).where(karma_table.c.nick_vote == nick_vote.lower())
-    db.execute(query)
-    db.commit()
+    database.write_behind.enqueue(query)
 
 
-def down(db, nick_vote):
+def down(nick_vote):
     """ takes one karma away from a user """
-    db.execute("""INSERT or IGNORE INTO karma(
+    database.write_behind.enqueue("""INSERT or IGNORE INTO karma(
         nick_vote,
         up_karma,
         down_karma,
@@ -51,32 +58,22 @@ def down(db, nick_vote):
         down_karma=karma_table.c.down_karma + 1,
         total_karma=karma_table.c.total_karma - 1
     ).where(karma_table.c.nick_vote == nick_vote.lower())
-    db.execute(query)
-    db.commit()
+    database.write_behind.enqueue(query)
 
 
 def allowed(uid):
     """ checks if a user is allowed to vote, and keeps track of voters """
-    global voters
-
-    # clear expired voters
-    for _uid, _timestamp in voters.items():
-        if (time.time() - _timestamp) >= TIME_LIMIT:
-            del voters[_uid]
-
-    if uid in voters:
-        last_voted = voters[uid]
-        return False, timeformat.time_until(last_voted, now=time.time() - TIME_LIMIT)
-    else:
-        voters[uid] = time.time()
+    if voters.consume(uid):
         return True, 0
+    now = time.time()
+    return False, timeformat.time_until(now + voters.wait_time(uid), now=now)
 
 
 karma_re = re.compile('^([a-z0-9_\-\[\]\\^{}|`]{3,})(\+\+|\-\-)$', re.I)
 
 
 @hook.regex(karma_re)
-def karma_add(match, nick, conn, db, notice):
+def karma_add(match, nick, conn, notice):
     nick_vote = match.group(1).strip()
     if nick.lower() == nick_vote.lower():
         notice("You can't vote on yourself!")
@@ -87,10 +84,10 @@ def karma_add(match, nick, conn, db, notice):
 
     if vote_allowed:
         if match.group(2) == '++':
-            up(db, nick_vote)
+            up(nick_vote)
             notice("Gave {} 1 karma!".format(nick_vote))
         if match.group(2) == '--' and CAN_DOWNVOTE:
-            down(db, nick_vote)
+            down(nick_vote)
             notice("Took away 1 karma from {}.".format(nick_vote))
         else:
             return
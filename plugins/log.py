@@ -201,7 +201,7 @@ def get_raw_log_stream(server):
     return log_stream
 
 
-@hook.irc_raw("*", singlethread=True)
+@hook.irc_raw("*", singlethread_key="conn")
 def log_raw(event):
     """
     :type event: cloudbot.event.Event
@@ -215,7 +215,7 @@ def log_raw(event):
     stream.flush()
 
 
-@hook.irc_raw("*", singlethread=True)
+@hook.irc_raw("*", singlethread_key="chan")
 def log(event):
     """
     :type event: cloudbot.event.Event
@@ -6,6 +6,7 @@ from sqlalchemy.sql import select
 
 from cloudbot import hook
 from cloudbot.util import database
+from cloudbot.util.migrations import Migration, add_index, analyze
 
 table = Table(
     'notes',
@@ -20,6 +21,10 @@ table = Table(
     PrimaryKeyConstraint('note_id', 'connection', 'user')
 )
 
+migrations = [
+    Migration(1, add_index("notes_user", "notes", "connection", "user"), analyze("notes")),
+]
+
 
 def read_all_notes(db, server, user, show_deleted=False):
     if show_deleted:
@@ -2,6 +2,7 @@ import asyncio
 import os
 import signal
 import threading
+import time
 import traceback
 import sys
 
@@ -111,6 +112,147 @@ def pympler_diff():
     tr.print_diff()
     return "Printed to console"
 
+
+@hook.command("sendstats", autohelp=False, permissions=["botcontrol"])
+def send_stats(conn):
+    """- shows the outgoing message queue for this connection"""
+    if not hasattr(conn, "send_queue"):
+        return "This connection doesn't queue outgoing messages"
+    stats = conn.send_queue.stats()
+    return "Queued: {depth} lines for {targets} targets (max {max_depth}), sent: {sent}, " \
+           "latency: {average_latency:.2f}s average, {max_latency:.2f}s max".format(**stats)
+
+
+@hook.command("encodingstats", autohelp=False, permissions=["botcontrol"])
+def encoding_stats(conn):
+    """- shows which encodings incoming lines on this connection have been decoded with"""
+    if not hasattr(conn, "decoder"):
+        return "This connection doesn't track encodings"
+    stats = conn.decoder.stats()
+    fallback_lines = ", ".join("{}: {}".format(codec, count)
+                               for codec, count in sorted(stats["fallback_lines"].items()))
+    return "Lines: {} ({} ASCII, {} UTF-8), fallbacks: {}, undecodable: {}, fallback order: {}".format(
+        stats["lines"], stats["ascii_lines"], stats["utf8_lines"], fallback_lines or "none", stats["undecodable"],
+        ", ".join(stats["fallbacks"]) or "none")
+
+
+@hook.command("inboundstats", autohelp=False, permissions=["botcontrol"])
+def inbound_stats(conn):
+    """- shows how many incoming lines on this connection have been dropped, or had hooks skipped, under load"""
+    if not hasattr(conn, "inbound"):
+        return "This connection doesn't queue incoming lines"
+    stats = conn.inbound.stats()
+    return "Queued: {depth} lines (max {max_depth}), received: {received}, processed: {processed}, " \
+           "dropped: {dropped}, shed: {shed_hooks} hooks skipped on {shed_lines} lines".format(**stats)
+
+
+@hook.command("hooktimeouts", autohelp=False, permissions=["botcontrol"])
+def hook_timeouts(bot):
+    """- shows how many hooks from each plugin have timed out"""
+    timeouts = bot.plugin_manager.timeouts
+    if not timeouts:
+        return "No hooks have timed out"
+    counts = ", ".join("{}: {}".format(title, count)
+                       for title, count in sorted(timeouts.items(), key=lambda item: item[1], reverse=True))
+    return "Timed out: {}, abandoned threads still running: {}".format(
+        counts, bot.plugin_manager.abandoned_threads)
+
+
+@hook.command("poolstats", autohelp=False, permissions=["botcontrol"])
+def pool_stats(text, bot):
+    """[pool] - shows how busy the thread pools hooks run in are, busiest first, or the details of a single pool"""
+    executors = bot.plugin_manager.executors
+    if text:
+        name = text.strip()
+        if name not in executors.pools:
+            # allow plugins to be given by name
+            name = executors.pool_name(name)
+        if name not in executors.pools:
+            return "No pool named {}".format(text.strip())
+        return "{name}: {active}/{max_workers} threads busy (max {max_active}), {queued} queued, {completed} done, " \
+               "wait: {average_wait:.3f}s average, {max_wait:.3f}s max".format(**executors.pools[name].stats())
+
+    stats = executors.stats()
+    if not stats:
+        return "No thread pools have been used yet"
+    stats.sort(key=lambda pool: (pool["active"] + pool["queued"], pool["max_wait"]), reverse=True)
+    return ", ".join("{name} {active}/{max_workers} ({queued} queued, {max_wait:.2f}s max wait)".format(**pool)
+                     for pool in stats[:10])
+
+
+@hook.command("hooklocks", autohelp=False, permissions=["botcontrol"])
+def hook_locks(bot):
+    """- shows which singlethread hooks have events waiting, and for which channel, connection or nick"""
+    locks = bot.plugin_manager.hook_locks
+    queued = sorted(((length, key) for key, length in locks.queue_lengths().items() if length),
+                    key=lambda item: item[0], reverse=True)
+    summary = "Held: {}, waits: {}, longest queue: {}".format(len(locks.waiting), locks.waits, locks.max_waiting)
+    if locks.max_waiting_key is not None:
+        summary += " ({})".format(":".join(str(part) for part in locks.max_waiting_key))
+    if not queued:
+        return summary
+    return summary + ", waiting now: " + ", ".join(
+        "{} ({})".format(":".join(str(part) for part in key), length) for length, key in queued[:10])
+
+
+@hook.command("dbstats", autohelp=False, permissions=["botcontrol"])
+def db_stats(bot):
+    """- shows how long database statements take, and how busy the database threads and write queue are"""
+    timings = bot.db_timer.stats()
+    statements = ", ".join("{} {} ({:.1f}ms avg, {:.1f}ms max)".format(
+        kind, kind_stats["count"], kind_stats["average"] * 1000, kind_stats["max"] * 1000)
+        for kind, kind_stats in sorted(timings.items(), key=lambda item: item[1]["total"], reverse=True))
+    executor = bot.db_executor.stats()
+    write_behind = bot.write_behind.stats()
+    return "Statements: {}, slow: {}. Threads: {workers}, sessions: {sessions_created} ({checked_out} in use). " \
+           "Queued writes: {pending}, written: {written} in {flushes} flushes, coalesced: {coalesced}, " \
+           "failed: {failed}".format(statements or "none", bot.db_timer.slow, **dict(executor, **write_behind))
+
+
+@hook.command("periodic", autohelp=False, permissions=["botcontrol"])
+def periodic_hooks(bot):
+    """- shows the periodic hooks, and when they'll next run"""
+    jobs = bot.plugin_manager.scheduler.upcoming()
+    if not jobs:
+        return "No periodic hooks are scheduled"
+    now = time.time()
+    return ", ".join("{} every {}s: {} ({} runs, {} skipped, {} coalesced)".format(
+        job.name, job.interval, "waiting for a run to finish" if job.waiting else "in {:.0f}s".format(
+            max(job.next_time - now, 0)), job.runs, job.skipped, job.coalesced) for job in jobs[:10])
+
+
+@hook.command("ratelimits", autohelp=False, permissions=["botcontrol"])
+def rate_limits(bot):
+    """- shows how many commands each connection's rate limits have allowed and refused"""
+    parts = []
+    for conn in bot.connections.values():
+        levels = ", ".join("{} {allowed}/{refused} ({buckets} buckets)".format(name, **stats)
+                           for name, stats in sorted(conn.rate_limits.stats().items()))
+        parts.append("{}: {}".format(conn.name, levels))
+    if not parts:
+        return "No connections"
+    return "Allowed/refused - " + "; ".join(parts)
+
+
+@hook.command("httpstats", autohelp=False, permissions=["botcontrol"])
+def http_stats(bot):
+    """- shows the hosts plugins make the most HTTP requests to, with their latency and connections opened"""
+    stats = bot.http.stats()
+    if not stats:
+        return "No HTTP requests have been made yet"
+    hosts = sorted(stats.items(), key=lambda item: item[1]["requests"], reverse=True)
+    return ", ".join("{} {requests} requests ({errors} failed, {average:.2f}s avg, {max:.2f}s max, "
+                     "{})".format(host, _connections(host_stats), **host_stats)
+                     for host, host_stats in hosts[:10])
+
+
+def _connections(host_stats):
+    connections = host_stats.get("connections", 0)
+    if connections is None:
+        return "connections unavailable"
+    return "{} connections".format(connections)
+
+
 # # Provide an easy way to get a threaddump, by using SIGUSR1 (only on POSIX systems)
 if os.name == "posix":
     def debug():
@@ -4,6 +4,7 @@ import time
 
 from cloudbot import hook
 from cloudbot.util import database
+from cloudbot.util.migrations import Migration, add_index, analyze
 
 from sqlalchemy import select
 from sqlalchemy import Table, Column, String, PrimaryKeyConstraint
@@ -23,6 +24,13 @@ qtable = Table(
     PrimaryKeyConstraint('chan', 'nick', 'time')
 )
 
+migrations = [
+    Migration(1,
+              add_index("quote_nick", "quote", "nick", "deleted"),
+              add_index("quote_chan", "quote", "chan", "deleted"),
+              analyze("quote")),
+]
+
 
 def format_quote(q, num, n_quotes):
     """Returns a formatted string of a quote"""
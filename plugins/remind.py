@@ -21,6 +21,7 @@ from sqlalchemy import Table, Column, String, DateTime, PrimaryKeyConstraint
 
 from cloudbot import hook
 from cloudbot.util import database
+from cloudbot.util.timerheap import TimerHeap
 from cloudbot.util.timeparse import time_parse
 from cloudbot.util.timeformat import format_time, time_since
 from cloudbot.util import colors
@@ -39,14 +40,20 @@ table = Table(
 )
 
 
-@asyncio.coroutine
-def delete_reminder(async, db, network, remind_time, user):
+# the longest the timer waits before checking the next reminder's time again, in case the system clock changes
+max_sleep = 300
+# how often reminders for a connection which isn't ready are retried, in seconds
+retry_interval = 10
+# the most reminders delivered at once, the rest are delivered straight afterwards
+batch_size = 50
+
+
+def delete_reminder(network, user, added_time):
     query = table.delete() \
         .where(table.c.network == network.lower()) \
-        .where(table.c.remind_time == remind_time) \
-        .where(table.c.added_user == user.lower())
-    yield from async(db.execute, query)
-    yield from async(db.commit)
+        .where(table.c.added_user == user.lower()) \
+        .where(table.c.added_time == added_time)
+    database.write_behind.enqueue(query, key=("reminders", network.lower(), user.lower(), added_time))
 
 
 @asyncio.coroutine
@@ -72,14 +79,174 @@ def add_reminder(async, db, network, added_user, added_chan, message, remind_tim
     yield from async(db.commit)
 
 
+class Reminders:
+    """
+    Holds the pending reminders in a heap ordered by when they're due, with one timer set for the next one.
+
+    :type bot: cloudbot.bot.CloudBot
+    :type pending: TimerHeap
+    :type by_user: dict[(str, str), set[(str, str, datetime)]]
+    :type waiting: dict[str, list[(datetime, datetime, str, str)]]
+    """
+
+    def __init__(self, bot):
+        """
+        :type bot: cloudbot.bot.CloudBot
+        """
+        self.bot = bot
+        self.loop = bot.loop
+        # (network, user, added_time) -> (remind_time, added_time, user, message)
+        self.pending = TimerHeap()
+        # (network, user) -> the keys of their reminders, for counting and clearing them
+        self.by_user = {}
+        # reminders which are due for connections which aren't ready yet, by network
+        self.waiting = {}
+        self._timer = None
+        self._timer_at = None
+
+    def add(self, network, user, added_time, remind_time, message):
+        network = network.lower()
+        user = user.lower()
+        key = (network, user, added_time)
+        self.pending.push(key, remind_time, (remind_time, added_time, user, message))
+        self.by_user.setdefault((network, user), set()).add(key)
+        self._arm()
+
+    def count(self, network, user):
+        return len(self.by_user.get((network.lower(), user.lower()), ()))
+
+    def remove_user(self, network, user):
+        """
+        Forgets all of a user's reminders, returning how many there were
+        """
+        network = network.lower()
+        user = user.lower()
+        keys = self.by_user.pop((network, user), set())
+        for key in keys:
+            self.pending.remove(key)
+        if network in self.waiting:
+            self.waiting[network] = [reminder for reminder in self.waiting[network] if reminder[2] != user]
+            if not self.waiting[network]:
+                del self.waiting[network]
+        self._arm()
+        return len(keys)
+
+    def _forget(self, network, user, added_time):
+        keys = self.by_user.get((network, user))
+        if keys is not None:
+            keys.discard((network, user, added_time))
+            if not keys:
+                del self.by_user[(network, user)]
+
+    def _arm(self):
+        """
+        Sets the timer for the next reminder, or to retry the waiting ones, unless it's already set to go off sooner
+        """
+        delays = []
+        next_time = self.pending.next_time()
+        if next_time is not None:
+            delays.append(min(max((next_time - datetime.now()).total_seconds(), 0), max_sleep))
+        if self.waiting:
+            delays.append(retry_interval)
+        if not delays:
+            self.cancel()
+            return
+
+        when = self.loop.time() + min(delays)
+        if self._timer is not None and self._timer_at <= when:
+            return
+        self.cancel()
+        self._timer = self.loop.call_at(when, self._fire)
+        self._timer_at = when
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = None
+        self._timer_at = None
+
+    def _fire(self):
+        self._timer = None
+        self._timer_at = None
+        if reminders is not self:
+            # the plugin has been reloaded, and has its own timer now
+            return
+
+        due = self.pending.pop_due(datetime.now(), limit=batch_size)
+        for (network, _, _), _, reminder in due:
+            self.waiting.setdefault(network, []).append(reminder)
+
+        for network in list(self.waiting):
+            self.deliver(network)
+
+        if len(due) == batch_size:
+            # there's more due straight away, but let anything else waiting on the loop run first
+            self._timer_at = self.loop.time()
+            self._timer = self.loop.call_soon(self._fire)
+        else:
+            self._arm()
+
+    def _find_connection(self, network):
+        """
+        Returns the connection with the given lowercased name, or None if the network isn't configured
+        :rtype: cloudbot.client.Client | None
+        """
+        for name, conn in self.bot.connections.items():
+            if name.lower() == network:
+                return conn
+        return None
+
+    def deliver(self, network):
+        """
+        Delivers the due reminders for the given network, if it's connected
+        """
+        conn = self._find_connection(network)
+        if conn is None:
+            # the network has been removed from the config, they're left in the database in case it's added back
+            dropped = self.waiting.pop(network)
+            self.bot.logger.warning("[remind] Not delivering {} reminders for unknown network {}".format(
+                len(dropped), network))
+            for _, added_time, user, _ in dropped:
+                self._forget(network, user, added_time)
+            return
+        if not conn.ready:
+            # keep them until the connection is back
+            return
+
+        for remind_time, added_time, user, message in self.waiting.pop(network):
+            send_reminder(conn, user, message, remind_time, added_time)
+            delete_reminder(network, user, added_time)
+            self._forget(network, user, added_time)
+
+
+def send_reminder(conn, user, message, remind_time, added_time):
+    remind_text = colors.parse(time_since(added_time, count=2))
+    alert = colors.parse("{}, you have a reminder from $(b){}$(clear) ago!".format(user, remind_text))
+
+    conn.message(user, alert)
+    conn.message(user, '"{}"'.format(message))
+
+    delta = (datetime.now() - remind_time).total_seconds()
+    if delta > (30*60):
+        late_time = time_since(remind_time, count=2)
+        late = "(I'm sorry for delivering this message $(b){}$(clear) late," \
+               " it seems I was unable to deliver it on time)".format(late_time)
+        conn.message(user, colors.parse(late))
+
+
+reminders = None
+
+
 @asyncio.coroutine
 @hook.on_start()
-def load_cache(async, db):
-    global reminder_cache
-    reminder_cache = []
-
+def load_cache(bot, async, db):
+    global reminders
+    # run any deletes of delivered reminders which are still queued, so a reload doesn't deliver them again
+    yield from async(database.write_behind.flush)
+    new_reminders = Reminders(bot)
     for network, remind_time, added_time, user, message in (yield from async(_load_cache_db, db)):
-        reminder_cache.append((network, remind_time, added_time, user, message))
+        new_reminders.add(network, user, added_time, remind_time, message)
+    reminders = new_reminders
 
 
 def _load_cache_db(db):
@@ -88,54 +255,29 @@ def _load_cache_db(db):
 
 
 @asyncio.coroutine
-@hook.periodic(30, initial_interval=30)
-def check_reminders(bot, async, db):
-    current_time = datetime.now()
-
-    for reminder in reminder_cache:
-        network, remind_time, added_time, user, message = reminder
-        if remind_time <= current_time:
-            if network not in bot.connections:
-                # connection is invalid
-                yield from add_reminder(async, db, network, remind_time, user)
-                yield from load_cache(async, db)
-                continue
-
-            conn = bot.connections[network]
-
-            if not conn.ready:
-                return
-
-            remind_text = colors.parse(time_since(added_time, count=2))
-            alert = colors.parse("{}, you have a reminder from $(b){}$(clear) ago!".format(user, remind_text))
-
-            conn.message(user, alert)
-            conn.message(user, '"{}"'.format(message))
-
-            delta = (remind_time-added_time).seconds
-            if delta > (30*60):
-                late_time = time_since(remind_time, count=2)
-                late = "(I'm sorry for delivering this message $(b){}$(clear) late," \
-                       " it seems I was unable to deliver it on time)".format(late_time)
-                conn.message(user, colors.parse(late))
-
-            yield from delete_reminder(async, db, network, remind_time, user)
-            yield from load_cache(async, db)
+@hook.on_stop()
+def stop_timer():
+    global reminders
+    if reminders is not None:
+        reminders.cancel()
+        reminders = None
 
 
 @asyncio.coroutine
 @hook.command('remind', 'reminder')
 def remind(text, nick, chan, db, conn, notice, async):
     """<1 minute, 30 seconds>: <do task> -- reminds you to <do task> in <1 minute, 30 seconds>"""
+    if reminders is None:
+        return "Reminders are still loading, try again in a moment."
 
-    count = len([x for x in reminder_cache if x[0] == conn.name and x[3] == nick.lower()])
+    count = reminders.count(conn.name, nick)
 
     if text == "clear":
         if count == 0:
             return "You have no reminders to delete."
 
         yield from delete_all(async, db, conn.name, nick)
-        yield from load_cache(async, db)
+        reminders.remove_user(conn.name, nick)
         return "Deleted all ({}) reminders for {}!".format(count, nick)
 
     # split the input on the first ":"
@@ -172,7 +314,7 @@ def remind(text, nick, chan, db, conn, notice, async):
 
     # finally, add the reminder and send a confirmation message
     yield from add_reminder(async, db, conn.name, nick, chan, message, remind_time, current_time)
-    yield from load_cache(async, db)
+    reminders.add(conn.name, nick, current_time, remind_time, message)
 
     remind_text = format_time(seconds, count=2)
     output = "Alright, I'll remind you \"{}\" in $(b){}$(clear)!".format(message, remind_text)
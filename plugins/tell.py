@@ -1,4 +1,5 @@
 import re
+import threading
 from datetime import datetime
 from sqlalchemy import Table, Column, String, Boolean, DateTime
 
@@ -6,6 +7,7 @@ from sqlalchemy.sql import select
 
 from cloudbot import hook
 from cloudbot.util import timeformat, database
+from cloudbot.util.migrations import Migration, add_index, analyze
 from cloudbot.event import EventType
 
 table = Table(
@@ -20,6 +22,16 @@ table = Table(
     Column('time_read', DateTime)
 )
 
+migrations = [
+    # tellinput looks up unread tells on every message
+    Migration(1, add_index("tells_unread", "tells", "connection", "target", "is_read"), analyze("tells")),
+]
+
+
+# the number of unread tells for each target, by connection: {connection: {target: count}}
+tell_cache = {}
+cache_lock = threading.Lock()
+
 
 @hook.on_start
 def load_cache(db):
@@ -27,11 +39,41 @@ def load_cache(db):
     :type db: sqlalchemy.orm.Session
     """
     global tell_cache
-    tell_cache = []
-    for row in db.execute(table.select().where(table.c.is_read == 0)):
-        conn = row["connection"]
-        target = row["target"]
-        tell_cache.append((conn, target))
+    new_cache = {}
+    for row in db.execute(select([table.c.connection, table.c.target]).where(table.c.is_read == 0)):
+        targets = new_cache.setdefault(row["connection"], {})
+        targets[row["target"]] = targets.get(row["target"], 0) + 1
+    with cache_lock:
+        tell_cache = new_cache
+
+
+def update_cache(server, target, change):
+    """
+    Adjusts the number of unread tells cached for a target, forgetting targets with none left
+    :type server: str
+    :type target: str
+    :type change: int
+    """
+    server = server.lower()
+    target = target.lower()
+    with cache_lock:
+        targets = tell_cache.setdefault(server, {})
+        count = targets.get(target, 0) + change
+        if count > 0:
+            targets[target] = count
+        else:
+            targets.pop(target, None)
+            if not targets:
+                del tell_cache[server]
+
+
+def count_unread(server, target):
+    """
+    :type server: str
+    :type target: str
+    :rtype: int
+    """
+    return tell_cache.get(server.lower(), {}).get(target.lower(), 0)
 
 
 def get_unread(db, server, target):
@@ -43,35 +85,27 @@ def get_unread(db, server, target):
     return db.execute(query).fetchall()
 
 
-def count_unread(db, server, target):
-    query = select([table]) \
-        .where(table.c.connection == server.lower()) \
-        .where(table.c.target == target.lower()) \
-        .where(table.c.is_read == 0) \
-        .alias("count") \
-        .count()
-    return db.execute(query).fetchone()[0]
-
-
 def read_all_tells(db, server, target):
     query = table.update() \
         .where(table.c.connection == server.lower()) \
         .where(table.c.target == target.lower()) \
         .where(table.c.is_read == 0) \
         .values(is_read=1)
-    db.execute(query)
+    result = db.execute(query)
     db.commit()
-    load_cache(db)
+    update_cache(server, target, -result.rowcount)
+
 
 def read_tell(db, server, target, message):
     query = table.update() \
         .where(table.c.connection == server.lower()) \
         .where(table.c.target == target.lower()) \
         .where(table.c.message == message) \
+        .where(table.c.is_read == 0) \
         .values(is_read=1)
-    db.execute(query)
+    result = db.execute(query)
     db.commit()
-    load_cache(db)
+    update_cache(server, target, -result.rowcount)
 
 
 def add_tell(db, server, sender, target, message):
@@ -85,17 +119,14 @@ def add_tell(db, server, sender, target, message):
     )
     db.execute(query)
     db.commit()
-    load_cache(db)
+    update_cache(server, target, 1)
+
 
 def tell_check(conn, nick):
-    for _conn, _target in tell_cache:
-        if (conn, nick.lower()) == (_conn, _target):
-            return True
-        else:
-            continue
+    return count_unread(conn, nick) > 0
 
 
-@hook.event(EventType.message, singlethread=True)
+@hook.event(EventType.message, singlethread_key="nick")
 def tellinput(event, conn, db, nick, notice):
     """
     :type event: cloudbot.event.Event
@@ -105,7 +136,8 @@ def tellinput(event, conn, db, nick, notice):
     if 'showtells' in event.content.lower():
         return
 
-    if tell_check(conn.name, nick): 
+    # only go to the database if the nick has mail
+    if tell_check(conn.name, nick):
         tells = get_unread(db, conn.name, nick)
     else:
         return
@@ -171,7 +203,7 @@ def tell_cmd(text, nick, db, notice, conn):
         notice("Invalid nick '{}'.".format(target))
         return
 
-    if count_unread(db, conn.name, target) >= 10:
+    if count_unread(conn.name, target) >= 10:
         notice("Sorry, {} has too many messages queued already.".format(target))
         return
 
@@ -3,7 +3,7 @@ import random
 import requests
 
 from cloudbot import hook
-from cloudbot.util import formatting
+from cloudbot.util import formatting, httpclient
 
 
 base_url = 'http://api.urbandictionary.com/v0'
@@ -36,9 +36,9 @@ def urban(text):
         # fetch the definitions
         try:
             params = {"term": text}
-            request = requests.get(define_url, params=params, headers=headers)
+            request = httpclient.request("GET", define_url, params=params, headers=headers)
             request.raise_for_status()
-        except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError) as e:
+        except requests.exceptions.RequestException as e:
             return "Could not get definition: {}".format(e)
 
         page = request.json()
@@ -48,9 +48,9 @@ def urban(text):
     else:
         # get a random definition!
         try:
-            request = requests.get(random_url, headers=headers)
+            request = httpclient.request("GET", random_url, headers=headers)
             request.raise_for_status()
-        except (requests.exceptions.HTTPError, requests.exceptions.ConnectionError) as e:
+        except requests.exceptions.RequestException as e:
             return "Could not get definition: {}".format(e)
 
         page = request.json()
@@ -1,12 +1,18 @@
+import requests
+
 from cloudbot import hook
-from cloudbot.util import http, timeformat
+from cloudbot.util import httpclient, timeformat
 
 
 @hook.regex(r'vimeo.com/([0-9]+)')
 def vimeo_url(match):
     """vimeo <url> -- returns information on the Vimeo video at <url>"""
-    info = http.get_json('http://vimeo.com/api/v2/video/%s.json'
-                         % match.group(1))
+    try:
+        info = httpclient.get_json('http://vimeo.com/api/v2/video/%s.json'
+                                   % match.group(1))
+    except requests.exceptions.RequestException:
+        # private, deleted or unreachable videos just don't get a reply
+        return
 
     if info:
         info[0]["duration"] = timeformat.format_time(info[0]["duration"])